@@ -1,17 +1,19 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Blueprint, Flask, request, jsonify, render_template
 from flask_cors import CORS
 import os
 import json
 import logging
 from functools import wraps
 
-from config import config
+from config import config, Config
 from database import db
-from auth import Auth
+from auth import Auth, token_cache
 from progress_tracker import ProgressTracker
 from utils.knowledge_analyzer import KnowledgeAnalyzer
-from utils.content_generator import ContentGenerator
+from utils.content_generator import ContentGenerator, llm_breaker
 from utils.validators import validate_request
+from utils.rate_limiter import RateLimiter, rate_limit, client_ip
+from utils.llm_governor import llm_governor, llm_governed
 from utils.response import ResponseUtil
 from utils.paginator import Paginator
 from utils.learning_path_planner import LearningPathPlanner
@@ -19,17 +21,8 @@ from utils.feedback_processor import FeedbackProcessor
 from utils.progress_visualizer import ProgressVisualizer
 from logging_config import setup_logging, get_logger
 
-# 创建Flask应用实例
-app = Flask(__name__, 
-            template_folder='templates',
-            static_folder='static')
-
-# 加载配置
-config_name = os.getenv('FLASK_CONFIG') or 'default'
-app.config.from_object(config[config_name])
-
-# 初始化CORS
-CORS(app)
+# 页面和API路由（由create_app注册到应用）
+bp = Blueprint('main', __name__)
 
 # 初始化工具类
 knowledge_analyzer = KnowledgeAnalyzer()
@@ -41,8 +34,58 @@ learning_path_planner = LearningPathPlanner()
 feedback_processor = FeedbackProcessor()
 progress_visualizer = ProgressVisualizer()
 
-# 设置日志
-setup_logging(app)
+# 调用大模型的接口按用户（未登录时按IP）限流
+chat_limiter = RateLimiter.from_config('chat', Config.CHAT_RATE_LIMIT, Config.CHAT_RATE_WINDOW)
+lesson_limiter = RateLimiter.from_config('lesson', Config.LESSON_RATE_LIMIT, Config.LESSON_RATE_WINDOW)
+
+# 调用大模型接口的参数验证规则（ASGI服务中的异步版本共用）
+LESSON_SCHEMA = {
+    'learning_goal': {
+        'required': True,
+        'type': 'string',
+        'min_length': 1,
+        'max_length': 100
+    }
+}
+PATH_SCHEMA = {
+    'learning_goal': {
+        'required': True,
+        'type': 'string',
+        'min_length': 1,
+        'max_length': 50
+    },
+    'stream': {
+        'required': False,
+        'type': 'boolean'
+    }
+}
+CHAT_SCHEMA = {
+    'message': {
+        'required': True,
+        'type': 'string',
+        'min_length': 1,
+        'max_length': 1000
+    },
+    'context': {
+        'required': False,
+        'type': 'dict'
+    },
+    'topic': {
+        'required': False,
+        'type': 'string'
+    },
+    'stream': {
+        'required': False,
+        'type': 'boolean'
+    }
+}
+
+# 单次学习会话最多提交的练习数
+MAX_SESSION_EXERCISES = 100
+
+# 进度报告的返回格式：chart为服务端渲染的图表，data为供客户端绘制的数据序列
+REPORT_FORMATS = ('chart', 'data')
+
 logger = get_logger(__name__)
 
 def token_required(f):
@@ -72,56 +115,61 @@ def token_required(f):
         # 将用户信息添加到请求上下文
         request.user_id = result['user_id']
         request.username = result['username']
+        request.token = token
         
         return f(*args, **kwargs)
     
     return decorated
 
-@app.route('/')
+@bp.route('/')
 def home():
     """主页面"""
     return render_template('index.html')
 
-@app.route('/dashboard')
+@bp.route('/dashboard')
 def dashboard():
     """用户仪表板"""
     return render_template('dashboard.html')
 
-@app.route('/lesson')
+@bp.route('/lesson')
 def lesson():
     """课程详情页面"""
     return render_template('lesson.html')
 
-@app.route('/exercise')
+@bp.route('/exercise')
 def exercise():
     """练习页面"""
     return render_template('exercise.html')
 
-@app.route('/login')
+@bp.route('/login')
 def login_page():
     """登录页面"""
     return render_template('login.html')
 
-@app.route('/register')
+@bp.route('/register')
 def register_page():
     """注册页面"""
     return render_template('register.html')
 
-@app.route('/docs')
+@bp.route('/docs')
 def docs():
     """API文档页面"""
     return render_template('docs.html')
 
-@app.route('/health')
+@bp.route('/health')
 def health_check():
     """健康检查端点"""
     logger.info("健康检查请求")
     return ResponseUtil.success({
         "status": "healthy", 
-        "service": "AI个性化学习伴侣"
+        "service": "AI个性化学习伴侣",
+        "llm": llm_governor.stats(),
+        "llm_circuit": llm_breaker.stats(),
+        "token_cache": token_cache.stats(),
+        "llm_cache": content_generator.response_cache.stats()
     })
 
-@app.route('/api/register', methods=['POST'])
+@bp.route('/api/register', methods=['POST'])
 @validate_request({
     'username': {
         'required': True,
@@ -162,7 +210,7 @@ def register():
         logger.error(f"注册过程中出错: {str(e)}")
         return ResponseUtil.error("注册失败")
 
-@app.route('/api/login', methods=['POST'])
+@bp.route('/api/login', methods=['POST'])
 @validate_request({
     'username': {
         'required': True,
@@ -184,9 +232,11 @@ def login():
         password = request.validated_data.get('password')
         
         # 获取客户端IP地址
-        ip_address = request.environ.get('HTTP_X_REAL_IP', request.remote_addr)
+        ip_address = client_ip()
         
         result = Auth.authenticate_user(username, password, ip_address)
+        if result.get('rate_limited'):
+            return ResponseUtil.too_many_requests(result['message'], result['retry_after'])
         if result['success']:
             logger.info(f"用户登录成功: {username}")
             return ResponseUtil.success({
@@ -201,7 +251,65 @@ def login():
         logger.error(f"登录过程中出错: {str(e)}")
         return ResponseUtil.error("登录失败")
 
-@app.route('/api/knowledge-graph', methods=['POST'])
+@bp.route('/api/logout', methods=['POST'])
+@token_required
+def logout():
+    """用户登出"""
+    try:
+        result = Auth.logout(request.token)
+        logger.info(f"用户退出登录: {request.username}")
+        return ResponseUtil.success(message=result['message'])
+        
+    except Exception as e:
+        logger.error(f"退出登录过程中出错: {str(e)}")
+        return ResponseUtil.error("退出失败")
+
+@bp.route('/api/logout-all', methods=['POST'])
+@token_required
+def logout_all():
+    """退出全部会话：吊销当前用户此前签发的全部令牌"""
+    try:
+        Auth.revoke_user_tokens(request.user_id)
+        logger.info(f"用户退出全部会话: {request.username}")
+        return ResponseUtil.success(message="已退出全部会话")
+        
+    except Exception as e:
+        logger.error(f"退出全部会话时出错: {str(e)}")
+        return ResponseUtil.error("退出失败")
+
+@bp.route('/api/change-password', methods=['POST'])
+@token_required
+@validate_request({
+    'old_password': {
+        'required': True,
+        'type': 'string',
+        'min_length': 1,
+        'max_length': 128
+    },
+    'new_password': {
+        'required': True,
+        'type': 'string',
+        'min_length': 8,
+        'max_length': 128
+    }
+})
+def change_password():
+    """修改密码（此前签发的全部令牌失效，返回新令牌）"""
+    try:
+        result = Auth.change_password(
+            request.user_id,
+            request.validated_data.get('old_password'),
+            request.validated_data.get('new_password')
+        )
+        if not result['success']:
+            return ResponseUtil.error(result['message'], 400)
+        return ResponseUtil.success({'token': result['token']}, result['message'])
+        
+    except Exception as e:
+        logger.error(f"修改密码过程中出错: {str(e)}")
+        return ResponseUtil.error("修改密码失败")
+
+@bp.route('/api/knowledge-graph', methods=['POST'])
 @token_required
 @validate_request({
     'knowledge_data': {
@@ -226,7 +334,7 @@ def update_knowledge_graph():
         logger.error(f"更新知识图谱时出错: {str(e)}")
         return ResponseUtil.error("更新失败")
 
-@app.route('/api/knowledge-graph', methods=['GET'])
+@bp.route('/api/knowledge-graph', methods=['GET'])
 @token_required
 def get_knowledge_graph():
     """获取用户知识图谱"""
@@ -239,7 +347,7 @@ def get_knowledge_graph():
         logger.error(f"获取知识图谱时出错: {str(e)}")
         return ResponseUtil.error("获取失败")
 
-@app.route('/api/analyze-knowledge', methods=['POST'])
+@bp.route('/api/analyze-knowledge', methods=['POST'])
 @token_required
 @validate_request({
     'answers': {
@@ -265,16 +373,11 @@ def analyze_knowledge():
         logger.error(f"分析知识水平时出错: {str(e)}")
         return ResponseUtil.error("分析失败")
 
-@app.route('/api/generate-lesson', methods=['POST'])
+@bp.route('/api/generate-lesson', methods=['POST'])
 @token_required
-@validate_request({
-    'learning_goal': {
-        'required': True,
-        'type': 'string',
-        'min_length': 1,
-        'max_length': 100
-    }
-})
+@rate_limit(lesson_limiter)
+@llm_governed
+@validate_request(LESSON_SCHEMA)
 def generate_lesson():
     """生成个性化课程内容"""
     try:
@@ -293,11 +396,10 @@ def generate_lesson():
             logger.warning(f"未找到学习目标 '{learning_goal}' 的相关材料")
             return ResponseUtil.error("未找到相关学习材料", 404)
         
-        # 生成解释内容
-        explanation = content_generator.generate_explanation(level_analysis, materials, user_knowledge_graph)
-        
-        # 生成练习题
-        exercises = content_generator.generate_exercises(level_analysis, materials)
+        # 并发生成解释内容和练习题
+        explanation, exercises = content_generator.generate_lesson_content(
+            level_analysis, materials, user_knowledge_graph
+        )
         
         # 构建课程数据
         lesson_data = {
@@ -316,7 +418,7 @@ def generate_lesson():
         logger.error(f"生成课程时出错: {str(e)}")
         return ResponseUtil.error("生成失败")
 
-@app.route('/api/complete-lesson', methods=['POST'])
+@bp.route('/api/complete-lesson', methods=['POST'])
 @token_required
 @validate_request({
     'lesson_data': {
@@ -343,7 +445,7 @@ def complete_lesson():
         logger.error(f"记录完成课程时出错: {str(e)}")
         return ResponseUtil.error("记录失败")
 
-@app.route('/api/progress', methods=['GET'])
+@bp.route('/api/progress', methods=['GET'])
 @token_required
 def get_progress():
     """获取学习进度"""
@@ -356,34 +458,48 @@ def get_progress():
         logger.error(f"获取学习进度时出错: {str(e)}")
         return ResponseUtil.error("获取失败")
 
-@app.route('/api/learning-history', methods=['GET'])
+@bp.route('/api/learning-history', methods=['GET'])
 @token_required
 def get_learning_history():
-    """获取学习历史（支持分页）"""
+    """获取学习历史（支持页码分页和游标分页）"""
     try:
         # 获取分页参数
         paginator = Paginator()
         
-        # 获取学习历史和总数
-        history, total = progress_tracker.get_learning_history_with_count(
+        after = None
+        if paginator.cursor:
+            try:
+                after = Paginator.decode_cursor(paginator.cursor)
+            except ValueError:
+                return ResponseUtil.error("分页游标无效", 400)
+        
+        # 游标分页默认不统计总数，需要时通过include_total=true获取
+        include_total = after is None or request.args.get('include_total', '').lower() in ('1', 'true')
+        
+        # 获取学习历史
+        history, total, next_key = progress_tracker.get_learning_history_page(
             request.user_id, 
             paginator.per_page, 
-            paginator.get_offset()
+            skip=paginator.get_offset(),
+            after=after,
+            include_total=include_total
         )
+        next_cursor = Paginator.encode_cursor(*next_key) if next_key else None
         
         logger.info(f"获取用户 {request.username} 学习历史成功")
         return ResponseUtil.paginated(
             history, 
-            paginator.page, 
+            paginator.page if after is None else None, 
             paginator.per_page, 
-            total
+            total,
+            next_cursor=next_cursor
         )
         
     except Exception as e:
         logger.error(f"获取学习历史时出错: {str(e)}")
         return ResponseUtil.error("获取失败")
 
-@app.route('/api/topics', methods=['GET'])
+@bp.route('/api/topics', methods=['GET'])
 def get_topics():
     """获取所有可用的学习主题"""
     try:
@@ -406,7 +522,7 @@ def get_topics():
         logger.error(f"获取学习主题列表时出错: {str(e)}")
         return ResponseUtil.error("获取失败")
 
-@app.route('/api/recommendations', methods=['GET'])
+@bp.route('/api/recommendations', methods=['GET'])
 @token_required
 def get_recommendations():
     """获取学习主题推荐"""
@@ -435,24 +551,23 @@ def get_recommendations():
         logger.error(f"生成主题推荐时出错: {str(e)}")
         return ResponseUtil.error("推荐失败")
 
-@app.route('/api/personalized-path', methods=['POST'])
+@bp.route('/api/personalized-path', methods=['POST'])
 @token_required
-@validate_request({
-    'learning_goal': {
-        'required': True,
-        'type': 'string',
-        'min_length': 1,
-        'max_length': 50
-    }
-})
+@llm_governed
+@validate_request(PATH_SCHEMA)
 def generate_personalized_path():
-    """生成个性化学习路径"""
+    """生成个性化学习路径（stream=true时以Server-Sent Events逐个返回子主题）"""
     try:
         learning_goal = request.validated_data.get('learning_goal')
         
         # 获取用户知识图谱
         knowledge_graph = progress_tracker.get_knowledge_graph(request.user_id)
         
+        if request.validated_data.get('stream'):
+            return ResponseUtil.event_stream(
+                _path_events(request.user_id, knowledge_graph, learning_goal)
+            )
+        
         # 生成个性化学习路径
         learning_path = learning_path_planner.generate_personalized_learning_path(
             request.user_id, 
@@ -467,7 +582,21 @@ def generate_personalized_path():
         logger.error(f"生成个性化学习路径时出错: {str(e)}")
         return ResponseUtil.error("生成失败")
 
-@app.route('/api/exercise-feedback', methods=['POST'])
+def _path_events(user_id, knowledge_graph, learning_goal):
+    """
+    个性化学习路径的SSE事件序列
+    
+    先发送path事件（学习目标、用户水平和子主题顺序），每个子主题生成完成后发送topic事件，
+    最后发送done事件携带完整学习路径；出错时发送error事件
+    """
+    try:
+        yield from learning_path_planner.stream_personalized_learning_path(user_id, knowledge_graph, learning_goal)
+        logger.info("个性化学习路径流式生成成功")
+    except Exception as e:
+        logger.error(f"流式生成个性化学习路径时出错: {str(e)}")
+        yield 'error', {'error': '生成失败'}
+
+@bp.route('/api/exercise-feedback', methods=['POST'])
 @token_required
 @validate_request({
     'exercise_data': {
@@ -493,7 +622,41 @@ def process_exercise_feedback():
         logger.error(f"处理练习反馈时出错: {str(e)}")
         return ResponseUtil.error("处理失败")
 
-@app.route('/api/progress-summary', methods=['GET'])
+@bp.route('/api/exercise-session', methods=['POST'])
+@token_required
+@validate_request({
+    'session_data': {
+        'required': True,
+        'type': 'dict'
+    }
+})
+def process_exercise_session():
+    """批量处理一次学习会话中的全部练习"""
+    try:
+        session_data = request.validated_data.get('session_data')
+        exercises = session_data.get('exercises') if isinstance(session_data, dict) else None
+        
+        if not isinstance(exercises, list) or not exercises:
+            return ResponseUtil.error("exercises 必须是非空数组", 400)
+        if len(exercises) > MAX_SESSION_EXERCISES:
+            return ResponseUtil.error(f"单次最多提交 {MAX_SESSION_EXERCISES} 道练习", 400)
+        if not all(isinstance(exercise, dict) for exercise in exercises):
+            return ResponseUtil.error("exercises 中的每一项必须是对象", 400)
+        
+        # 评分、合并各知识点掌握程度并批量写入
+        session_result = feedback_processor.process_learning_session_feedback(
+            request.user_id, 
+            session_data
+        )
+        
+        logger.info(f"处理用户 {request.username} 的学习会话（{len(exercises)} 道练习）成功")
+        return ResponseUtil.success(session_result)
+        
+    except Exception as e:
+        logger.error(f"处理学习会话时出错: {str(e)}")
+        return ResponseUtil.error("处理失败")
+
+@bp.route('/api/progress-summary', methods=['GET'])
 @token_required
 def get_progress_summary():
     """获取学习进度摘要"""
@@ -508,13 +671,20 @@ def get_progress_summary():
         logger.error(f"获取进度摘要时出错: {str(e)}")
         return ResponseUtil.error("获取失败")
 
-@app.route('/api/learning-report', methods=['GET'])
+@bp.route('/api/learning-report', methods=['GET'])
 @token_required
 def get_learning_report():
-    """获取学习报告"""
+    """获取学习报告（format=data时只返回数据序列，由客户端绘制图表）"""
     try:
+        report_format = request.args.get('format', 'chart')
+        if report_format not in REPORT_FORMATS:
+            return ResponseUtil.error("format参数只能是chart或data", 400)
+        
         # 生成学习报告
-        report = progress_visualizer.generate_learning_report(request.user_id)
+        if report_format == 'data':
+            report = progress_visualizer.get_learning_report_data(request.user_id)
+        else:
+            report = progress_visualizer.generate_learning_report(request.user_id)
         
         logger.info(f"生成用户 {request.username} 的学习报告成功")
         return ResponseUtil.success(report)
@@ -523,13 +693,32 @@ def get_learning_report():
         logger.error(f"生成学习报告时出错: {str(e)}")
         return ResponseUtil.error("生成失败")
 
-@app.route('/api/topic-progress/<topic>', methods=['GET'])
+@bp.route('/api/charts/<key>.png', methods=['GET'])
+def get_chart(key):
+    """
+    获取学习报告中的图表
+
+    不需要登录（报告中的图表URL会直接用在<img>标签里），URL中的键是以服务端密钥签名的
+    绘图数据哈希，作为访问凭证：只有拿到学习报告的用户才能得到它，见make_chart_key。
+    """
+    content = progress_visualizer.chart_cache.get(key)
+    if content is None:
+        return ResponseUtil.error("图表不存在或已过期，请重新获取学习报告", 404)
+    return ResponseUtil.cached_content(content, 'image/png', key)
+
+@bp.route('/api/topic-progress/<topic>', methods=['GET'])
 @token_required
 def get_topic_progress(topic):
-    """获取特定主题的学习进度"""
+    """获取特定主题的学习进度（format=data时返回按天汇总的数据序列）"""
     try:
+        report_format = request.args.get('format', 'chart')
+        if report_format not in REPORT_FORMATS:
+            return ResponseUtil.error("format参数只能是chart或data", 400)
+        
         # 获取主题进度
-        topic_progress = progress_visualizer.get_topic_progress(request.user_id, topic)
+        topic_progress = progress_visualizer.get_topic_progress(
+            request.user_id, topic, data_only=report_format == 'data'
+        )
         
         logger.info(f"获取用户 {request.username} 的主题 {topic} 进度成功")
         return ResponseUtil.success(topic_progress)
@@ -538,29 +727,16 @@ def get_topic_progress(topic):
         logger.error(f"获取主题进度时出错: {str(e)}")
         return ResponseUtil.error("获取失败")
 
-@app.route('/api/interactive-chat', methods=['POST'])
-@validate_request({
-    'message': {
-        'required': True,
-        'type': 'string',
-        'min_length': 1,
-        'max_length': 1000
-    },
-    'context': {
-        'required': False,
-        'type': 'dict'
-    },
-    'topic': {
-        'required': False,
-        'type': 'string'
-    }
-})
+@bp.route('/api/interactive-chat', methods=['POST'])
+@rate_limit(chat_limiter)
+@llm_governed
+@validate_request(CHAT_SCHEMA)
 def interactive_chat():
-    """处理交互式对话学习请求"""
+    """处理交互式对话学习请求（stream=true时以Server-Sent Events流式返回）"""
     try:
         message = request.validated_data.get('message')
-        context = request.validated_data.get('context', {})
-        topic = request.validated_data.get('topic', 'general')
+        context = request.validated_data.get('context') or {}
+        topic = request.validated_data.get('topic') or 'general'
         
         # 获取用户ID（如果已登录）
         user_id = getattr(request, 'user_id', None)
@@ -570,6 +746,11 @@ def interactive_chat():
         if user_id:
             knowledge_graph = progress_tracker.get_knowledge_graph(user_id)
         
+        if request.validated_data.get('stream'):
+            return ResponseUtil.event_stream(
+                _chat_events(message, context, topic, knowledge_graph)
+            )
+        
         # 使用内容生成器生成响应
         response = content_generator.generate_interactive_response(
             message, 
@@ -592,17 +773,67 @@ def interactive_chat():
         logger.error(f"处理交互式对话时出错: {str(e)}")
         return ResponseUtil.error("处理对话时发生错误")
 
+def _chat_events(message, context, topic, knowledge_graph):
+    """
+    交互式对话的SSE事件序列
+    
+    先逐段发送 {"delta": 文本片段}，最后发送done事件携带完整响应；出错时发送error事件
+    """
+    chunks = []
+    try:
+        for chunk in content_generator.stream_interactive_response(message, context, topic, knowledge_graph):
+            chunks.append(chunk)
+            yield None, {'delta': chunk}
+        logger.info("交互式对话流式响应生成成功")
+        yield 'done', {'response': ''.join(chunks).strip(), 'context': context}
+    except Exception as e:
+        logger.error(f"流式生成交互式对话时出错: {str(e)}")
+        yield 'error', {'error': '处理对话时发生错误'}
+
 # 404错误处理
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found(error):
     logger.warning(f"页面未找到: {request.url}")
     return ResponseUtil.error("页面未找到", 404)
 
 # 全局错误处理
-@app.errorhandler(Exception)
+@bp.app_errorhandler(Exception)
 def internal_error(error):
     logger.error(f"服务器内部错误: {str(error)}")
     return ResponseUtil.error("服务器内部错误")
 
+def create_app(config_name=None):
+    """
+    创建Flask应用（应用工厂）
+    
+    创建应用时不连接数据库，数据库连接在首次查询时建立，
+    因此可以在gunicorn等预加载应用后fork工作进程的场景下使用。
+    
+    Args:
+        config_name (str): 配置名称，默认读取环境变量FLASK_CONFIG
+        
+    Returns:
+        Flask: 应用实例
+    """
+    app = Flask(__name__, 
+                template_folder='templates',
+                static_folder='static')
+    
+    # 加载配置
+    config_name = config_name or os.getenv('FLASK_CONFIG') or 'default'
+    app.config.from_object(config[config_name])
+    
+    # 初始化CORS
+    CORS(app)
+    
+    # 设置日志
+    setup_logging(app)
+    
+    app.register_blueprint(bp)
+    return app
+
+# 供 python app.py、flask run 和 gunicorn app:app 使用的默认应用
+app = create_app()
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
\ No newline at end of file
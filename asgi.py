@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+ASGI服务入口
+调用大模型的接口（生成课程、个性化学习路径、交互式对话）使用异步实现：等待模型响应时
+不占用线程，单个工作进程即可同时处理数百个请求；其余接口和页面仍由Flask应用处理，
+挂载在同一服务下，行为不变。
+
+两种部署方式可以任选其一：
+    gunicorn app:app                                          # 全部接口同步处理（WSGI）
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4   # 大模型接口异步处理（ASGI）
+
+异步接口的请求参数、鉴权、限流、调度和响应格式与Flask接口一致，
+同时进行的异步大模型调用数由LLM_ASYNC_MAX_CONCURRENCY限制。
+"""
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+from app import (
+    app as flask_app,
+    content_generator,
+    knowledge_analyzer,
+    learning_path_planner,
+    chat_limiter,
+    lesson_limiter,
+    LESSON_SCHEMA,
+    PATH_SCHEMA,
+    CHAT_SCHEMA
+)
+from auth import Auth
+from database import async_db
+from logging_config import get_logger
+from progress_tracker import ProgressTracker
+from utils.llm_governor import llm_governor, LLMThrottled
+from utils.rate_limiter import MemoryRateLimitBackend
+from utils.validators import validate_data, ValidationError
+
+logger = get_logger(__name__)
+
+def json_response(body, status_code=200, headers=None):
+    """
+    生成JSON响应（使用Flask应用的JSON序列化，日期等类型的格式与Flask接口一致）
+
+    Args:
+        body (dict): 响应内容
+        status_code (int): HTTP状态码
+        headers (dict): 额外的响应头
+
+    Returns:
+        Response: application/json响应
+    """
+    return Response(flask_app.json.dumps(body), status_code=status_code,
+                    headers=headers, media_type='application/json')
+
+def success(data=None, message="操作成功"):
+    """成功响应，格式同ResponseUtil.success"""
+    body = {'success': True, 'message': message}
+    if data is not None:
+        body['data'] = data
+    return json_response(body)
+
+def error(message="操作失败", status_code=400, data=None, headers=None):
+    """错误响应，格式同ResponseUtil.error"""
+    body = {'success': False, 'error': message}
+    if data is not None:
+        body['data'] = data
+    logger.warning(f"错误响应: {message}")
+    return json_response(body, status_code, headers)
+
+def too_many_requests(message="请求过于频繁，请稍后再试", retry_after=1):
+    """429限流响应，格式同ResponseUtil.too_many_requests"""
+    return error(message, 429, {'retry_after': retry_after}, {'Retry-After': str(retry_after)})
+
+class EventStreamResponse(StreamingResponse):
+    """
+    Server-Sent Events流式响应，发送结束后一定调用on_close
+
+    无论正常结束、客户端在开始迭代前断开还是发送出错，都会关闭事件序列并调用on_close，
+    不依赖事件序列本身的finally（序列从未开始迭代时不会执行）。
+    """
+
+    def __init__(self, events, on_close=None):
+        """
+        Args:
+            events (AsyncIterator): (事件名, 数据) 元组的异步迭代器
+            on_close (callable): 响应结束后调用的函数
+        """
+        self.events = events
+        self.on_close = on_close
+
+        async def generate():
+            async for event, data in events:
+                payload = json.dumps(data, ensure_ascii=False, default=str)
+                if event:
+                    yield f"event: {event}\ndata: {payload}\n\n"
+                else:
+                    yield f"data: {payload}\n\n"
+
+        super().__init__(generate(), media_type='text/event-stream',
+                         headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                await self.events.aclose()
+            finally:
+                if self.on_close:
+                    self.on_close()
+
+def event_stream(events, on_close=None):
+    """
+    Server-Sent Events流式响应，格式同ResponseUtil.event_stream
+
+    Args:
+        events (AsyncIterator): (事件名, 数据) 元组的异步生成器
+        on_close (callable): 响应结束（包括客户端断开、发送出错）后调用的函数
+
+    Returns:
+        EventStreamResponse: text/event-stream响应
+    """
+    return EventStreamResponse(events, on_close)
+
+def client_ip(request):
+    """获取客户端IP地址（优先使用反向代理设置的X-Real-IP）"""
+    return request.headers.get('x-real-ip') or (request.client.host if request.client else None)
+
+async def authenticate(request):
+    """
+    验证请求头中的JWT令牌（吊销检查需要查询共享存储，在线程中执行）
+
+    Returns:
+        tuple: (用户信息dict, None) 或 (None, 错误响应)
+    """
+    auth_header = request.headers.get('authorization')
+    if not auth_header:
+        return None, error('缺少访问令牌', 401)
+
+    parts = auth_header.split(" ")
+    if len(parts) < 2:
+        return None, error('令牌格式无效', 401)
+
+    result = await asyncio.to_thread(Auth.verify_token, parts[1])
+    if not result['success']:
+        return None, error(result['message'], 401)
+    return result, None
+
+async def check_rate_limit(limiter, key):
+    """
+    按限流键计数，超过限制时返回429响应
+
+    Returns:
+        Response: 被限流时的错误响应，未超过限制返回None
+    """
+    if isinstance(limiter.backend, MemoryRateLimitBackend):
+        result = limiter.hit(key)
+    else:
+        # 共享后端需要网络往返，在线程中执行以免阻塞事件循环
+        result = await asyncio.to_thread(limiter.hit, key)
+    if not result.allowed:
+        logger.warning(f"{limiter.name} 请求过于频繁: {key}")
+        return too_many_requests(retry_after=result.retry_after)
+    return None
+
+async def read_validated(request, schema):
+    """
+    读取并验证请求体
+
+    Returns:
+        tuple: (验证后的数据, None) 或 (None, 错误响应)
+    """
+    try:
+        data = await request.json()
+    except ValueError:
+        data = {}
+    if not isinstance(data, dict):
+        data = {}
+
+    try:
+        return validate_data(schema, data), None
+    except ValidationError as e:
+        logger.warning(f"参数验证失败: {e.message}")
+        return None, json_response({'success': False, 'error': e.message, 'field': e.field}, 400)
+
+async def admit(subject):
+    """
+    大模型请求准入，未通过时返回429响应（通过后必须调用llm_governor.release_user）
+
+    Returns:
+        Response: 被拒绝时的错误响应，通过返回None
+    """
+    try:
+        await llm_governor.aacquire_user(subject)
+    except LLMThrottled as e:
+        logger.warning(f"大模型请求被拒绝（{e.reason}）: {subject}")
+        return too_many_requests(e.message, e.retry_after)
+    return None
+
+async def generate_lesson(request):
+    """生成个性化课程内容（异步版本）"""
+    user, response = await authenticate(request)
+    if response:
+        return response
+    subject = f"user:{user['user_id']}"
+    response = await check_rate_limit(lesson_limiter, subject) or await admit(subject)
+    if response:
+        return response
+
+    try:
+        data, response = await read_validated(request, LESSON_SCHEMA)
+        if response:
+            return response
+        learning_goal = data.get('learning_goal')
+
+        user_knowledge_graph = await ProgressTracker.aget_knowledge_graph(user['user_id'])
+        level_analysis = knowledge_analyzer.analyze_user_level(user_knowledge_graph)
+        materials = content_generator.retrieve_materials(learning_goal, level_analysis)
+
+        if not materials:
+            logger.warning(f"未找到学习目标 '{learning_goal}' 的相关材料")
+            return error("未找到相关学习材料", 404)
+
+        explanation, exercises = await content_generator.agenerate_lesson_content(
+            level_analysis, materials, user_knowledge_graph
+        )
+
+        lesson_data = {
+            "learning_goal": learning_goal,
+            "content": {
+                "explanation": explanation,
+                "exercises": exercises
+            },
+            "level": level_analysis.get('level', 'beginner')
+        }
+
+        logger.info(f"为用户 {user['username']} 生成课程 '{learning_goal}' 成功")
+        return success(lesson_data)
+
+    except Exception as e:
+        logger.error(f"生成课程时出错: {str(e)}")
+        return error("生成失败")
+    finally:
+        llm_governor.release_user(subject)
+
+async def generate_personalized_path(request):
+    """生成个性化学习路径（异步版本，stream=true时以Server-Sent Events逐个返回子主题）"""
+    user, response = await authenticate(request)
+    if response:
+        return response
+    subject = f"user:{user['user_id']}"
+    response = await admit(subject)
+    if response:
+        return response
+
+    streaming = False
+    try:
+        data, response = await read_validated(request, PATH_SCHEMA)
+        if response:
+            return response
+
+        knowledge_graph = await ProgressTracker.aget_knowledge_graph(user['user_id'])
+
+        if data.get('stream'):
+            response = event_stream(
+                _path_events(user['user_id'], knowledge_graph, data.get('learning_goal')),
+                on_close=lambda: llm_governor.release_user(subject)
+            )
+            streaming = True
+            return response
+
+        learning_path = await learning_path_planner.agenerate_personalized_learning_path(
+            user['user_id'],
+            knowledge_graph,
+            data.get('learning_goal')
+        )
+
+        logger.info(f"为用户 {user['username']} 生成个性化学习路径成功")
+        return success(learning_path)
+
+    except Exception as e:
+        logger.error(f"生成个性化学习路径时出错: {str(e)}")
+        return error("生成失败")
+    finally:
+        # 流式响应在响应结束时（EventStreamResponse的on_close）释放在途名额
+        if not streaming:
+            llm_governor.release_user(subject)
+
+async def _path_events(user_id, knowledge_graph, learning_goal):
+    """
+    个性化学习路径的SSE事件序列（异步版本），事件同Flask接口
+    """
+    try:
+        async for event, data in learning_path_planner.astream_personalized_learning_path(
+            user_id, knowledge_graph, learning_goal
+        ):
+            yield event, data
+        logger.info("个性化学习路径流式生成成功")
+    except Exception as e:
+        logger.error(f"流式生成个性化学习路径时出错: {str(e)}")
+        yield 'error', {'error': '生成失败'}
+
+async def interactive_chat(request):
+    """处理交互式对话学习请求（异步版本，stream=true时以Server-Sent Events流式返回）"""
+    subject = f"ip:{client_ip(request)}"
+    response = await check_rate_limit(chat_limiter, subject) or await admit(subject)
+    if response:
+        return response
+
+    streaming = False
+    try:
+        data, response = await read_validated(request, CHAT_SCHEMA)
+        if response:
+            return response
+        message = data.get('message')
+        context = data.get('context') or {}
+        topic = data.get('topic') or 'general'
+
+        # 与Flask接口一致：对话接口不要求登录，不读取知识图谱
+        knowledge_graph = {}
+
+        if data.get('stream'):
+            response = event_stream(
+                _chat_events(message, context, topic, knowledge_graph),
+                on_close=lambda: llm_governor.release_user(subject)
+            )
+            streaming = True
+            return response
+
+        response = await content_generator.agenerate_interactive_response(
+            message,
+            context,
+            topic,
+            knowledge_graph
+        )
+
+        if response:
+            logger.info("交互式对话响应生成成功")
+            return success({
+                'response': response,
+                'context': context
+            })
+        logger.warning("交互式对话响应生成失败")
+        return error("无法生成响应，请稍后重试")
+
+    except Exception as e:
+        logger.error(f"处理交互式对话时出错: {str(e)}")
+        return error("处理对话时发生错误")
+    finally:
+        # 流式响应在响应结束时（EventStreamResponse的on_close）释放在途名额
+        if not streaming:
+            llm_governor.release_user(subject)
+
+async def _chat_events(message, context, topic, knowledge_graph):
+    """
+    交互式对话的SSE事件序列（异步版本）
+
+    先逐段发送 {"delta": 文本片段}，最后发送done事件携带完整响应；出错时发送error事件
+    """
+    chunks = []
+    try:
+        async for chunk in content_generator.astream_interactive_response(message, context, topic, knowledge_graph):
+            chunks.append(chunk)
+            yield None, {'delta': chunk}
+        logger.info("交互式对话流式响应生成成功")
+        yield 'done', {'response': ''.join(chunks).strip(), 'context': context}
+    except Exception as e:
+        logger.error(f"流式生成交互式对话时出错: {str(e)}")
+        yield 'error', {'error': '处理对话时发生错误'}
+
+@asynccontextmanager
+async def lifespan(app):
+    """服务关闭时释放大模型HTTP连接池和异步数据库连接"""
+    yield
+    await content_generator.provider.aclose()
+    async_db.close()
+
+routes = [
+    Route('/api/generate-lesson', generate_lesson, methods=['POST']),
+    Route('/api/personalized-path', generate_personalized_path, methods=['POST']),
+    Route('/api/interactive-chat', interactive_chat, methods=['POST']),
+    # 其余接口和页面由Flask应用处理（在线程池中执行）
+    Mount('/', app=WSGIMiddleware(flask_app))
+]
+
+app = Starlette(routes=routes, lifespan=lifespan)
+
+if __name__ == '__main__':
+    import os
+    import uvicorn
+    uvicorn.run('asgi:app', host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
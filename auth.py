@@ -4,16 +4,21 @@
 """
 
 from database import db
+from config import Config
 from utils.security import SecurityUtil
+from utils.token_cache import TokenCache
+from utils.rate_limiter import RateLimiter
 import logging
 from datetime import datetime
-from collections import defaultdict
-import time
+from bson import ObjectId
 
 logger = logging.getLogger(__name__)
 
-# 简单的内存登录尝试记录（在生产环境中应使用Redis等）
-login_attempts = defaultdict(list)
+# 登录失败次数限流（按IP统计，RATE_LIMIT_BACKEND=redis时多个工作进程共享计数）
+login_limiter = RateLimiter.from_config('login', Config.LOGIN_RATE_LIMIT, Config.LOGIN_RATE_WINDOW)
+
+# 已验证令牌缓存（每个工作进程独立，吊销记录在工作进程间共享）
+token_cache = TokenCache.from_config()
 
 class Auth:
     """认证类"""
@@ -38,7 +43,11 @@ class Auth:
                 return {'success': False, 'message': password_check['message']}
             
             # 检查用户是否已存在
-            existing_user = db.find_one('users', {'$or': [{'username': username}, {'email': email}]})
+            existing_user = db.find_one(
+                'users',
+                {'$or': [{'username': username}, {'email': email}]},
+                {'_id': 1}
+            )
             if existing_user:
                 return {'success': False, 'message': '用户名或邮箱已存在'}
             
@@ -51,8 +60,7 @@ class Auth:
                 'email': email,
                 'password': hashed_password,
                 'created_at': datetime.utcnow(),
-                'knowledge_graph': {},
-                'learning_history': []
+                'knowledge_graph': {}
             }
             
             # 插入数据库
@@ -85,16 +93,27 @@ class Auth:
             ip_address (str): IP地址（用于限流）
             
         Returns:
-            dict: 认证结果和令牌信息
+            dict: 认证结果和令牌信息（被限流时包含rate_limited和retry_after）
         """
         # 检查登录尝试次数
-        if ip_address and Auth._is_rate_limited(ip_address):
-            logger.warning(f"IP地址 {ip_address} 登录尝试过于频繁")
-            return {'success': False, 'message': '登录尝试过于频繁，请稍后再试'}
+        if ip_address:
+            limit = login_limiter.peek(ip_address)
+            if not limit.allowed:
+                logger.warning(f"IP地址 {ip_address} 登录尝试过于频繁")
+                return {
+                    'success': False,
+                    'message': '登录尝试过于频繁，请稍后再试',
+                    'rate_limited': True,
+                    'retry_after': limit.retry_after
+                }
             
         try:
             # 查找用户
-            user = db.find_one('users', {'$or': [{'username': username}, {'email': username}]})
+            user = db.find_one(
+                'users',
+                {'$or': [{'username': username}, {'email': username}]},
+                {'username': 1, 'password': 1}
+            )
             if not user:
                 logger.warning(f"用户登录失败: 用户不存在 ({username})")
                 # 记录失败的登录尝试
@@ -133,6 +152,93 @@ class Auth:
             logger.error(f"用户登录过程中出错: {str(e)}")
             return {'success': False, 'message': '登录失败'}
     
+    @staticmethod
+    def verify_token(token):
+        """
+        验证访问令牌
+        
+        最近验证通过的令牌直接从进程内缓存返回，不再重复解码和校验签名
+        
+        Args:
+            token (str): JWT令牌
+            
+        Returns:
+            dict: 验证结果和用户信息
+        """
+        payload = token_cache.get(token)
+        if payload is None:
+            result = SecurityUtil.verify_jwt_token(token)
+            if not result['success']:
+                return {'success': False, 'message': result['error']}
+            payload = result['payload']
+            token_cache.put(token, payload)
+        
+        if token_cache.is_revoked(token, payload):
+            logger.warning(f"已吊销的令牌被使用: 用户 {payload.get('username')}")
+            return {'success': False, 'message': '令牌已失效'}
+        
+        return {
+            'success': True,
+            'user_id': payload['user_id'],
+            'username': payload['username']
+        }
+    
+    @staticmethod
+    def logout(token):
+        """
+        用户登出，吊销当前令牌
+        
+        Args:
+            token (str): JWT令牌
+            
+        Returns:
+            dict: 登出结果
+        """
+        result = SecurityUtil.verify_jwt_token(token)
+        token_cache.revoke(token, result.get('payload'))
+        return {'success': True, 'message': '已退出登录'}
+    
+    @staticmethod
+    def revoke_user_tokens(user_id):
+        """
+        吊销用户此前签发的全部令牌（修改密码、退出全部会话时调用）
+        
+        Args:
+            user_id (str): 用户ID
+        """
+        token_cache.revoke_user(user_id)
+        logger.info(f"用户 {user_id} 的令牌已全部吊销")
+    
+    @staticmethod
+    def change_password(user_id, old_password, new_password):
+        """
+        修改密码，吊销此前签发的全部令牌并签发新令牌
+        
+        Args:
+            user_id (str): 用户ID
+            old_password (str): 原密码
+            new_password (str): 新密码
+            
+        Returns:
+            dict: 修改结果和新令牌
+        """
+        password_check = SecurityUtil.is_strong_password(new_password)
+        if not password_check['valid']:
+            return {'success': False, 'message': password_check['message']}
+        
+        user = db.find_one('users', {'_id': ObjectId(user_id)}, {'username': 1, 'password': 1})
+        if not user:
+            return {'success': False, 'message': '用户不存在'}
+        if not SecurityUtil.verify_password(old_password, user['password']):
+            logger.warning(f"修改密码失败: 原密码错误 ({user['username']})")
+            return {'success': False, 'message': '原密码错误'}
+        
+        db.update_one('users', {'_id': user['_id']}, {'password': SecurityUtil.hash_password(new_password)})
+        # 先吊销再签发，新令牌的签发时间晚于吊销时间
+        Auth.revoke_user_tokens(user_id)
+        token = SecurityUtil.generate_jwt_token(user_id, user['username'])
+        logger.info(f"用户修改密码成功: {user['username']}")
+        return {'success': True, 'message': '密码已修改，其他设备需要重新登录', 'token': token}
     
     @staticmethod
     def _record_failed_attempt(ip_address):
@@ -142,15 +248,7 @@ class Auth:
         Args:
             ip_address (str): IP地址
         """
-        current_time = time.time()
-        login_attempts[ip_address].append(current_time)
-        
-        # 只保留最近10分钟的尝试记录
-        cutoff_time = current_time - 600  # 10分钟
-        login_attempts[ip_address] = [
-            timestamp for timestamp in login_attempts[ip_address] 
-            if timestamp > cutoff_time
-        ]
+        login_limiter.hit(ip_address)
     
     @staticmethod
     def _clear_failed_attempts(ip_address):
@@ -160,8 +258,7 @@ class Auth:
         Args:
             ip_address (str): IP地址
         """
-        if ip_address in login_attempts:
-            del login_attempts[ip_address]
+        login_limiter.reset(ip_address)
     
     @staticmethod
     def _is_rate_limited(ip_address):
@@ -174,16 +271,5 @@ class Auth:
         Returns:
             bool: 是否被限流
         """
-        if ip_address not in login_attempts:
-            return False
-        
-        current_time = time.time()
-        # 只考虑最近5分钟的尝试
-        cutoff_time = current_time - 300  # 5分钟
-        recent_attempts = [
-            timestamp for timestamp in login_attempts[ip_address] 
-            if timestamp > cutoff_time
-        ]
-        
-        # 如果最近5分钟内尝试超过5次，则限流
-        return len(recent_attempts) >= 5
\ No newline at end of file
+        # 窗口内失败次数已达上限时，下一次尝试不被允许
+        return not login_limiter.peek(ip_address).allowed
\ No newline at end of file
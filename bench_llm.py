@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+大模型接口压测
+使用本地模拟提供方（LLM_PROVIDER=stub）并发请求 /api/generate-lesson 和 /api/interactive-chat，
+统计各接口的 p50/p95/p99 延迟、吞吐量和状态码分布，流式对话另外统计首字节延迟，
+用于在无网络环境下评估缓存、并发调度和流式输出的效果
+
+用法:
+    python bench_llm.py [--endpoints lesson chat] [--concurrency 16] [--requests 200] [--users 16] [--stream]
+                        [--latency 0.5] [--tokens-per-second 50] [--output-tokens 200] [--failure-rate 0]
+    python bench_llm.py --url http://localhost:5000    # 压测已启动的服务（服务端需设置LLM_PROVIDER=stub）
+
+注意：进程内压测会连接MONGO_URI指定的数据库；默认放宽接口限流（--keep-limits保留），
+并发调度、熔断和令牌额度仍按配置生效，被拒绝的请求计入429。
+"""
+
+import sys
+import os
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(PROJECT_ROOT)
+
+TOPICS = ['python_basics', 'data_structures', 'web_development', 'machine_learning']
+
+def percentile(sorted_values, p):
+    """最近秩法计算百分位数"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+def make_request(endpoint, index, stream):
+    """
+    构造第index个请求
+
+    Returns:
+        tuple: (路径, 请求体)
+    """
+    topic = TOPICS[index % len(TOPICS)]
+    if endpoint == 'lesson':
+        return '/api/generate-lesson', {'learning_goal': topic}
+    return '/api/interactive-chat', {'message': f'请解释{topic}中的第{index}个问题', 'topic': topic, 'stream': stream}
+
+class InProcessClient:
+    """通过Flask测试客户端在进程内发送请求（每个线程一个客户端）"""
+
+    def __init__(self):
+        from app import app
+        self.app = app
+        self._local = threading.local()
+
+    def post(self, path, body, headers):
+        """
+        发送请求并读取完整响应
+
+        Returns:
+            tuple: (状态码, 首字节耗时秒数)
+        """
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        started = time.perf_counter()
+        response = client.post(path, json=body, headers=headers, buffered=False)
+        first_byte = None
+        for _ in response.response:
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+        response.close()
+        return response.status_code, first_byte
+
+class HttpClient:
+    """通过HTTP请求已启动的服务"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def post(self, path, body, headers):
+        """
+        发送请求并读取完整响应
+
+        Returns:
+            tuple: (状态码, 首字节耗时秒数)
+        """
+        data = json.dumps(body).encode('utf-8')
+        request = urllib.request.Request(self.base_url + path, data=data, method='POST',
+                                         headers=dict(headers, **{'Content-Type': 'application/json'}))
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                response.read(1)
+                first_byte = time.perf_counter() - started
+                response.read()
+                return response.status, first_byte
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code, None
+
+def user_headers(index):
+    """第index个模拟用户的请求头：JWT令牌和独立的客户端IP"""
+    from utils.security import SecurityUtil
+    user_id = f"{index + 1:024x}"
+    token = SecurityUtil.generate_jwt_token(user_id, f"bench_llm_{index}")
+    return {
+        'Authorization': f'Bearer {token}',
+        'X-Real-IP': f'10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}'
+    }
+
+def run_endpoint(client, endpoint, args):
+    """
+    并发压测一个接口
+
+    Returns:
+        dict: 延迟、首字节延迟、状态码分布和总耗时
+    """
+    headers = [user_headers(i) for i in range(args.users)]
+    latencies, first_bytes, statuses = [], [], Counter()
+    lock = threading.Lock()
+
+    def send(index):
+        path, body = make_request(endpoint, index, args.stream)
+        started = time.perf_counter()
+        try:
+            status, first_byte = client.post(path, body, headers[index % args.users])
+        except Exception as e:
+            status, first_byte = type(e).__name__, None
+        elapsed = time.perf_counter() - started
+        with lock:
+            statuses[status] += 1
+            if status == 200:
+                latencies.append(elapsed)
+                if first_byte is not None:
+                    first_bytes.append(first_byte)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(send, range(args.requests)))
+    return {
+        'latencies': sorted(latencies),
+        'first_bytes': sorted(first_bytes),
+        'statuses': statuses,
+        'elapsed': time.perf_counter() - started
+    }
+
+def report(endpoint, result, stream):
+    """输出一个接口的压测结果"""
+    latencies = result['latencies']
+    print(f"\n== {endpoint}{'（流式）' if stream and endpoint == 'chat' else ''} ==")
+    print(f"状态码:   {dict(result['statuses'])}")
+    print(f"吞吐量:   {len(latencies) / result['elapsed']:.1f} 成功请求/秒（总耗时 {result['elapsed']:.2f} 秒）")
+    print(f"{'':<10} {'p50':>8} {'p95':>8} {'p99':>8}   (ms)")
+    print(f"{'延迟':<10} " + ' '.join(f"{percentile(latencies, p) * 1000:>8.1f}" for p in (50, 95, 99)))
+    if stream and endpoint == 'chat' and result['first_bytes']:
+        print(f"{'首字节':<9} " + ' '.join(f"{percentile(result['first_bytes'], p) * 1000:>8.1f}" for p in (50, 95, 99)))
+
+def main():
+    """运行压测"""
+    parser = argparse.ArgumentParser(description='大模型接口压测')
+    parser.add_argument('--url', help='已启动服务的地址，不指定时在进程内压测')
+    parser.add_argument('--endpoints', nargs='+', choices=['lesson', 'chat'], default=['lesson', 'chat'])
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--users', type=int, default=16)
+    parser.add_argument('--stream', action='store_true', help='交互式对话使用流式输出')
+    parser.add_argument('--latency', type=float, default=0.5, help='模拟提供方首个令牌前的延迟（秒）')
+    parser.add_argument('--tokens-per-second', type=float, default=50)
+    parser.add_argument('--output-tokens', type=int, default=200)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--keep-limits', action='store_true', help='保留接口限流配置')
+    args = parser.parse_args()
+
+    if args.url:
+        client = HttpClient(args.url)
+    else:
+        # 配置在导入应用时读取，必须先设置环境变量
+        os.environ['LLM_PROVIDER'] = 'stub'
+        os.environ['STUB_LLM_LATENCY'] = str(args.latency)
+        os.environ['STUB_LLM_TOKENS_PER_SECOND'] = str(args.tokens_per_second)
+        os.environ['STUB_LLM_OUTPUT_TOKENS'] = str(args.output_tokens)
+        os.environ['STUB_LLM_FAILURE_RATE'] = str(args.failure_rate)
+        if not args.keep_limits:
+            for name in ('CHAT_RATE_LIMIT', 'LESSON_RATE_LIMIT'):
+                os.environ[name] = str(args.requests * 10)
+        client = InProcessClient()
+
+    print(f"并发 {args.concurrency}，每个接口 {args.requests} 个请求，{args.users} 个模拟用户")
+    for endpoint in args.endpoints:
+        report(endpoint, run_endpoint(client, endpoint, args), args.stream)
+
+if __name__ == "__main__":
+    main()
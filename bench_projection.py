@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+字段投影基准测试
+对比旧结构（学习历史内嵌在用户文档、读取整个文档）与新结构
+（learning_events集合 + 字段投影）下各端点的数据传输量和延迟
+
+用法:
+    python bench_projection.py [--uri mongodb://localhost:27017] [--sizes 1000 10000] [--repeat 20]
+
+注意：脚本会在独立的数据库中写入测试数据，结束后删除该数据库。
+"""
+
+import sys
+import os
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import bson
+from pymongo import MongoClient
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from progress_tracker import HISTORY_SORT, HISTORY_PROJECTION
+
+TOPICS = ['python_basics', 'data_structures', 'web_development', 'machine_learning']
+
+def make_history(size):
+    """生成模拟学习历史"""
+    now = datetime.utcnow()
+    return [
+        {
+            'topic': TOPICS[i % len(TOPICS)],
+            'type': 'exercise',
+            'correct': i % 3 != 0,
+            'time_spent': 5,
+            'question': '以下哪个是Python的合法变量名？' * 2,
+            'completed_at': now - timedelta(minutes=37 * i)
+        }
+        for i in range(size)
+    ]
+
+def seed(database, size):
+    """写入旧结构用户和新结构用户，返回两者的ID"""
+    history = make_history(size)
+    knowledge_graph = {topic: 0.5 for topic in TOPICS}
+    knowledge_graph['level'] = 'intermediate'
+    base = {
+        'email': f'bench{size}@example.com',
+        'password': 'x' * 32 + ':' + 'y' * 64,
+        'created_at': datetime.utcnow(),
+        'knowledge_graph': knowledge_graph
+    }
+
+    legacy_id = database.users.insert_one(
+        dict(base, username=f'legacy_{size}', learning_history=history)
+    ).inserted_id
+    current_id = database.users.insert_one(dict(base, username=f'current_{size}')).inserted_id
+    database.learning_events.insert_many([dict(entry, user_id=current_id) for entry in history])
+    database.learning_events.create_index([('user_id', 1), ('completed_at', -1), ('_id', -1)])
+    return legacy_id, current_id
+
+def doc_size(result):
+    """返回结果的BSON字节数（近似网络传输量）"""
+    docs = result if isinstance(result, list) else [result]
+    return sum(len(bson.encode(doc)) for doc in docs if doc)
+
+def legacy_endpoints(database, user_id):
+    """旧实现：每个端点都读取完整的用户文档"""
+    def knowledge_graph():
+        return [database.users.find_one({'_id': user_id})]
+
+    def learning_history():
+        user = database.users.find_one({'_id': user_id})
+        # 旧实现在Python中对整个数组排序后再分页
+        sorted(user['learning_history'], key=lambda x: x['completed_at'], reverse=True)[:10]
+        return [user]
+
+    def progress_summary():
+        return [database.users.find_one({'_id': user_id})]
+
+    return {
+        'GET /api/knowledge-graph': knowledge_graph,
+        'GET /api/learning-history': learning_history,
+        'GET /api/progress': progress_summary
+    }
+
+def current_endpoints(database, user_id):
+    """新实现：字段投影 + learning_events索引查询"""
+    since = datetime.utcnow() - timedelta(days=7)
+
+    def knowledge_graph():
+        return [database.users.find_one({'_id': user_id}, {'knowledge_graph': 1})]
+
+    def learning_history():
+        events = list(
+            database.learning_events.find({'user_id': user_id}, HISTORY_PROJECTION)
+            .sort(HISTORY_SORT).limit(11)
+        )
+        database.learning_events.count_documents({'user_id': user_id})
+        return events
+
+    def progress_summary():
+        user = database.users.find_one({'_id': user_id}, {'knowledge_graph': 1})
+        recent = list(
+            database.learning_events.find({'user_id': user_id}, HISTORY_PROJECTION)
+            .sort(HISTORY_SORT).limit(5)
+        )
+        weekly = list(database.learning_events.find(
+            {'user_id': user_id, 'completed_at': {'$gte': since}}, HISTORY_PROJECTION
+        ))
+        database.learning_events.count_documents({'user_id': user_id})
+        return [user] + recent + weekly
+
+    return {
+        'GET /api/knowledge-graph': knowledge_graph,
+        'GET /api/learning-history': learning_history,
+        'GET /api/progress': progress_summary
+    }
+
+def measure(func, repeat):
+    """返回 (传输字节数, 延迟中位数毫秒)"""
+    size = doc_size(func())
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return size, statistics.median(timings)
+
+def main():
+    """运行基准测试"""
+    parser = argparse.ArgumentParser(description='字段投影基准测试')
+    parser.add_argument('--uri', default=os.environ.get('MONGO_URI', 'mongodb://localhost:27017'))
+    parser.add_argument('--db', default='ai_learning_companion_bench')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    client = MongoClient(args.uri)
+    client.drop_database(args.db)
+    database = client[args.db]
+
+    print(f"{'历史条数':>8} {'端点':<28} {'旧字节数':>12} {'新字节数':>10} {'旧延迟ms':>10} {'新延迟ms':>10}")
+    try:
+        for size in args.sizes:
+            legacy_id, current_id = seed(database, size)
+            legacy = legacy_endpoints(database, legacy_id)
+            current = current_endpoints(database, current_id)
+            for endpoint in legacy:
+                old_bytes, old_ms = measure(legacy[endpoint], args.repeat)
+                new_bytes, new_ms = measure(current[endpoint], args.repeat)
+                print(f"{size:>8} {endpoint:<28} {old_bytes:>12} {new_bytes:>10} {old_ms:>10.2f} {new_ms:>10.2f}")
+    finally:
+        client.drop_database(args.db)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+启动耗时基准测试
+在全新的Python进程中导入 app / tasks 模块，统计 python -X importtime 的导入总耗时、
+最耗时的依赖包以及导入后的常驻内存（RSS），用于评估工作进程的冷启动开销
+
+用法:
+    python bench_startup.py [--modules app tasks] [--repeat 5] [--top 10]
+
+注意：导入app/tasks时会连接MONGO_URI指定的数据库。
+"""
+
+import sys
+import os
+import argparse
+import re
+import statistics
+import subprocess
+from collections import defaultdict
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)$')
+
+# 子进程中导入模块后输出RSS峰值（Linux下单位为KB）
+PROBE = "import resource, {module}; print('RSS_KB', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+
+def run_import(module):
+    """
+    在新进程中导入模块
+
+    Returns:
+        tuple: (导入总耗时微秒, {顶层包: 自身耗时微秒}, RSS峰值KB)
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE.format(module=module)],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else '导入失败')
+
+    total = 0
+    packages = defaultdict(int)
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        packages[name.split('.')[0]] += int(self_us)
+        # 缩进最少的行是被直接导入的模块，其累计耗时之和即导入总耗时
+        if len(indent) == 1:
+            total += int(cumulative_us)
+
+    rss = 0
+    for line in result.stdout.splitlines():
+        if line.startswith('RSS_KB'):
+            rss = int(line.split()[1])
+    return total, packages, rss
+
+def main():
+    """运行基准测试"""
+    parser = argparse.ArgumentParser(description='启动耗时基准测试')
+    parser.add_argument('--modules', nargs='+', default=['app', 'tasks'])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    for module in args.modules:
+        totals, rss_values = [], []
+        packages = defaultdict(list)
+        try:
+            for _ in range(args.repeat):
+                total, package_times, rss = run_import(module)
+                totals.append(total)
+                rss_values.append(rss)
+                for name, self_us in package_times.items():
+                    packages[name].append(self_us)
+        except RuntimeError as e:
+            print(f"❌ 导入 {module} 失败: {e}")
+            continue
+
+        print(f"\n== import {module}（{args.repeat} 次，取中位数）==")
+        print(f"导入总耗时: {statistics.median(totals) / 1000:.1f} ms")
+        print(f"RSS峰值:    {statistics.median(rss_values) / 1024:.1f} MB")
+        print(f"{'包':<24} {'自身耗时ms':>10}")
+        heaviest = sorted(packages.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+        for name, times in heaviest[:args.top]:
+            print(f"{name:<24} {statistics.median(times) / 1000:>10.1f}")
+
+if __name__ == "__main__":
+    main()
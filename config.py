@@ -14,9 +14,37 @@ class Config:
     # 数据库配置
     MONGO_URI = os.environ.get('MONGO_URI') or 'mongodb://localhost:27017/ai_learning_companion'
     
+    # 数据库连接池配置（每个进程一个连接池；超时单位为毫秒，MONGO_SOCKET_TIMEOUT_MS为0表示不限）
+    MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE') or 50)
+    MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE') or 0)
+    MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS') or 300000)
+    MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS') or 5000)
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS') or 5000)
+    MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS') or 0) or None
+    
     # JWT配置
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-string'
     
+    # 已验证令牌缓存配置
+    TOKEN_CACHE_MAX_ENTRIES = int(os.environ.get('TOKEN_CACHE_MAX_ENTRIES') or 10000)
+    TOKEN_CACHE_TTL = int(os.environ.get('TOKEN_CACHE_TTL') or 300)
+    # 令牌吊销记录存储（mongo/redis，redis使用REDIS_URL），在多个工作进程间共享
+    TOKEN_REVOCATION_BACKEND = os.environ.get('TOKEN_REVOCATION_BACKEND') or 'mongo'
+    # 确认未吊销的令牌多少秒内不再查询吊销记录（其他工作进程发起的吊销最迟在这么久后生效）
+    TOKEN_REVOCATION_CHECK_TTL = float(os.environ.get('TOKEN_REVOCATION_CHECK_TTL') or 10)
+    # 吊销记录存储不可用时：false（默认）拒绝近期未确认过的令牌，true放行（已登出的令牌可能重新生效）
+    TOKEN_REVOCATION_FAIL_OPEN = (os.environ.get('TOKEN_REVOCATION_FAIL_OPEN') or 'false').lower() == 'true'
+    
+    # 限流配置（RATE_LIMIT_BACKEND: memory/redis，redis使用REDIS_URL在多个工作进程间共享计数）
+    # 各接口的限制为窗口（秒）内允许的最大次数；登录按IP统计失败次数
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND') or 'memory'
+    LOGIN_RATE_LIMIT = int(os.environ.get('LOGIN_RATE_LIMIT') or 5)
+    LOGIN_RATE_WINDOW = int(os.environ.get('LOGIN_RATE_WINDOW') or 300)
+    CHAT_RATE_LIMIT = int(os.environ.get('CHAT_RATE_LIMIT') or 20)
+    CHAT_RATE_WINDOW = int(os.environ.get('CHAT_RATE_WINDOW') or 60)
+    LESSON_RATE_LIMIT = int(os.environ.get('LESSON_RATE_LIMIT') or 10)
+    LESSON_RATE_WINDOW = int(os.environ.get('LESSON_RATE_WINDOW') or 60)
+    
     # Redis配置（用于Celery）
     REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
     
@@ -24,8 +52,70 @@ class Config:
     CELERY_BROKER_URL = REDIS_URL
     CELERY_RESULT_BACKEND = REDIS_URL
     
+    # 定时任务分片配置：每个分片的用户数、分析任务每批处理的用户数
+    JOB_CHUNK_SIZE = int(os.environ.get('JOB_CHUNK_SIZE') or 5000)
+    ANALYSIS_BATCH_SIZE = int(os.environ.get('ANALYSIS_BATCH_SIZE') or 500)
+    # 分片租约时长（秒，超过该时间未完成的分片可被重新领取）、每个分片的最大领取次数、
+    # 运行的最长时间（小时，超过后放弃该运行，下次触发时重新规划）
+    JOB_CHUNK_LEASE_SECONDS = int(os.environ.get('JOB_CHUNK_LEASE_SECONDS') or 1800)
+    JOB_CHUNK_MAX_ATTEMPTS = int(os.environ.get('JOB_CHUNK_MAX_ATTEMPTS') or 5)
+    JOB_RUN_MAX_AGE_HOURS = float(os.environ.get('JOB_RUN_MAX_AGE_HOURS') or 20)
+    
+    # 超过该天数未学习的用户会收到学习提醒
+    REMINDER_INACTIVE_DAYS = int(os.environ.get('REMINDER_INACTIVE_DAYS') or 3)
+    
     # 阿里云百炼API配置
     DASHSCOPE_API_KEY = os.environ.get('DASHSCOPE_API_KEY') or None
+    
+    # 大模型提供方（LLM_PROVIDER: dashscope/stub，stub为本地模拟提供方，用于离线压测）及模型名称
+    LLM_PROVIDER = os.environ.get('LLM_PROVIDER') or 'dashscope'
+    LLM_MODEL = os.environ.get('LLM_MODEL') or 'qwen-plus'
+    
+    # 模拟提供方配置：首个令牌前的延迟（秒）、生成速度（令牌/秒）、每次输出令牌数、失败率、随机种子
+    STUB_LLM_LATENCY = float(os.environ.get('STUB_LLM_LATENCY') or 0.5)
+    STUB_LLM_TOKENS_PER_SECOND = float(os.environ.get('STUB_LLM_TOKENS_PER_SECOND') or 50)
+    STUB_LLM_OUTPUT_TOKENS = int(os.environ.get('STUB_LLM_OUTPUT_TOKENS') or 200)
+    STUB_LLM_FAILURE_RATE = float(os.environ.get('STUB_LLM_FAILURE_RATE') or 0)
+    STUB_LLM_SEED = int(os.environ.get('STUB_LLM_SEED') or 0)
+    
+    # 大模型响应缓存配置（LLM_CACHE_BACKEND: none/redis/mongo）
+    LLM_CACHE_BACKEND = os.environ.get('LLM_CACHE_BACKEND') or 'none'
+    LLM_CACHE_TTL = int(os.environ.get('LLM_CACHE_TTL') or 86400)
+    LLM_CACHE_MAX_ENTRIES = int(os.environ.get('LLM_CACHE_MAX_ENTRIES') or 512)
+    
+    # 大模型并发调用配置
+    LLM_POOL_WORKERS = int(os.environ.get('LLM_POOL_WORKERS') or 8)
+    LLM_CALL_TIMEOUT = float(os.environ.get('LLM_CALL_TIMEOUT') or 20)
+    
+    # 大模型调用调度配置：全局并发上限、最大排队数、排队等待时间（秒）、
+    # 每用户同时进行中的请求数、每用户每天的令牌额度（0表示不限）
+    LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY') or 8)
+    LLM_MAX_QUEUE = int(os.environ.get('LLM_MAX_QUEUE') or 16)
+    LLM_QUEUE_TIMEOUT = float(os.environ.get('LLM_QUEUE_TIMEOUT') or 5)
+    LLM_USER_MAX_INFLIGHT = int(os.environ.get('LLM_USER_MAX_INFLIGHT') or 2)
+    LLM_USER_DAILY_TOKENS = int(os.environ.get('LLM_USER_DAILY_TOKENS') or 200000)
+    # ASGI服务中异步调用的并发上限（等待模型响应时不占用线程，可远高于LLM_MAX_CONCURRENCY）
+    LLM_ASYNC_MAX_CONCURRENCY = int(os.environ.get('LLM_ASYNC_MAX_CONCURRENCY') or 256)
+    
+    # 大模型熔断配置：统计最近多少次调用、至少多少次调用才判断、失败率阈值、
+    # 慢调用耗时（秒）及比例阈值、熔断持续时间（秒）
+    LLM_BREAKER_WINDOW = int(os.environ.get('LLM_BREAKER_WINDOW') or 20)
+    LLM_BREAKER_MIN_CALLS = int(os.environ.get('LLM_BREAKER_MIN_CALLS') or 10)
+    LLM_BREAKER_ERROR_RATE = float(os.environ.get('LLM_BREAKER_ERROR_RATE') or 0.5)
+    LLM_BREAKER_SLOW_CALL_SECONDS = float(os.environ.get('LLM_BREAKER_SLOW_CALL_SECONDS') or 10)
+    LLM_BREAKER_SLOW_RATE = float(os.environ.get('LLM_BREAKER_SLOW_RATE') or 0.8)
+    LLM_BREAKER_OPEN_SECONDS = float(os.environ.get('LLM_BREAKER_OPEN_SECONDS') or 30)
+    
+    # 对冲模式：生成超过该秒数仍未完成时先返回预定义内容，生成在后台完成后写入缓存（0表示不启用）
+    LLM_HEDGE_BUDGET = float(os.environ.get('LLM_HEDGE_BUDGET') or 0)
+
+    # 图表缓存配置（默认存放在系统临时目录，多个工作进程共享）
+    CHART_CACHE_DIR = os.environ.get('CHART_CACHE_DIR') or None
+    CHART_CACHE_MAX_BYTES = int(os.environ.get('CHART_CACHE_MAX_BYTES') or 64 * 1024 * 1024)
+    
+    # 图表渲染进程池配置：进程数、学习报告等待渲染的时间预算（秒）
+    CHART_POOL_WORKERS = int(os.environ.get('CHART_POOL_WORKERS') or 2)
+    CHART_RENDER_TIMEOUT = float(os.environ.get('CHART_RENDER_TIMEOUT') or 3)
 
 class DevelopmentConfig(Config):
     """开发环境配置"""
@@ -0,0 +1,69 @@
+"""
+测试公共夹具
+- mongo_db: 默认使用mongomock；设置TEST_MONGO_URI后改为连接该数据库（测试会清空用到的集合）
+- clock: 可手动推进的时钟，替换测试模块CLOCK_MODULES中列出的模块的time
+"""
+
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import db
+
+@pytest.fixture
+def mongo_db():
+    """
+    将全局数据库句柄替换为测试数据库，测试结束后恢复
+
+    只替换database.db持有的连接，不修改pymongo模块，因此不影响其他测试模块。
+
+    Yields:
+        Database: 全局数据库实例
+    """
+    saved = (db._client, db._db, db._pid)
+    if os.environ.get('TEST_MONGO_URI'):
+        from pymongo import MongoClient
+        client = MongoClient(os.environ['TEST_MONGO_URI'])
+    else:
+        import mongomock
+        client = mongomock.MongoClient()
+    db._client, db._pid = client, os.getpid()
+    db._db = client.get_default_database('ai_learning_companion_test')
+    try:
+        yield db
+    finally:
+        client.close()
+        db._client, db._db, db._pid = saved
+
+class FakeClock:
+    """可手动推进的时钟（同时提供time和monotonic）"""
+
+    def __init__(self, now=6000.0):
+        """
+        Args:
+            now (float): 初始时间，默认取60的整数倍，便于按窗口计算已经过的秒数
+        """
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+@pytest.fixture
+def clock(request, monkeypatch):
+    """
+    替换测试模块CLOCK_MODULES中各模块的time，只影响被测模块，不修改全局time
+
+    Returns:
+        FakeClock: 修改now即可推进时间
+    """
+    fake = FakeClock()
+    for module in getattr(request.module, 'CLOCK_MODULES', ()):
+        monkeypatch.setattr(module, 'time', fake)
+    return fake
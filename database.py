@@ -6,6 +6,8 @@
 from pymongo import MongoClient
 from config import Config
 import logging
+import os
+import threading
 
 logger = logging.getLogger(__name__)
 
@@ -13,35 +15,120 @@ class Database:
     """数据库操作类"""
     
     def __init__(self):
-        """初始化数据库连接"""
+        """
+        初始化数据库句柄
+        
+        不在导入时连接数据库：连接在首次访问时建立，每个进程各自持有连接池。
+        fork出的子进程（gunicorn/Celery工作进程）会丢弃继承来的连接，重新连接。
+        """
+        self._client = None
+        self._db = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+    
+    def _reset_after_fork(self):
+        """fork后在子进程中丢弃父进程的连接（MongoClient不能跨fork使用）"""
+        self._client = None
+        self._db = None
+        self._pid = None
+        self._lock = threading.Lock()
+    
+    def _connect(self):
+        """建立数据库连接（每个进程一次）"""
+        pid = os.getpid()
+        if self._client is not None and self._pid == pid:
+            return
+        with self._lock:
+            if self._client is not None and self._pid == pid:
+                return
+            try:
+                client = MongoClient(
+                    Config.MONGO_URI,
+                    maxPoolSize=Config.MONGO_MAX_POOL_SIZE,
+                    minPoolSize=Config.MONGO_MIN_POOL_SIZE,
+                    maxIdleTimeMS=Config.MONGO_MAX_IDLE_TIME_MS,
+                    connectTimeoutMS=Config.MONGO_CONNECT_TIMEOUT_MS,
+                    serverSelectionTimeoutMS=Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                    socketTimeoutMS=Config.MONGO_SOCKET_TIMEOUT_MS
+                )
+                self._db = client.get_default_database()
+                self._client = client
+                self._pid = pid
+                logger.info(f"数据库连接已创建（进程 {pid}）")
+            except Exception as e:
+                logger.error(f"数据库连接失败: {e}")
+                raise
+    
+    @property
+    def client(self):
+        """MongoClient实例（首次访问时连接）"""
+        self._connect()
+        return self._client
+    
+    @property
+    def db(self):
+        """默认数据库（首次访问时连接）"""
+        self._connect()
+        return self._db
+    
+    def ping(self):
+        """
+        检查数据库是否可用
+        
+        Returns:
+            bool: 是否可用
+        """
         try:
-            self.client = MongoClient(Config.MONGO_URI)
-            self.db = self.client.get_default_database()
-            # 测试连接
             self.client.admin.command('ping')
-            logger.info("数据库连接成功")
-            
-            # 创建索引
-            self._create_indexes()
+            return True
         except Exception as e:
-            logger.error(f"数据库连接失败: {e}")
-            raise
+            logger.error(f"数据库连接检查失败: {e}")
+            return False
     
-    def _create_indexes(self):
-        """创建数据库索引以提高查询性能"""
-        try:
-            # 为用户集合创建索引
-            users_collection = self.get_collection('users')
-            users_collection.create_index('username', unique=True)
-            users_collection.create_index('email', unique=True)
-            users_collection.create_index('created_at')
-            
-            # 为学习历史创建索引
-            users_collection.create_index([('learning_history.completed_at', -1)])
-            
-            logger.info("数据库索引创建成功")
-        except Exception as e:
-            logger.error(f"创建数据库索引失败: {e}")
+    def create_indexes(self):
+        """
+        创建数据库索引以提高查询性能
+        
+        索引创建不在应用启动时执行，部署或升级时通过 python migrate.py create-indexes 执行一次。
+        """
+        # 为用户集合创建索引
+        users_collection = self.get_collection('users')
+        users_collection.create_index('username', unique=True)
+        users_collection.create_index('email', unique=True)
+        users_collection.create_index('created_at')
+        # 按最近活跃时间范围查询不活跃用户
+        users_collection.create_index('last_active_at')
+        
+        # 为学习历史集合创建复合索引（按用户查询，并按与分页排序一致的 (完成时间, _id) 倒序），
+        # 游标分页的每一页都只需沿索引扫描，不在内存中排序
+        events_collection = self.get_collection('learning_events')
+        events_collection.create_index([('user_id', 1), ('completed_at', -1), ('_id', -1)])
+        # 旧版本的 (user_id, completed_at) 索引是新索引的前缀，已不再需要
+        if 'user_id_1_completed_at_-1' in events_collection.index_information():
+            events_collection.drop_index('user_id_1_completed_at_-1')
+        
+        # 每日学习活动汇总（每个用户每天一个文档）
+        self.get_collection('user_daily_activity').create_index([('user_id', 1), ('date', 1)], unique=True)
+        
+        # 定时任务运行记录和分片索引（查找未完成的运行、按序号领取分片）
+        self.get_collection('job_runs').create_index([('job', 1), ('status', 1), ('started_at', -1)])
+        self.get_collection('job_chunks').create_index([('run_id', 1), ('index', 1)], unique=True)
+        
+        # 提醒发送记录（以 _id 去重），按用户查询
+        self.get_collection('reminder_ledger').create_index('user_id')
+        
+        # 已吊销的令牌（保留到令牌过期，由TTL索引自动清理）
+        self.get_collection('token_revocations').create_index('expires_at', expireAfterSeconds=0)
+        
+        # 大模型响应共享缓存（过期条目由TTL索引自动清理）
+        self.get_collection('llm_cache').create_index('expires_at', expireAfterSeconds=0)
+        
+        # 大模型令牌用量（每个用户每天一个文档）
+        self.get_collection('llm_usage').create_index([('subject', 1), ('date', 1)], unique=True)
+        
+        logger.info("数据库索引创建成功")
     
     def get_collection(self, name):
         """
@@ -69,21 +156,37 @@ class Database:
         collection = self.get_collection(collection_name)
         return collection.insert_one(document)
     
-    def find_one(self, collection_name, filter_query):
+    def insert_many(self, collection_name, documents, ordered=True):
+        """
+        批量插入文档
+        
+        Args:
+            collection_name (str): 集合名称
+            documents (list): 文档列表
+            ordered (bool): 是否按顺序插入，遇到错误时是否停止
+            
+        Returns:
+            InsertManyResult: 插入结果
+        """
+        collection = self.get_collection(collection_name)
+        return collection.insert_many(documents, ordered=ordered)
+    
+    def find_one(self, collection_name, filter_query, projection=None):
         """
         查找单个文档
         
         Args:
             collection_name (str): 集合名称
             filter_query (dict): 查询条件
+            projection (dict): 字段投影，例如{'knowledge_graph': 1}，None表示返回全部字段
             
         Returns:
             dict: 查找到的文档，未找到返回None
         """
         collection = self.get_collection(collection_name)
-        return collection.find_one(filter_query)
+        return collection.find_one(filter_query, projection)
     
-    def find_many(self, collection_name, filter_query, limit=0, skip=0, sort=None):
+    def find_many(self, collection_name, filter_query, limit=0, skip=0, sort=None, projection=None):
         """
         查找多个文档
         
@@ -93,12 +196,13 @@ class Database:
             limit (int): 限制返回数量，0表示不限制
             skip (int): 跳过数量
             sort (list): 排序规则，例如[('created_at', -1)]
+            projection (dict): 字段投影，None表示返回全部字段
             
         Returns:
             list: 查找到的文档列表
         """
         collection = self.get_collection(collection_name)
-        cursor = collection.find(filter_query)
+        cursor = collection.find(filter_query, projection)
         
         if sort:
             cursor = cursor.sort(sort)
@@ -111,7 +215,7 @@ class Database:
             
         return list(cursor)
     
-    def find_many_with_count(self, collection_name, filter_query, limit=0, skip=0, sort=None):
+    def find_many_with_count(self, collection_name, filter_query, limit=0, skip=0, sort=None, projection=None):
         """
         查找多个文档并返回总数（用于分页）
         
@@ -121,6 +225,7 @@ class Database:
             limit (int): 限制返回数量，0表示不限制
             skip (int): 跳过数量
             sort (list): 排序规则
+            projection (dict): 字段投影，None表示返回全部字段
             
         Returns:
             tuple: (文档列表, 总数)
@@ -131,7 +236,7 @@ class Database:
         total = collection.count_documents(filter_query)
         
         # 获取文档
-        cursor = collection.find(filter_query)
+        cursor = collection.find(filter_query, projection)
         
         if sort:
             cursor = cursor.sort(sort)
@@ -144,6 +249,56 @@ class Database:
             
         return list(cursor), total
     
+    def find_iter(self, collection_name, filter_query, projection=None, sort=None, batch_size=500):
+        """
+        以游标方式遍历文档（不一次性加载到内存）
+        
+        Args:
+            collection_name (str): 集合名称
+            filter_query (dict): 查询条件
+            projection (dict): 返回字段投影
+            sort (list): 排序条件
+            batch_size (int): 每批从服务端获取的文档数
+            
+        Returns:
+            Cursor: MongoDB游标
+        """
+        collection = self.get_collection(collection_name)
+        cursor = collection.find(filter_query, projection).batch_size(batch_size)
+        
+        if sort:
+            cursor = cursor.sort(sort)
+            
+        return cursor
+    
+    def aggregate(self, collection_name, pipeline):
+        """
+        执行聚合查询
+        
+        Args:
+            collection_name (str): 集合名称
+            pipeline (list): 聚合管道
+            
+        Returns:
+            list: 聚合结果
+        """
+        collection = self.get_collection(collection_name)
+        return list(collection.aggregate(pipeline))
+    
+    def count_documents(self, collection_name, filter_query):
+        """
+        统计文档数量
+        
+        Args:
+            collection_name (str): 集合名称
+            filter_query (dict): 查询条件
+            
+        Returns:
+            int: 文档数量
+        """
+        collection = self.get_collection(collection_name)
+        return collection.count_documents(filter_query)
+    
     def update_one(self, collection_name, filter_query, update_data):
         """
         更新单个文档
@@ -159,6 +314,38 @@ class Database:
         collection = self.get_collection(collection_name)
         return collection.update_one(filter_query, {"$set": update_data})
     
+    def update_one_pipeline(self, collection_name, filter_query, pipeline):
+        """
+        使用聚合管道更新单个文档（在服务端基于当前值计算新值，单次原子操作）
+        
+        Args:
+            collection_name (str): 集合名称
+            filter_query (dict): 查询条件
+            pipeline (list): 更新管道，例如[{'$set': {...}}]
+            
+        Returns:
+            UpdateResult: 更新结果
+        """
+        collection = self.get_collection(collection_name)
+        return collection.update_one(filter_query, pipeline)
+    
+    def bulk_write(self, collection_name, operations, ordered=False):
+        """
+        批量执行写操作
+        
+        Args:
+            collection_name (str): 集合名称
+            operations (list): pymongo写操作列表，例如[UpdateOne(...)]
+            ordered (bool): 是否按顺序执行（遇到错误即停止）
+            
+        Returns:
+            BulkWriteResult: 批量写入结果，操作为空时返回None
+        """
+        if not operations:
+            return None
+        collection = self.get_collection(collection_name)
+        return collection.bulk_write(operations, ordered=ordered)
+    
     def delete_one(self, collection_name, filter_query):
         """
         删除单个文档
@@ -173,5 +360,87 @@ class Database:
         collection = self.get_collection(collection_name)
         return collection.delete_one(filter_query)
 
-# 全局数据库实例
-db = Database()
\ No newline at end of file
+class AsyncDatabase:
+    """异步数据库操作类（基于Motor，供ASGI服务使用）"""
+    
+    def __init__(self):
+        """
+        初始化异步数据库句柄
+        
+        Motor客户端绑定创建时所在的事件循环，因此在首次于事件循环中访问时才创建。
+        """
+        self._client = None
+        self._db = None
+    
+    @property
+    def db(self):
+        """默认数据库（首次访问时连接）"""
+        if self._db is None:
+            # motor只有ASGI服务需要，在此处导入
+            from motor.motor_asyncio import AsyncIOMotorClient
+            self._client = AsyncIOMotorClient(
+                Config.MONGO_URI,
+                maxPoolSize=Config.MONGO_MAX_POOL_SIZE,
+                minPoolSize=Config.MONGO_MIN_POOL_SIZE,
+                maxIdleTimeMS=Config.MONGO_MAX_IDLE_TIME_MS,
+                connectTimeoutMS=Config.MONGO_CONNECT_TIMEOUT_MS,
+                serverSelectionTimeoutMS=Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                socketTimeoutMS=Config.MONGO_SOCKET_TIMEOUT_MS
+            )
+            self._db = self._client.get_default_database()
+            logger.info(f"异步数据库连接已创建（进程 {os.getpid()}）")
+        return self._db
+    
+    def get_collection(self, name):
+        """
+        获取集合对象
+        
+        Args:
+            name (str): 集合名称
+            
+        Returns:
+            AsyncIOMotorCollection: Motor集合对象
+        """
+        return self.db[name]
+    
+    async def find_one(self, collection_name, filter_query, projection=None):
+        """
+        查找单个文档
+        
+        Args:
+            collection_name (str): 集合名称
+            filter_query (dict): 查询条件
+            projection (dict): 字段投影，None表示返回全部字段
+            
+        Returns:
+            dict: 查找到的文档，未找到返回None
+        """
+        return await self.get_collection(collection_name).find_one(filter_query, projection)
+    
+    async def update_one(self, collection_name, filter_query, update, upsert=False):
+        """
+        更新单个文档
+        
+        Args:
+            collection_name (str): 集合名称
+            filter_query (dict): 查询条件
+            update (dict): 更新操作，例如{'$inc': {...}}
+            upsert (bool): 文档不存在时是否插入
+            
+        Returns:
+            UpdateResult: 更新结果
+        """
+        return await self.get_collection(collection_name).update_one(filter_query, update, upsert=upsert)
+    
+    def close(self):
+        """关闭连接（ASGI服务关闭时调用）"""
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+            self._db = None
+
+# 全局数据库实例（惰性连接）
+db = Database()
+
+# 全局异步数据库实例（惰性连接，仅在ASGI服务中使用）
+async_db = AsyncDatabase()
\ No newline at end of file
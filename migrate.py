@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+数据迁移脚本
+用于执行一次性的数据库结构迁移
+
+用法:
+    python migrate.py create-indexes
+    python migrate.py learning-history [--batch-size 500]
+    python migrate.py last-active-at [--batch-size 500]
+    python migrate.py daily-activity [--batch-size 500]
+    python migrate.py knowledge-stats [--batch-size 500]
+"""
+
+import sys
+import os
+import argparse
+import logging
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from pymongo import UpdateOne
+from database import db
+from progress_tracker import LEARNING_EVENTS_COLLECTION, DAILY_ACTIVITY_COLLECTION
+
+# 学习进度分析曾写入knowledge_graph的统计字段（现保存在knowledge_stats中）
+KNOWLEDGE_STATS_FIELDS = ['accuracy', 'correct_count', 'total_count', 'knowledge_points', 'analyzed_at']
+
+logger = logging.getLogger(__name__)
+
+def migrate_learning_history(batch_size=500):
+    """
+    将用户文档中内嵌的learning_history数组迁移到learning_events集合
+
+    每个用户单独处理：先删除该用户此前迁移了一半的记录，再批量插入并移除内嵌数组，
+    因此脚本中途失败后可以安全地重新执行。
+
+    Args:
+        batch_size (int): 每次批量插入的记录数
+
+    Returns:
+        dict: 迁移统计 {'users': int, 'events': int}
+    """
+    users_collection = db.get_collection('users')
+    events_collection = db.get_collection(LEARNING_EVENTS_COLLECTION)
+
+    stats = {'users': 0, 'events': 0}
+    cursor = users_collection.find(
+        {'learning_history': {'$exists': True}},
+        {'learning_history': 1}
+    )
+
+    for user in cursor:
+        user_id = user['_id']
+        history = user.get('learning_history') or []
+
+        # 清理上一次未完成的迁移结果，保证幂等
+        events_collection.delete_many({'user_id': user_id, 'migrated': True})
+
+        events = []
+        for entry in history:
+            event = {key: value for key, value in entry.items() if key != '_id'}
+            event['user_id'] = user_id
+            event['migrated'] = True
+            events.append(event)
+
+            if len(events) >= batch_size:
+                db.insert_many(LEARNING_EVENTS_COLLECTION, events, ordered=False)
+                stats['events'] += len(events)
+                events = []
+
+        if events:
+            db.insert_many(LEARNING_EVENTS_COLLECTION, events, ordered=False)
+            stats['events'] += len(events)
+
+        users_collection.update_one({'_id': user_id}, {'$unset': {'learning_history': ''}})
+        stats['users'] += 1
+        logger.info(f"用户 {user_id} 迁移了 {len(history)} 条学习历史")
+
+    return stats
+
+def backfill_last_active_at(batch_size=500):
+    """
+    根据learning_events回填用户的最近活跃时间 last_active_at
+
+    使用$max写入，可重复执行，也不会覆盖迁移期间产生的更新的活跃时间。
+
+    Args:
+        batch_size (int): 每次批量写入的用户数
+
+    Returns:
+        dict: 回填统计 {'users': int}
+    """
+    cursor = db.get_collection(LEARNING_EVENTS_COLLECTION).aggregate(
+        [{'$group': {'_id': '$user_id', 'last_active_at': {'$max': '$completed_at'}}}],
+        allowDiskUse=True
+    )
+
+    stats = {'users': 0}
+    operations = []
+    for row in cursor:
+        if row['last_active_at'] is None:
+            continue
+        operations.append(UpdateOne({'_id': row['_id']}, {'$max': {'last_active_at': row['last_active_at']}}))
+        if len(operations) >= batch_size:
+            db.bulk_write('users', operations)
+            stats['users'] += len(operations)
+            operations = []
+
+    if operations:
+        db.bulk_write('users', operations)
+        stats['users'] += len(operations)
+
+    return stats
+
+def backfill_daily_activity(batch_size=500):
+    """
+    根据learning_events重新计算每个用户每天的学习活动数（user_daily_activity）
+
+    计数直接覆盖写入，可重复执行。执行期间新写入的学习记录可能被多计或漏计一次，
+    建议在访问量低时执行。
+
+    Args:
+        batch_size (int): 每次批量写入的文档数
+
+    Returns:
+        dict: 回填统计 {'days': int}
+    """
+    cursor = db.get_collection(LEARNING_EVENTS_COLLECTION).aggregate(
+        [
+            {'$match': {'completed_at': {'$type': 'date'}}},
+            {'$group': {
+                '_id': {
+                    'user_id': '$user_id',
+                    'date': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$completed_at'}}
+                },
+                'count': {'$sum': 1}
+            }}
+        ],
+        allowDiskUse=True
+    )
+
+    stats = {'days': 0}
+    operations = []
+    for row in cursor:
+        operations.append(UpdateOne(
+            {'user_id': row['_id']['user_id'], 'date': row['_id']['date']},
+            {'$set': {'count': row['count']}},
+            upsert=True
+        ))
+        if len(operations) >= batch_size:
+            db.bulk_write(DAILY_ACTIVITY_COLLECTION, operations)
+            stats['days'] += len(operations)
+            operations = []
+
+    if operations:
+        db.bulk_write(DAILY_ACTIVITY_COLLECTION, operations)
+        stats['days'] += len(operations)
+
+    return stats
+
+def move_knowledge_stats(batch_size=500):
+    """
+    将学习进度分析写入knowledge_graph的统计字段移到knowledge_stats中
+
+    这些字段混在知识点掌握度中，会被图表、推荐和提示词当作知识点。可重复执行。
+
+    Args:
+        batch_size (int): 每次批量写入的用户数
+
+    Returns:
+        dict: 迁移统计 {'users': int}
+    """
+    cursor = db.find_iter(
+        'users',
+        {'$or': [{f'knowledge_graph.{field}': {'$exists': True}} for field in KNOWLEDGE_STATS_FIELDS]},
+        projection={f'knowledge_graph.{field}': 1 for field in KNOWLEDGE_STATS_FIELDS},
+        batch_size=batch_size
+    )
+
+    stats = {'users': 0}
+    operations = []
+    for user in cursor:
+        graph = user.get('knowledge_graph', {})
+        operations.append(UpdateOne({'_id': user['_id']}, {
+            '$set': {f'knowledge_stats.{field}': graph[field] for field in KNOWLEDGE_STATS_FIELDS if field in graph},
+            '$unset': {f'knowledge_graph.{field}': '' for field in KNOWLEDGE_STATS_FIELDS}
+        }))
+        if len(operations) >= batch_size:
+            db.bulk_write('users', operations)
+            stats['users'] += len(operations)
+            operations = []
+
+    if operations:
+        db.bulk_write('users', operations)
+        stats['users'] += len(operations)
+
+    return stats
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='AI个性化学习伴侣 - 数据迁移工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser(
+        'create-indexes',
+        help='创建（或补齐）全部数据库索引，部署和升级时执行'
+    )
+
+    history_parser = subparsers.add_parser(
+        'learning-history',
+        help='将内嵌的learning_history迁移到learning_events集合'
+    )
+    history_parser.add_argument('--batch-size', type=int, default=500)
+
+    last_active_parser = subparsers.add_parser(
+        'last-active-at',
+        help='根据learning_events回填用户的last_active_at字段'
+    )
+    last_active_parser.add_argument('--batch-size', type=int, default=500)
+
+    daily_activity_parser = subparsers.add_parser(
+        'daily-activity',
+        help='根据learning_events回填user_daily_activity每日活动汇总'
+    )
+    daily_activity_parser.add_argument('--batch-size', type=int, default=500)
+
+    knowledge_stats_parser = subparsers.add_parser(
+        'knowledge-stats',
+        help='将knowledge_graph中的答题统计字段移到knowledge_stats'
+    )
+    knowledge_stats_parser.add_argument('--batch-size', type=int, default=500)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == 'create-indexes':
+        db.create_indexes()
+        print("✅ 索引创建完成")
+    elif args.command == 'learning-history':
+        stats = migrate_learning_history(args.batch_size)
+        print(f"✅ 迁移完成：{stats['users']} 个用户，{stats['events']} 条学习历史")
+    elif args.command == 'last-active-at':
+        stats = backfill_last_active_at(args.batch_size)
+        print(f"✅ 回填完成：{stats['users']} 个用户")
+    elif args.command == 'daily-activity':
+        stats = backfill_daily_activity(args.batch_size)
+        print(f"✅ 回填完成：{stats['days']} 条每日活动汇总")
+    elif args.command == 'knowledge-stats':
+        stats = move_knowledge_stats(args.batch_size)
+        print(f"✅ 迁移完成：{stats['users']} 个用户")
+
+if __name__ == "__main__":
+    main()
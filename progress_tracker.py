@@ -3,13 +3,33 @@
 用于跟踪和管理用户学习进度
 """
 
-from database import db
+from database import db, async_db
+from utils.user_loader import load_user, invalidate_user
+from collections import Counter
 import datetime
 from bson import ObjectId
+from pymongo import UpdateOne
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 学习历史集合及其默认排序（与 (user_id, completed_at desc) 索引一致）
+LEARNING_EVENTS_COLLECTION = 'learning_events'
+HISTORY_SORT = [('completed_at', -1), ('_id', -1)]
+
+# 不对外返回的内部字段
+HISTORY_INTERNAL_FIELDS = ('_id', 'user_id', 'migrated')
+
+# 读取学习历史时的投影：_id用于游标分页，其余内部字段不必传输
+HISTORY_PROJECTION = {'user_id': 0, 'migrated': 0}
+
+# 每个用户每天的学习活动计数（写入学习历史时原子递增）
+DAILY_ACTIVITY_COLLECTION = 'user_daily_activity'
+DATE_FORMAT = '%Y-%m-%d'
+
+# 知识图谱中不属于知识点的字段（其余字段为 知识点 -> 掌握度）
+NON_TOPIC_FIELDS = ('level', 'updated_at')
+
 class ProgressTracker:
     """学习进度跟踪类"""
     
@@ -34,6 +54,7 @@ class ProgressTracker:
                 {'_id': ObjectId(user_id)}, 
                 {'knowledge_graph': knowledge_data}
             )
+            invalidate_user(user_id)
             success = result.modified_count > 0
             if success:
                 logger.info(f"用户 {user_id} 知识图谱更新成功")
@@ -56,7 +77,7 @@ class ProgressTracker:
             dict: 知识图谱数据
         """
         try:
-            user = db.find_one('users', {'_id': ObjectId(user_id)})
+            user = load_user(user_id, ['knowledge_graph'])
             knowledge_graph = user.get('knowledge_graph', {}) if user else {}
             logger.debug(f"获取用户 {user_id} 知识图谱成功")
             return knowledge_graph
@@ -64,11 +85,31 @@ class ProgressTracker:
             logger.error(f"获取知识图谱失败: {e}")
             return {}
     
+    @staticmethod
+    async def aget_knowledge_graph(user_id):
+        """
+        获取用户知识图谱（异步版本，供ASGI服务使用）
+        
+        Args:
+            user_id (str): 用户ID
+            
+        Returns:
+            dict: 知识图谱数据
+        """
+        try:
+            user = await async_db.find_one('users', {'_id': ObjectId(user_id)}, {'knowledge_graph': 1})
+            return user.get('knowledge_graph', {}) if user else {}
+        except Exception as e:
+            logger.error(f"获取知识图谱失败: {e}")
+            return {}
+    
     @staticmethod
     def add_learning_history(user_id, lesson_data):
         """
         添加学习历史记录
         
+        学习历史单独存放在learning_events集合中，避免用户文档无限增长
+        
         Args:
             user_id (str): 用户ID
             lesson_data (dict): 课程数据
@@ -80,13 +121,15 @@ class ProgressTracker:
             # 添加时间戳
             lesson_data['completed_at'] = datetime.datetime.utcnow()
             
-            result = db.update_one(
-                'users',
-                {'_id': ObjectId(user_id)},
-                {'$push': {'learning_history': lesson_data}}
-            )
-            success = result.modified_count > 0
+            # _id由数据库生成（用作分页游标），忽略客户端传入的值
+            event = {key: value for key, value in lesson_data.items() if key != '_id'}
+            event['user_id'] = ObjectId(user_id)
+            
+            result = db.insert_one(LEARNING_EVENTS_COLLECTION, event)
+            success = result.inserted_id is not None
             if success:
+                ProgressTracker.touch_last_active(user_id, lesson_data['completed_at'])
+                ProgressTracker.increment_daily_activity(user_id, [lesson_data['completed_at']])
                 logger.info(f"用户 {user_id} 学习历史添加成功")
             else:
                 logger.warning(f"用户 {user_id} 学习历史添加失败")
@@ -96,30 +139,135 @@ class ProgressTracker:
             return False
     
     @staticmethod
-    def get_learning_history(user_id, limit=10, skip=0):
+    def add_learning_events(user_id, events):
         """
-        获取用户学习历史
+        批量添加学习历史记录（一次写入）
         
         Args:
             user_id (str): 用户ID
-            limit (int): 限制返回记录数
-            skip (int): 跳过记录数
+            events (list): 学习记录列表
             
         Returns:
-            list: 学习历史记录列表
+            bool: 添加是否成功
         """
+        if not events:
+            return True
         try:
-            user = db.find_one('users', {'_id': ObjectId(user_id)})
-            history = user.get('learning_history', []) if user else []
+            completed_at = datetime.datetime.utcnow()
+            documents = []
+            for event in events:
+                document = {key: value for key, value in event.items() if key != '_id'}
+                document.setdefault('completed_at', completed_at)
+                document['user_id'] = ObjectId(user_id)
+                documents.append(document)
             
-            # 按时间倒序排列
-            history.sort(key=lambda x: x.get('completed_at', datetime.datetime.min), reverse=True)
+            result = db.insert_many(LEARNING_EVENTS_COLLECTION, documents)
+            completed_times = [document['completed_at'] for document in documents]
+            ProgressTracker.touch_last_active(user_id, max(completed_times))
+            ProgressTracker.increment_daily_activity(user_id, completed_times)
+            logger.info(f"用户 {user_id} 批量添加 {len(result.inserted_ids)} 条学习历史")
+            return len(result.inserted_ids) == len(documents)
+        except Exception as e:
+            logger.error(f"批量添加学习历史失败: {e}")
+            return False
+    
+    @staticmethod
+    def touch_last_active(user_id, active_at):
+        """
+        刷新用户的最近活跃时间（用于按索引查询不活跃用户）
+        
+        使用$max，乱序到达的旧记录不会让时间倒退。
+        
+        Args:
+            user_id (str): 用户ID
+            active_at (datetime): 活跃时间
+        """
+        try:
+            db.get_collection('users').update_one(
+                {'_id': ObjectId(user_id)},
+                {'$max': {'last_active_at': active_at}}
+            )
+        except Exception as e:
+            logger.error(f"更新最近活跃时间失败: {e}")
+    
+    @staticmethod
+    def increment_daily_activity(user_id, completed_times):
+        """
+        按天递增用户的学习活动计数
+        
+        Args:
+            user_id (str): 用户ID
+            completed_times (list): 各条学习记录的完成时间
+        """
+        try:
+            counts = Counter(completed_at.strftime(DATE_FORMAT) for completed_at in completed_times)
+            user_oid = ObjectId(user_id)
+            db.bulk_write(DAILY_ACTIVITY_COLLECTION, [
+                UpdateOne({'user_id': user_oid, 'date': date}, {'$inc': {'count': count}}, upsert=True)
+                for date, count in counts.items()
+            ])
+        except Exception as e:
+            logger.error(f"更新每日学习活动计数失败: {e}")
+    
+    @staticmethod
+    def get_daily_activity(user_id, days=7):
+        """
+        获取最近N天（含今天）每天的学习活动数
+        
+        只读取汇总集合中最多N个小文档，不扫描学习历史。
+        
+        Args:
+            user_id (str): 用户ID
+            days (int): 天数
             
-            # 应用分页
-            paginated_history = history[skip:skip+limit] if limit > 0 else history[skip:]
+        Returns:
+            dict: {日期字符串: 活动数}，按日期正序，没有活动的日期为0
+        """
+        today = datetime.datetime.utcnow().date()
+        dates = [(today - datetime.timedelta(days=i)).strftime(DATE_FORMAT) for i in range(days - 1, -1, -1)]
+        activity = dict.fromkeys(dates, 0)
+        
+        try:
+            rows = db.find_many(
+                DAILY_ACTIVITY_COLLECTION,
+                {'user_id': ObjectId(user_id), 'date': {'$gte': dates[0]}},
+                projection={'_id': 0, 'date': 1, 'count': 1}
+            )
+            for row in rows:
+                if row['date'] in activity:
+                    activity[row['date']] = row['count']
+        except Exception as e:
+            logger.error(f"获取每日学习活动失败: {e}")
+        
+        return activity
+    
+    @staticmethod
+    def get_learning_history(user_id, limit=10, skip=0, since=None):
+        """
+        获取用户学习历史
+        
+        Args:
+            user_id (str): 用户ID
+            limit (int): 限制返回记录数，0表示不限制
+            skip (int): 跳过记录数
+            since (datetime): 仅返回该时间之后完成的记录
             
-            logger.debug(f"获取用户 {user_id} 学习历史成功，返回 {len(paginated_history)} 条记录")
-            return paginated_history
+        Returns:
+            list: 学习历史记录列表（按时间倒序）
+        """
+        try:
+            events = db.find_many(
+                LEARNING_EVENTS_COLLECTION,
+                ProgressTracker._history_query(user_id, since),
+                limit=limit,
+                skip=skip,
+                sort=HISTORY_SORT,
+                projection=HISTORY_PROJECTION
+            )
+            history = [ProgressTracker._to_history_entry(event) for event in events]
+            
+            logger.debug(f"获取用户 {user_id} 学习历史成功，返回 {len(history)} 条记录")
+            return history
         except Exception as e:
             logger.error(f"获取学习历史失败: {e}")
             return []
@@ -137,22 +285,155 @@ class ProgressTracker:
         Returns:
             tuple: (学习历史记录列表, 总数)
         """
+        history, total, _ = ProgressTracker.get_learning_history_page(user_id, limit, skip=skip)
+        return history, total
+    
+    @staticmethod
+    def get_learning_history_page(user_id, limit=10, skip=0, after=None, include_total=True):
+        """
+        分页获取用户学习历史，支持偏移分页和基于 (completed_at, _id) 的游标分页
+        
+        传入after时忽略skip，查询直接从索引中的游标位置开始，
+        因此翻到任意深度的代价都与第一页相同。
+        
+        Args:
+            user_id (str): 用户ID
+            limit (int): 限制返回记录数
+            skip (int): 跳过记录数（偏移分页）
+            after (tuple): 上一页最后一条记录的 (completed_at, _id)
+            include_total (bool): 是否统计总数
+            
+        Returns:
+            tuple: (学习历史记录列表, 总数或None, 下一页起点 (completed_at, _id) 或None)
+        """
         try:
-            user = db.find_one('users', {'_id': ObjectId(user_id)})
-            history = user.get('learning_history', []) if user else []
+            query = ProgressTracker._history_query(user_id)
+            if after is not None:
+                query.update(ProgressTracker._keyset_condition(*after))
+                skip = 0
+            
+            # 多取一条用于判断是否还有下一页
+            events = db.find_many(
+                LEARNING_EVENTS_COLLECTION,
+                query,
+                limit=limit + 1,
+                skip=skip,
+                sort=HISTORY_SORT,
+                projection=HISTORY_PROJECTION
+            )
+            has_more = len(events) > limit
+            events = events[:limit]
             
-            # 按时间倒序排列
-            history.sort(key=lambda x: x.get('completed_at', datetime.datetime.min), reverse=True)
+            next_key = None
+            if has_more and events:
+                next_key = (events[-1].get('completed_at'), events[-1]['_id'])
             
-            # 应用分页
-            paginated_history = history[skip:skip+limit] if limit > 0 else history[skip:]
-            total = len(history)
+            total = None
+            if include_total:
+                total = db.count_documents(LEARNING_EVENTS_COLLECTION, ProgressTracker._history_query(user_id))
             
-            logger.debug(f"获取用户 {user_id} 学习历史成功，返回 {len(paginated_history)} 条记录，总共 {total} 条")
-            return paginated_history, total
+            history = [ProgressTracker._to_history_entry(event) for event in events]
+            logger.debug(f"获取用户 {user_id} 学习历史成功，返回 {len(history)} 条记录，总共 {total} 条")
+            return history, total, next_key
         except Exception as e:
             logger.error(f"获取学习历史失败: {e}")
-            return [], 0
+            return [], 0 if include_total else None, None
+    
+    @staticmethod
+    def get_topic_learning_history(user_id, topic):
+        """
+        获取用户在特定主题下的全部学习历史
+        
+        Args:
+            user_id (str): 用户ID
+            topic (str): 主题名称
+            
+        Returns:
+            list: 学习历史记录列表（按时间正序）
+        """
+        try:
+            query = ProgressTracker._history_query(user_id)
+            query['topic'] = topic
+            events = db.find_many(
+                LEARNING_EVENTS_COLLECTION,
+                query,
+                sort=[('completed_at', 1), ('_id', 1)],
+                projection=HISTORY_PROJECTION
+            )
+            return [ProgressTracker._to_history_entry(event) for event in events]
+        except Exception as e:
+            logger.error(f"获取主题学习历史失败: {e}")
+            return []
+    
+    @staticmethod
+    def count_learning_history(user_id):
+        """
+        统计用户学习历史记录数
+        
+        Args:
+            user_id (str): 用户ID
+            
+        Returns:
+            int: 记录总数
+        """
+        try:
+            return db.count_documents(LEARNING_EVENTS_COLLECTION, ProgressTracker._history_query(user_id))
+        except Exception as e:
+            logger.error(f"统计学习历史失败: {e}")
+            return 0
+    
+    @staticmethod
+    def _history_query(user_id, since=None):
+        """
+        构建学习历史查询条件
+        
+        Args:
+            user_id (str): 用户ID
+            since (datetime): 起始时间
+            
+        Returns:
+            dict: 查询条件
+        """
+        query = {'user_id': ObjectId(user_id)}
+        if since is not None:
+            query['completed_at'] = {'$gte': since}
+        return query
+    
+    @staticmethod
+    def _keyset_condition(completed_at, event_id):
+        """
+        构建游标分页条件：排在 (completed_at, _id) 之后的记录（倒序）
+        
+        Args:
+            completed_at (datetime): 上一页最后一条记录的完成时间，可以为None
+            event_id (ObjectId): 上一页最后一条记录的ID
+            
+        Returns:
+            dict: 查询条件
+        """
+        if completed_at is None:
+            # 倒序时缺少完成时间的记录排在最后
+            return {'completed_at': None, '_id': {'$lt': event_id}}
+        return {
+            '$or': [
+                {'completed_at': {'$lt': completed_at}},
+                {'completed_at': completed_at, '_id': {'$lt': event_id}},
+                {'completed_at': None}
+            ]
+        }
+    
+    @staticmethod
+    def _to_history_entry(event):
+        """
+        将learning_events文档转换为对外的学习历史记录
+        
+        Args:
+            event (dict): learning_events集合中的文档
+            
+        Returns:
+            dict: 学习历史记录
+        """
+        return {k: v for k, v in event.items() if k not in HISTORY_INTERNAL_FIELDS}
     
     @staticmethod
     def get_user_progress_summary(user_id):
@@ -166,30 +447,22 @@ class ProgressTracker:
             dict: 进度摘要
         """
         try:
-            user = db.find_one('users', {'_id': ObjectId(user_id)})
+            user = load_user(user_id, ['knowledge_graph'])
             if not user:
                 logger.warning(f"获取用户进度摘要失败: 用户 {user_id} 不存在")
                 return {}
             
             knowledge_graph = user.get('knowledge_graph', {})
-            learning_history = user.get('learning_history', [])
             
             # 计算统计数据
-            total_lessons = len(learning_history)
+            total_lessons = ProgressTracker.count_learning_history(user_id)
             completed_topics = len(knowledge_graph) if isinstance(knowledge_graph, dict) else 0
             
             # 计算最近学习活动
-            recent_activity = []
-            if learning_history:
-                sorted_history = sorted(
-                    learning_history, 
-                    key=lambda x: x.get('completed_at', datetime.datetime.min), 
-                    reverse=True
-                )
-                recent_activity = sorted_history[:5]  # 最近5个活动
+            recent_activity = ProgressTracker.get_learning_history(user_id, limit=5)  # 最近5个活动
             
             # 计算学习趋势（最近7天的学习活动）
-            weekly_activity = ProgressTracker._calculate_weekly_activity(learning_history)
+            weekly_activity = list(ProgressTracker.get_daily_activity(user_id, 7).values())
             
             # 计算知识点掌握情况
             topic_mastery = ProgressTracker._calculate_topic_mastery(knowledge_graph)
@@ -209,37 +482,6 @@ class ProgressTracker:
             logger.error(f"获取进度摘要失败: {e}")
             return {}
     
-    @staticmethod
-    def _calculate_weekly_activity(learning_history):
-        """
-        计算最近7天的学习活动
-        
-        Args:
-            learning_history (list): 学习历史记录列表
-            
-        Returns:
-            list: 每天的学习活动计数
-        """
-        if not learning_history:
-            return [0] * 7
-        
-        # 获取最近7天的日期
-        today = datetime.datetime.utcnow().date()
-        week_dates = [(today - datetime.timedelta(days=i)).strftime('%Y-%m-%d') for i in range(6, -1, -1)]
-        
-        # 统计每天的活动数
-        activity_count = {date: 0 for date in week_dates}
-        
-        for activity in learning_history:
-            completed_date = activity.get('completed_at')
-            if completed_date:
-                date_str = completed_date.date().strftime('%Y-%m-%d')
-                if date_str in activity_count:
-                    activity_count[date_str] += 1
-        
-        # 返回按日期顺序排列的活动数
-        return [activity_count[date] for date in week_dates]
-    
     @staticmethod
     def _calculate_topic_mastery(knowledge_graph):
         """
@@ -258,7 +500,7 @@ class ProgressTracker:
         # 目前简化处理，仅返回知识点和其掌握级别
         mastery = {}
         for key, value in knowledge_graph.items():
-            if key not in ['level', 'updated_at']:
+            if key not in NON_TOPIC_FIELDS:
                 mastery[key] = value
         
         return mastery
\ No newline at end of file
@@ -0,0 +1,45 @@
+// 交互式对话的Server-Sent Events读取（仪表板和课程页面共用）
+
+// 读取Server-Sent Events流并逐段渲染到contentDiv，每次更新后滚动scrollContainer到底部
+function readChatStream(reader, contentDiv, scrollContainer) {
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    function handleEvent(rawEvent) {
+        let eventName = 'message';
+        let data = '';
+        rawEvent.split('\n').forEach(line => {
+            if (line.startsWith('event:')) {
+                eventName = line.slice(6).trim();
+            } else if (line.startsWith('data:')) {
+                data += line.slice(5).trim();
+            }
+        });
+        if (!data) return;
+        
+        const payload = JSON.parse(data);
+        if (eventName === 'message') {
+            contentDiv.textContent += payload.delta;
+        } else if (eventName === 'done') {
+            contentDiv.textContent = payload.response;
+        } else if (eventName === 'error') {
+            contentDiv.textContent = '抱歉，我无法回答你的问题。请稍后重试。';
+        }
+        if (scrollContainer) {
+            scrollContainer.scrollTop = scrollContainer.scrollHeight;
+        }
+    }
+    
+    function pump() {
+        return reader.read().then(({ done, value }) => {
+            if (done) return;
+            buffer += decoder.decode(value, { stream: true });
+            const events = buffer.split('\n\n');
+            buffer = events.pop();
+            events.forEach(handleEvent);
+            return pump();
+        });
+    }
+    
+    return pump();
+}
@@ -3,22 +3,255 @@
 处理定期执行的学习分析和提醒任务
 """
 
-from celery import Celery
+from celery import Celery, chord
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
 from config import Config
 from database import db
+from progress_tracker import LEARNING_EVENTS_COLLECTION
 from utils.knowledge_analyzer import KnowledgeAnalyzer
+from utils.job_tracker import JobTracker, RUN_COMPLETED, RUN_FAILED
+from datetime import datetime, timedelta
 import logging
 
 # 初始化Celery
 celery = Celery('ai_learning_companion')
 celery.conf.update(
     broker_url=Config.CELERY_BROKER_URL,
-    result_backend=Config.CELERY_RESULT_BACKEND
+    result_backend=Config.CELERY_RESULT_BACKEND,
+    # 工作进程崩溃时把未确认的分片重新放回队列
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1
 )
 
+# 提醒发送记录集合（用于去重）
+REMINDER_LEDGER_COLLECTION = 'reminder_ledger'
+
 # 初始化工具类
 knowledge_analyzer = KnowledgeAnalyzer()
 
+def _analyze_user_range(user_filter):
+    """
+    分析一个区间内用户的学习进度
+    
+    以游标分批遍历用户ID，每批用一次聚合查询统计各知识点的答题情况，
+    再批量计算正确率并通过bulk_write写回，内存占用只与批大小有关。
+    
+    Args:
+        user_filter (dict): 用户查询条件（_id区间）
+        
+    Returns:
+        dict: 统计 {'users': int, 'updated': int}
+    """
+    batch_size = Config.ANALYSIS_BATCH_SIZE
+    cursor = db.find_iter('users', user_filter, projection={'_id': 1}, batch_size=batch_size)
+    
+    stats = {'users': 0, 'updated': 0}
+    batch = []
+    for user in cursor:
+        batch.append(user['_id'])
+        if len(batch) >= batch_size:
+            stats['updated'] += _analyze_user_batch(batch)
+            stats['users'] += len(batch)
+            batch = []
+    
+    if batch:
+        stats['updated'] += _analyze_user_batch(batch)
+        stats['users'] += len(batch)
+    
+    return stats
+
+def _analyze_user_batch(user_ids):
+    """
+    分析一批用户的知识水平并批量写回
+    
+    Args:
+        user_ids (list): 用户ObjectId列表
+        
+    Returns:
+        int: 更新的用户数
+    """
+    # 在数据库端按用户和知识点汇总答题数和正确数
+    grouped = db.aggregate(LEARNING_EVENTS_COLLECTION, [
+        {'$match': {'user_id': {'$in': user_ids}}},
+        {'$group': {
+            '_id': {'user_id': '$user_id', 'topic': '$topic'},
+            'total': {'$sum': 1},
+            'correct': {'$sum': {'$cond': [{'$eq': ['$correct', True]}, 1, 0]}}
+        }}
+    ])
+    
+    topic_stats = [
+        (row['_id']['user_id'], row['_id'].get('topic'), row['total'], row['correct'])
+        for row in grouped
+    ]
+    analyses = knowledge_analyzer.assess_knowledge_batch(topic_stats)
+    
+    # 知识图谱只保存 知识点 -> 掌握度（外加level），答题统计写入单独的knowledge_stats字段，
+    # 以免被图表、推荐和提示词当作知识点
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne({'_id': user_id}, {'$set': {
+            'knowledge_graph.level': analysis['level'],
+            'knowledge_stats': {
+                'accuracy': analysis['accuracy'],
+                'correct_count': analysis['correct_count'],
+                'total_count': analysis['total_count'],
+                'knowledge_points': analysis['knowledge_points'],
+                'analyzed_at': now
+            }
+        }})
+        for user_id, analysis in analyses.items()
+    ]
+    db.bulk_write('users', operations)
+    return len(operations)
+
+def _claim_reminder(user_id, kind, episode):
+    """
+    在提醒发送记录中登记一次提醒，已登记过则返回False
+    
+    记录以 (用户, 提醒类型, 不活跃起点) 为 _id，重复执行任务不会重复发送；
+    用户重新学习后再次不活跃时，起点变化，会再收到一次提醒。
+    
+    Args:
+        user_id (ObjectId): 用户ID
+        kind (str): 提醒类型（welcome/inactive）
+        episode (datetime): 不活跃的起点，欢迎提醒为None
+        
+    Returns:
+        bool: 是否需要发送
+    """
+    key = f"{user_id}:{kind}:{episode.isoformat() if episode else ''}"
+    try:
+        db.insert_one(REMINDER_LEDGER_COLLECTION, {
+            '_id': key,
+            'user_id': user_id,
+            'kind': kind,
+            'sent_at': datetime.utcnow()
+        })
+        return True
+    except DuplicateKeyError:
+        return False
+
+def _weekly_report_range(user_filter):
+    """
+    为一个区间内的用户生成每周学习报告
+    
+    Args:
+        user_filter (dict): 用户查询条件（_id区间）
+        
+    Returns:
+        dict: 统计 {'users': int, 'reports': int}
+    """
+    stats = {'users': 0, 'reports': 0}
+    for user in db.find_iter('users', user_filter, projection={'username': 1}):
+        stats['users'] += 1
+        # 生成用户的学习报告
+        # 这里应该实现实际的报告生成逻辑
+        logging.info(f"应为用户 {user['username']} 生成每周学习报告")
+        stats['reports'] += 1
+    return stats
+
+# 可分片执行的定时任务：任务名称 -> 处理一个用户区间的函数
+JOB_HANDLERS = {
+    'analyze_user_progress': _analyze_user_range,
+    'generate_weekly_report': _weekly_report_range
+}
+
+def dispatch_sharded_job(job, chunk_size=None):
+    """
+    将任务按用户 _id 区间切分并以chord并行分发
+    
+    若该任务上一次运行尚未完成（例如工作进程崩溃）且租约已过期，则只分发未完成的分片；
+    上一次运行仍在处理中时不重复分发。
+    
+    Args:
+        job (str): 任务名称（JOB_HANDLERS中的键）
+        chunk_size (int): 每个分片的用户数，默认使用Config.JOB_CHUNK_SIZE
+        
+    Returns:
+        str: 分发结果描述
+    """
+    run_id, pending, resumed = JobTracker.start_run(job, chunk_size or Config.JOB_CHUNK_SIZE)
+    if not pending:
+        summary = JobTracker.finish_run(run_id)
+        return _format_summary(summary)
+    
+    chord(
+        process_job_chunk.s(job, run_id, index) for index in pending
+    )(finalize_job_run.si(job, run_id))
+    
+    action = "继续" if resumed else "开始"
+    logging.info(f"{action}运行 {job}（{run_id}），分发 {len(pending)} 个分片")
+    return f"{action}运行 {run_id}，已分发 {len(pending)} 个分片"
+
+@celery.task(bind=True, acks_late=True, max_retries=3, default_retry_delay=30)
+def process_job_chunk(self, job, run_id, index):
+    """
+    处理一个用户区间分片
+    
+    acks_late保证工作进程崩溃时分片会被重新投递；分片已完成、领取次数已用尽
+    或其他工作进程持有租约时直接跳过。
+    
+    Args:
+        job (str): 任务名称
+        run_id (str): 运行ID
+        index (int): 分片序号
+        
+    Returns:
+        dict: 分片统计，分片已完成返回None
+    """
+    chunk = JobTracker.claim_chunk(run_id, index, owner=self.request.id)
+    if chunk is None:
+        return None
+    
+    try:
+        result = JOB_HANDLERS[job](JobTracker.range_query(chunk['lower'], chunk['upper']))
+    except Exception as e:
+        logging.error(f"{job} 分片 {index} 处理失败: {e}")
+        # 释放租约，重试时可以重新领取
+        JobTracker.fail_chunk(run_id, index, str(e))
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e)
+        # 不再抛出异常，以免整个chord失败；该分片留待下次运行继续
+        return None
+    
+    run = JobTracker.complete_chunk(run_id, index, result)
+    if run:
+        logging.info(f"{job} 进度 {run['completed_chunks']}/{run['total_chunks']} 个分片")
+    return result
+
+@celery.task
+def finalize_job_run(job, run_id):
+    """
+    汇总分片结果并生成运行摘要
+    
+    Args:
+        job (str): 任务名称
+        run_id (str): 运行ID
+        
+    Returns:
+        str: 运行摘要描述
+    """
+    summary = JobTracker.finish_run(run_id)
+    message = _format_summary(summary)
+    logging.info(message)
+    return message
+
+def _format_summary(summary):
+    """将运行摘要格式化为日志文本"""
+    totals = '，'.join(f"{key} {value}" for key, value in summary['totals'].items())
+    if summary['status'] == RUN_COMPLETED:
+        status = "完成"
+    elif summary['status'] == RUN_FAILED:
+        status = "失败（下次运行时重新规划）"
+    else:
+        status = "未完成（下次运行时继续）"
+    return (
+        f"{summary['job']} 运行{status}：{summary['completed_chunks']}/{summary['total_chunks']} 个分片，"
+        f"{totals}，耗时 {summary['elapsed_seconds']} 秒（{summary['users_per_second']} 用户/秒）"
+    )
+
 @celery.task
 def analyze_user_progress():
     """
@@ -27,30 +260,7 @@ def analyze_user_progress():
     """
     try:
         logging.info("开始分析用户学习进度...")
-        
-        # 获取所有用户
-        users = db.find_many('users', {})
-        
-        for user in users:
-            user_id = str(user['_id'])
-            learning_history = user.get('learning_history', [])
-            
-            # 如果用户有学习历史，则分析进度
-            if learning_history:
-                # 基于学习历史分析知识水平
-                analysis = knowledge_analyzer.assess_knowledge_by_questions(learning_history)
-                
-                # 更新用户知识图谱
-                db.update_one(
-                    'users',
-                    {'_id': user['_id']},
-                    {'knowledge_graph': analysis}
-                )
-                
-                logging.info(f"已更新用户 {user_id} 的知识图谱")
-        
-        logging.info("用户学习进度分析完成")
-        return f"分析完成，共处理 {len(users)} 个用户"
+        return dispatch_sharded_job('analyze_user_progress')
         
     except Exception as e:
         logging.error(f"分析用户进度时出错: {e}")
@@ -61,29 +271,42 @@ def send_learning_reminders():
     """
     发送学习提醒
     这是一个定期执行的任务
+    
+    通过 last_active_at 索引只取出超过 REMINDER_INACTIVE_DAYS 天未学习的用户
+    和从未学习的用户，开销与不活跃用户数成正比，而不是与总用户数成正比。
     """
     try:
         logging.info("开始发送学习提醒...")
-        
-        # 获取所有用户
-        users = db.find_many('users', {})
+        cutoff = datetime.utcnow() - timedelta(days=Config.REMINDER_INACTIVE_DAYS)
         
         reminder_count = 0
-        for user in users:
-            # 检查用户是否需要提醒（例如超过3天未学习）
-            learning_history = user.get('learning_history', [])
-            if learning_history:
-                # 这里应该实现实际的提醒逻辑
-                # 由于这是一个示例，我们只记录日志
-                logging.info(f"应向用户 {user['username']} 发送学习提醒")
-                reminder_count += 1
-            else:
-                # 新用户提醒开始学习
-                logging.info(f"应向新用户 {user['username']} 发送欢迎和开始学习提醒")
-                reminder_count += 1
+        skipped_count = 0
         
-        logging.info(f"学习提醒发送完成，共处理 {reminder_count} 个用户")
-        return f"提醒发送完成，共处理 {reminder_count} 个用户"
+        # 从未学习的用户（没有 last_active_at）
+        for user in db.find_iter('users', {'last_active_at': None}, projection={'username': 1}):
+            if not _claim_reminder(user['_id'], 'welcome', None):
+                skipped_count += 1
+                continue
+            # 这里应该实现实际的提醒逻辑
+            # 由于这是一个示例，我们只记录日志
+            logging.info(f"应向新用户 {user['username']} 发送欢迎和开始学习提醒")
+            reminder_count += 1
+        
+        # 超过3天未学习的用户
+        inactive_users = db.find_iter(
+            'users',
+            {'last_active_at': {'$lt': cutoff}},
+            projection={'username': 1, 'last_active_at': 1}
+        )
+        for user in inactive_users:
+            if not _claim_reminder(user['_id'], 'inactive', user['last_active_at']):
+                skipped_count += 1
+                continue
+            logging.info(f"应向用户 {user['username']} 发送学习提醒")
+            reminder_count += 1
+        
+        logging.info(f"学习提醒发送完成，共发送 {reminder_count} 条，跳过已发送 {skipped_count} 条")
+        return f"提醒发送完成，共发送 {reminder_count} 条，跳过已发送 {skipped_count} 条"
         
     except Exception as e:
         logging.error(f"发送学习提醒时出错: {e}")
@@ -97,19 +320,7 @@ def generate_weekly_report():
     """
     try:
         logging.info("开始生成每周学习报告...")
-        
-        # 获取所有用户
-        users = db.find_many('users', {})
-        
-        report_count = 0
-        for user in users:
-            # 生成用户的学习报告
-            # 这里应该实现实际的报告生成逻辑
-            logging.info(f"应为用户 {user['username']} 生成每周学习报告")
-            report_count += 1
-        
-        logging.info(f"每周学习报告生成完成，共处理 {report_count} 个用户")
-        return f"报告生成完成，共处理 {report_count} 个用户"
+        return dispatch_sharded_job('generate_weekly_report')
         
     except Exception as e:
         logging.error(f"生成每周学习报告时出错: {e}")
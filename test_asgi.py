@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试ASGI服务的交互式对话接口和挂载的Flask接口
+使用本地模拟提供方，不访问网络；需要安装starlette和httpx（见requirements.txt）
+
+用法:
+    python -m pytest test_asgi.py
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from starlette.testclient import TestClient
+
+import asgi
+from utils.llm_governor import llm_governor
+from utils.llm_provider import StubProvider
+
+@pytest.fixture
+def client(monkeypatch):
+    """使用模拟提供方的测试客户端（不限令牌额度，每个测试重新计数限流）"""
+    monkeypatch.setattr(asgi.content_generator, 'provider', StubProvider(latency=0.01, tokens_per_second=1000, output_tokens=20))
+    monkeypatch.setattr(asgi.content_generator, 'api_type', 'stub')
+    monkeypatch.setattr(llm_governor, 'daily_token_quota', 0)
+    asgi.chat_limiter.reset('ip:testclient')
+    with TestClient(asgi.app) as test_client:
+        yield test_client
+    assert llm_governor.stats()['users_in_flight'] == 0
+
+def _events(body):
+    """解析SSE响应体为 [(事件名, 数据)]"""
+    events = []
+    for block in body.strip().split('\n\n'):
+        event, data = None, None
+        for line in block.split('\n'):
+            if line.startswith('event: '):
+                event = line[len('event: '):]
+            elif line.startswith('data: '):
+                data = json.loads(line[len('data: '):])
+        events.append((event, data))
+    return events
+
+def test_chat(client):
+    """非流式对话返回完整响应"""
+    response = client.post('/api/interactive-chat', json={'message': '什么是装饰器', 'topic': 'python_basics'})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body['success'] and body['data']['response'] and body['data']['context'] == {}
+
+def test_chat_stream(client):
+    """流式对话逐段发送delta，最后发送done事件"""
+    response = client.post('/api/interactive-chat', json={'message': '什么是生成器', 'stream': True})
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/event-stream')
+    events = _events(response.text)
+    deltas = [data['delta'] for event, data in events if event is None]
+    assert len(deltas) > 1
+    assert events[-1] == ('done', {'response': ''.join(deltas).strip(), 'context': {}})
+
+def test_chat_validation(client):
+    """缺少必需参数时返回400"""
+    response = client.post('/api/interactive-chat', json={})
+
+    assert response.status_code == 400
+    assert response.json()['field'] == 'message'
+
+def test_health_is_served_by_flask(client):
+    """其余接口由挂载的Flask应用处理"""
+    response = client.get('/health')
+
+    assert response.status_code == 200
+    assert response.json()['data']['status'] == 'healthy'
+
+def test_stream_releases_slot_when_send_fails(client):
+    """流式响应开始发送前客户端已断开时，也会释放在途名额"""
+    subject = 'ip:10.9.8.7'
+    asyncio.run(llm_governor.aacquire_user(subject))
+    response = asgi.event_stream(asgi._chat_events('hi', {}, 'general', {}),
+                                 on_close=lambda: llm_governor.release_user(subject))
+
+    async def receive():
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        raise OSError('connection reset')
+
+    with pytest.raises(Exception):
+        asyncio.run(response({'type': 'http'}, receive, send))
+    assert subject not in llm_governor._user_inflight
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-v']))
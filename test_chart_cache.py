@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试磁盘图表缓存
+每个ChartCache实例模拟一个工作进程，共享同一个缓存目录
+
+用法:
+    python -m pytest test_chart_cache.py
+"""
+
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import utils.chart_cache as chart_cache
+from utils.chart_cache import ChartCache, make_chart_key
+
+def write(cache, key, size, mtime):
+    """写入指定大小的图表并设置最近使用时间"""
+    cache.set(key, b'x' * size)
+    os.utime(cache._path(key), (mtime, mtime))
+
+def test_eviction_counts_files_from_all_workers(tmp_path):
+    """按目录实际大小淘汰：其他进程写入的图表也计入上限"""
+    worker_a = ChartCache(str(tmp_path), max_bytes=1000)
+    worker_b = ChartCache(str(tmp_path), max_bytes=1000)
+    keys = [make_chart_key('knowledge_map', {'n': i}) for i in range(4)]
+
+    write(worker_a, keys[0], 400, 1000)
+    write(worker_b, keys[1], 400, 2000)
+    assert worker_a.contains(keys[0]) and worker_a.contains(keys[1])
+
+    # 单看worker_a自己写入的只有800字节，但目录中已有1200字节
+    write(worker_a, keys[2], 400, 3000)
+    assert not worker_a.contains(keys[0])
+    assert worker_b.get(keys[1]) == b'x' * 400
+    assert worker_b.get(keys[2]) == b'x' * 400
+
+def test_keys_are_signed(monkeypatch):
+    """缓存键依赖服务端密钥，无法仅凭绘图数据算出"""
+    data = {'axes': ['python_basics'], 'values': [0.5]}
+    key = make_chart_key('knowledge_map', data)
+    assert len(key) == 64
+    assert key == make_chart_key('knowledge_map', data)
+
+    monkeypatch.setattr(chart_cache.Config, 'SECRET_KEY', 'another-secret')
+    assert make_chart_key('knowledge_map', data) != key
+
+def test_rejects_invalid_keys(tmp_path):
+    """非法缓存键读取返回None，写入抛出ValueError"""
+    cache = ChartCache(str(tmp_path))
+    assert cache.get('../secret') is None
+    with pytest.raises(ValueError):
+        cache.set('../secret', b'x')
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-v']))
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试熔断器的状态转换
+关闭 -> 熔断（失败率或慢调用比例超过阈值）-> 半开（熔断时间结束）-> 关闭或重新熔断，以及cancel归还探测名额
+
+用法:
+    python -m pytest test_circuit_breaker.py
+"""
+
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import utils.circuit_breaker as circuit_breaker
+from utils.circuit_breaker import CircuitBreaker, STATE_CLOSED, STATE_OPEN, STATE_HALF_OPEN
+
+# clock夹具（见conftest.py）替换这些模块的time
+CLOCK_MODULES = [circuit_breaker]
+
+def make_breaker(**kwargs):
+    options = dict(window_size=4, min_calls=4, error_rate=0.5, slow_call_seconds=10,
+                   slow_rate=0.75, open_seconds=30, half_open_probes=1)
+    options.update(kwargs)
+    return CircuitBreaker('test', **options)
+
+def open_breaker(breaker):
+    """连续记录失败直到熔断"""
+    for _ in range(4):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == STATE_OPEN
+
+def test_stays_closed_below_min_calls_and_thresholds(clock):
+    """调用数不足min_calls或失败率低于阈值时不熔断"""
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.state == STATE_CLOSED
+
+    breaker = make_breaker()
+    for failed in (True, False, False, False, True, False):
+        if failed:
+            breaker.record_failure()
+        else:
+            breaker.record_success(0.1)
+    assert breaker.state == STATE_CLOSED
+    assert breaker.stats()['window_calls'] == 4
+
+def test_opens_on_error_rate_and_rejects(clock):
+    """失败率达到阈值后熔断，熔断期间拒绝调用"""
+    breaker = make_breaker()
+    open_breaker(breaker)
+
+    assert not breaker.allow()
+    clock.now += 29
+    assert not breaker.allow()
+    stats = breaker.stats()
+    assert stats['opened'] == 1
+    assert stats['rejected'] == 2
+    assert stats['window_calls'] == 0
+
+def test_opens_on_slow_rate(clock):
+    """慢调用比例达到阈值后熔断"""
+    breaker = make_breaker()
+    for duration in (12, 15, 11, 1):
+        breaker.record_success(duration)
+    assert breaker.state == STATE_OPEN
+
+def test_half_open_probe_success_closes(clock):
+    """熔断时间结束后进入半开状态，只放行half_open_probes个探测调用，探测成功后恢复"""
+    breaker = make_breaker()
+    open_breaker(breaker)
+    clock.now += 30
+
+    assert breaker.allow()
+    assert breaker.state == STATE_HALF_OPEN
+    assert not breaker.allow()
+
+    breaker.record_success(0.5)
+    assert breaker.state == STATE_CLOSED
+    assert breaker.allow()
+
+def test_half_open_probe_failure_reopens(clock):
+    """探测调用失败或过慢时重新熔断"""
+    breaker = make_breaker()
+    open_breaker(breaker)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == STATE_OPEN
+    assert not breaker.allow()
+
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success(10)
+    assert breaker.state == STATE_OPEN
+    assert breaker.stats()['opened'] == 3
+
+def test_cancel_returns_probe(clock):
+    """放行后没有实际调用时cancel归还探测名额，下一个请求可以继续探测"""
+    breaker = make_breaker()
+    open_breaker(breaker)
+    clock.now += 30
+
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.cancel()
+    assert breaker.state == STATE_HALF_OPEN
+    assert breaker.allow()
+
+def test_results_while_open_are_ignored(clock):
+    """熔断前已放行的调用在熔断期间返回，结果不计入窗口"""
+    breaker = make_breaker()
+    open_breaker(breaker)
+    breaker.record_success(0.1)
+    breaker.record_failure()
+    assert breaker.state == STATE_OPEN
+    assert breaker.stats()['window_calls'] == 0
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-v']))
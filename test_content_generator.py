@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试内容生成器的缓存键、并发生成和子主题的流式生成
+知识图谱只按知识点掌握度分档，其他字段不影响缓存键；相同缓存键的并发请求只调用一次大模型；
+学习路径的子主题逐个生成完成逐个返回
+
+用法:
+    python -m pytest test_content_generator.py
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from utils.content_generator import ContentGenerator
+from utils.learning_path_planner import LearningPathPlanner
+from utils.llm_cache import ResponseCache
+
+@pytest.fixture
+def generator():
+    """不调用大模型API、只使用进程内缓存的内容生成器"""
+    generator = ContentGenerator()
+    generator.api_type = None
+    generator.response_cache = ResponseCache(ttl=60)
+    return generator
+
+class SlowLLM:
+    """统计调用次数的生成函数，release之前一直阻塞"""
+
+    def __init__(self):
+        self.calls = 0
+        self.released = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.released.wait(5)
+        return 'explanation'
+
+def wait_until(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+def test_bucket_keeps_only_topic_masteries(generator):
+    """只保留0~1之间的知识点掌握度并按0.25分档，level、时间戳和统计字段被忽略"""
+    bucket = generator._bucket_knowledge_graph({
+        'python_basics': 0.6, 'functions': 0.1, 'done': True,
+        'level': 'intermediate', 'updated_at': 1700000000,
+        'total_count': 37, 'correct_count': 20, 'knowledge_points': {'python_basics': 0.5}
+    })
+    assert bucket == {'python_basics': 0.5, 'functions': 0.0}
+
+def test_cache_key_ignores_counters(generator):
+    """答题数变化不产生新的缓存键，掌握度跨档时才变化"""
+    materials = generator.retrieve_materials('python_basics', {'level': 'beginner'})
+
+    def cache_key(graph):
+        return generator._explanation_request({'level': 'beginner'}, materials, graph)[1]
+
+    key = cache_key({'python_basics': 0.6, 'total_count': 3})
+    assert cache_key({'python_basics': 0.55, 'total_count': 4, 'updated_at': 1}) == key
+    assert cache_key({'python_basics': 0.9, 'total_count': 3}) != key
+
+def test_concurrent_requests_share_one_generation(generator, monkeypatch):
+    """不启用对冲时，相同缓存键的并发请求等待同一次生成"""
+    monkeypatch.setattr(Config, 'LLM_HEDGE_BUDGET', 0)
+    llm = SlowLLM()
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        futures = [pool.submit(generator._cached_generate, 'key', llm) for _ in range(5)]
+        wait_until(lambda: generator.response_cache.stats()['coalesced'] == 4)
+        llm.released.set()
+        results = [future.result() for future in futures]
+
+    assert results == ['explanation'] * 5
+    assert llm.calls == 1
+    assert generator._cached_generate('key', llm) == 'explanation'
+    assert llm.calls == 1
+
+def test_hedged_requests_share_background_generation(generator, monkeypatch):
+    """对冲模式下超出预算的相同请求不再提交新的后台生成，生成完成后命中缓存"""
+    monkeypatch.setattr(Config, 'LLM_HEDGE_BUDGET', 0.02)
+    llm = SlowLLM()
+
+    for _ in range(3):
+        assert generator._cached_generate('key', llm) is None
+    llm.released.set()
+    wait_until(lambda: generator.response_cache.get('key') is not None)
+
+    assert generator._cached_generate('key', llm) == 'explanation'
+    assert llm.calls == 1
+
+def test_async_requests_share_one_task(generator, monkeypatch):
+    """异步版本中相同缓存键的并发请求共享同一个生成任务"""
+    monkeypatch.setattr(Config, 'LLM_HEDGE_BUDGET', 0)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 'explanation'
+
+    async def main():
+        return await asyncio.gather(*[generator._acached_generate('key', compute) for _ in range(5)])
+
+    assert asyncio.run(main()) == ['explanation'] * 5
+    assert len(calls) == 1
+    assert generator._inflight_tasks == {}
+
+def subtopic_line(subtopic):
+    return json.dumps({'subtopic': subtopic, 'explanation': f'{subtopic}的解释',
+                       'exercises': [{'question': 'q', 'answer': 'a'}]}, ensure_ascii=False)
+
+def test_subtopics_are_yielded_as_they_complete(generator, monkeypatch):
+    """每个子主题的JSON行到达后立即产出，缺失的子主题最后回退，完整结果写入缓存"""
+    generator.api_type = 'stub'
+    chunks = []
+    first, second = subtopic_line('variables'), subtopic_line('functions')
+    output = ['```json\n', first[:20], first[20:] + '\n' + second[:10], second[10:], '\n```']
+
+    def stream(prompt):
+        for chunk in output:
+            chunks.append(chunk)
+            yield chunk
+
+    monkeypatch.setattr(generator, '_stream_with_llm', stream)
+    args = ({'level': 'beginner'}, generator.retrieve_materials('python_basics', {}),
+            ['variables', 'functions', 'loops', 'variables'], {})
+    stream_iter = generator.stream_subtopic_contents(*args)
+
+    subtopic, content = next(stream_iter)
+    assert (subtopic, content['explanation']) == ('variables', 'variables的解释')
+    assert len(chunks) == 3
+    rest = list(stream_iter)
+    assert [subtopic for subtopic, _ in rest] == ['functions', 'loops']
+    assert rest[1][1]['explanation'] == generator._fallback_explanation(*args[:2])
+
+    monkeypatch.setattr(generator, '_stream_with_llm', lambda prompt: iter(()))
+    assert dict(generator.stream_subtopic_contents(*args))['functions']['explanation'] == 'functions的解释'
+    assert generator.generate_subtopic_contents(*args)['variables']['explanation'] == 'variables的解释'
+
+def test_stream_learning_path_events(generator, monkeypatch):
+    """流式学习路径先返回概要，再逐个返回子主题，最后返回与非流式接口相同的完整路径"""
+    planner = LearningPathPlanner()
+    planner.content_generator = generator
+    events = list(planner.stream_personalized_learning_path('u1', {}, 'python_basics'))
+
+    assert events[0] == ('path', {'user_id': 'u1', 'learning_goal': 'python_basics', 'user_level': 'beginner',
+                                  'topics': ['variables', 'data_types', 'control_structures', 'functions']})
+    topics = [data for event, data in events[1:-1]]
+    assert [event for event, data in events[1:-1]] == ['topic'] * 4
+    event, learning_path = events[-1]
+    assert event == 'done' and learning_path['path'] == topics
+    full_path = planner.generate_personalized_learning_path('u1', {}, 'python_basics')['path']
+    assert [item['topic'] for item in full_path] == [item['topic'] for item in topics]
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-v']))
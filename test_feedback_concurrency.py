@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试并发提交练习时知识图谱更新不会丢失
+默认使用mongomock；设置TEST_MONGO_URI后改为连接本地mongod（会使用并清空该数据库中的users集合），
+数据库夹具mongo_db见conftest.py
+
+用法:
+    pip install -r requirements-dev.txt
+    python -m pytest test_feedback_concurrency.py
+    TEST_MONGO_URI=mongodb://localhost:27017/ai_learning_companion_test python -m pytest test_feedback_concurrency.py
+"""
+
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import db
+from utils.feedback_processor import FeedbackProcessor
+
+THREADS = 16
+
+def _create_user(knowledge_graph):
+    """创建测试用户并返回用户ID"""
+    db.get_collection('users').delete_many({'username': 'concurrency_test'})
+    result = db.insert_one('users', {'username': 'concurrency_test', 'knowledge_graph': knowledge_graph})
+    return str(result.inserted_id)
+
+def _knowledge_graph(user_id):
+    """读取用户知识图谱"""
+    from bson import ObjectId
+    return db.find_one('users', {'_id': ObjectId(user_id)})['knowledge_graph']
+
+def _submit_parallel(user_id, topic_masteries):
+    """并发提交多个知识点掌握情况"""
+    processor = FeedbackProcessor()
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        list(executor.map(lambda mastery: processor._update_knowledge_graph(user_id, mastery), topic_masteries))
+
+def test_parallel_submissions_on_different_topics_are_all_kept(mongo_db):
+    """不同知识点的并发提交互不覆盖"""
+    user_id = _create_user({'level': 'beginner'})
+    topics = [f"topic_{i}" for i in range(THREADS * 4)]
+
+    _submit_parallel(user_id, [{topic: 1.0, 'confidence': 1.0} for topic in topics])
+
+    knowledge_graph = _knowledge_graph(user_id)
+    assert knowledge_graph['level'] == 'beginner'
+    for topic in topics:
+        assert knowledge_graph[topic] == 0.3
+
+def test_parallel_submissions_on_same_topic_apply_every_update(mongo_db):
+    """同一知识点的并发提交全部生效，结果与顺序执行一致"""
+    user_id = _create_user({'python_basics': 0.5})
+    submissions = THREADS * 4
+
+    _submit_parallel(user_id, [{'python_basics': 1.0}] * submissions)
+
+    expected = 0.5
+    for _ in range(submissions):
+        expected = int((0.7 * expected + 0.3) * 100 + 0.5) / 100
+    assert _knowledge_graph(user_id)['python_basics'] == expected
+
+def test_update_is_a_single_write_without_reads(mongo_db):
+    """更新只发起一次写操作，不先读取用户文档"""
+    user_id = _create_user({'python_basics': 0.5})
+    calls = []
+    original_find_one = db.find_one
+    original_update = db.update_one_pipeline
+
+    def record_find_one(*args, **kwargs):
+        calls.append('find_one')
+        return original_find_one(*args, **kwargs)
+
+    def record_update(*args, **kwargs):
+        calls.append('update')
+        return original_update(*args, **kwargs)
+
+    db.find_one, db.update_one_pipeline = record_find_one, record_update
+    try:
+        FeedbackProcessor()._update_knowledge_graph(user_id, {'python_basics': 1.0, 'web_development': 0.5})
+    finally:
+        db.find_one, db.update_one_pipeline = original_find_one, original_update
+
+    assert calls == ['update']
+    assert _knowledge_graph(user_id) == {'python_basics': 0.65, 'web_development': 0.15}
+
+def test_invalid_topic_names_are_ignored(mongo_db):
+    """无法作为字段路径的知识点名称被忽略"""
+    user_id = _create_user({})
+
+    FeedbackProcessor()._update_knowledge_graph(user_id, {'a.b': 1.0, '$where': 1.0, 'ok': 1.0})
+
+    assert _knowledge_graph(user_id) == {'ok': 0.3}
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-v']))
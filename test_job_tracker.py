@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试分片任务的租约、继续运行和放弃运行
+数据库夹具mongo_db见conftest.py
+
+用法:
+    python -m pytest test_job_tracker.py
+"""
+
+import datetime
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bson import ObjectId
+from config import Config
+from utils.job_tracker import (
+    JobTracker, JOB_RUNS_COLLECTION, JOB_CHUNKS_COLLECTION, RUN_FAILED, RUN_RUNNING
+)
+
+def _start(db, users=10, chunk_size=3):
+    """插入测试用户并开始一次运行"""
+    db.insert_many('users', [{'username': f'job_test_{i}'} for i in range(users)])
+    return JobTracker.start_run('test_job', chunk_size)
+
+def _expire_leases(db):
+    """让所有分片和运行的租约过期"""
+    past = datetime.datetime.utcnow() - datetime.timedelta(seconds=Config.JOB_CHUNK_LEASE_SECONDS + 1)
+    db.get_collection(JOB_CHUNKS_COLLECTION).update_many({}, {'$set': {'lease_expires_at': past}})
+    db.get_collection(JOB_RUNS_COLLECTION).update_many({}, {'$set': {'updated_at': past}})
+
+def _run_status(db, run_id):
+    """读取运行状态"""
+    return db.find_one(JOB_RUNS_COLLECTION, {'_id': ObjectId(run_id)})['status']
+
+def test_leased_chunk_cannot_be_claimed_twice(mongo_db):
+    """租约有效期内同一分片不能被其他工作进程领取"""
+    run_id, pending, resumed = _start(mongo_db)
+    assert pending == [0, 1, 2, 3] and not resumed
+
+    chunk = JobTracker.claim_chunk(run_id, 0, owner='worker-1')
+    assert chunk['status'] == 'running' and chunk['owner'] == 'worker-1' and chunk['attempts'] == 1
+    assert JobTracker.claim_chunk(run_id, 0, owner='worker-2') is None
+
+    _expire_leases(mongo_db)
+    assert JobTracker.claim_chunk(run_id, 0, owner='worker-2')['owner'] == 'worker-2'
+
+def test_redelivered_task_reclaims_its_own_lease(mongo_db):
+    """工作进程崩溃后Celery重新投递同一任务（任务ID不变），可以在租约有效期内重新领取分片"""
+    run_id, _, _ = _start(mongo_db)
+    assert JobTracker.claim_chunk(run_id, 0, owner='task-1')['attempts'] == 1
+
+    chunk = JobTracker.claim_chunk(run_id, 0, owner='task-1')
+    assert chunk['owner'] == 'task-1' and chunk['attempts'] == 2
+    assert JobTracker.claim_chunk(run_id, 0, owner='task-2') is None
+    assert JobTracker.claim_chunk(run_id, 0) is None
+
+    JobTracker.complete_chunk(run_id, 0, {'users': 3})
+    assert JobTracker.claim_chunk(run_id, 0, owner='task-1') is None
+
+def test_active_run_is_not_dispatched_again(mongo_db):
+    """运行仍在处理中时，再次触发不重复分发分片"""
+    run_id, _, _ = _start(mongo_db)
+    JobTracker.claim_chunk(run_id, 0)
+
+    assert JobTracker.start_run('test_job', 3) == (run_id, [], True)
+
+def test_expired_run_resumes_unfinished_chunks(mongo_db):
+    """租约过期的运行只重新分发未完成的分片"""
+    run_id, _, _ = _start(mongo_db)
+    JobTracker.claim_chunk(run_id, 0)
+    JobTracker.complete_chunk(run_id, 0, {'users': 3})
+    JobTracker.claim_chunk(run_id, 1)
+    _expire_leases(mongo_db)
+
+    assert JobTracker.start_run('test_job', 3) == (run_id, [1, 2, 3], True)
+
+def test_failed_chunk_releases_lease_for_retry(mongo_db):
+    """分片失败后释放租约，重试时可以立即重新领取"""
+    run_id, _, _ = _start(mongo_db)
+    JobTracker.claim_chunk(run_id, 0)
+    JobTracker.fail_chunk(run_id, 0, 'boom')
+
+    assert JobTracker.claim_chunk(run_id, 0)['attempts'] == 2
+
+def test_run_with_exhausted_chunk_is_abandoned(mongo_db):
+    """分片领取次数用尽后不再领取，下次触发时放弃该运行并重新规划"""
+    run_id, _, _ = _start(mongo_db)
+    for _ in range(Config.JOB_CHUNK_MAX_ATTEMPTS):
+        JobTracker.claim_chunk(run_id, 0)
+        JobTracker.fail_chunk(run_id, 0, 'boom')
+    assert JobTracker.claim_chunk(run_id, 0) is None
+    _expire_leases(mongo_db)
+
+    new_run_id, pending, resumed = JobTracker.start_run('test_job', 3)
+    assert new_run_id != run_id and pending == [0, 1, 2, 3] and not resumed
+    assert _run_status(mongo_db, run_id) == RUN_FAILED
+    assert _run_status(mongo_db, new_run_id) == RUN_RUNNING
+
+def test_old_run_is_abandoned(mongo_db):
+    """超过最长运行时间的运行被放弃，即使仍有有效租约"""
+    run_id, _, _ = _start(mongo_db)
+    JobTracker.claim_chunk(run_id, 0)
+    started = datetime.datetime.utcnow() - datetime.timedelta(hours=Config.JOB_RUN_MAX_AGE_HOURS + 1)
+    mongo_db.get_collection(JOB_RUNS_COLLECTION).update_one(
+        {'_id': ObjectId(run_id)}, {'$set': {'started_at': started}}
+    )
+
+    new_run_id, _, resumed = JobTracker.start_run('test_job', 3)
+    assert new_run_id != run_id and not resumed
+    assert _run_status(mongo_db, run_id) == RUN_FAILED
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-v']))
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试夜间学习进度分析的写回位置
+答题统计写入knowledge_stats，知识图谱只保留 知识点 -> 掌握度 和level；数据库夹具mongo_db见conftest.py
+
+用法:
+    python -m pytest test_knowledge_stats.py
+"""
+
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from migrate import move_knowledge_stats
+from progress_tracker import LEARNING_EVENTS_COLLECTION
+from tasks import _analyze_user_batch
+
+@pytest.fixture
+def bulk_db(mongo_db, monkeypatch):
+    """
+    测试数据库；mongomock不支持新版pymongo的bulk_write，逐条执行批量更新
+
+    连接真实数据库（TEST_MONGO_URI）时不做替换。
+    """
+    if not os.environ.get('TEST_MONGO_URI'):
+        def bulk_write(collection_name, operations):
+            collection = mongo_db.get_collection(collection_name)
+            for operation in operations:
+                collection.update_one(operation._filter, operation._doc)
+        monkeypatch.setattr(mongo_db, 'bulk_write', bulk_write)
+    return mongo_db
+
+def test_analysis_is_stored_outside_knowledge_graph(bulk_db):
+    """分析结果不写入知识图谱，已有的知识点掌握度保持不变"""
+    user_id = bulk_db.insert_one('users', {
+        'username': 'alice',
+        'knowledge_graph': {'python_basics': 0.6, 'functions': 0.3}
+    }).inserted_id
+    bulk_db.insert_many(LEARNING_EVENTS_COLLECTION, [
+        {'user_id': user_id, 'topic': 'python_basics', 'correct': True},
+        {'user_id': user_id, 'topic': 'python_basics', 'correct': False},
+        {'user_id': user_id, 'topic': 'functions', 'correct': True}
+    ])
+
+    assert _analyze_user_batch([user_id]) == 1
+
+    user = bulk_db.find_one('users', {'_id': user_id})
+    graph = user['knowledge_graph']
+    assert set(graph) == {'python_basics', 'functions', 'level'}
+    assert (graph['python_basics'], graph['functions']) == (0.6, 0.3)
+    stats = user['knowledge_stats']
+    assert (stats['correct_count'], stats['total_count']) == (2, 3)
+    assert stats['knowledge_points'] == {'python_basics': 0.5, 'functions': 1.0}
+    assert 'analyzed_at' in stats
+
+def test_migration_moves_stats_out_of_knowledge_graph(bulk_db):
+    """迁移把旧版本写入知识图谱的统计字段移到knowledge_stats，可重复执行"""
+    user_id = bulk_db.insert_one('users', {'knowledge_graph': {
+        'python_basics': 0.6, 'level': 'intermediate',
+        'accuracy': 0.67, 'correct_count': 2, 'total_count': 3, 'knowledge_points': {'python_basics': 0.5}
+    }}).inserted_id
+    untouched = bulk_db.insert_one('users', {'knowledge_graph': {'functions': 0.4}}).inserted_id
+
+    assert move_knowledge_stats() == {'users': 1}
+    assert move_knowledge_stats() == {'users': 0}
+
+    user = bulk_db.find_one('users', {'_id': user_id})
+    assert user['knowledge_graph'] == {'python_basics': 0.6, 'level': 'intermediate'}
+    assert user['knowledge_stats'] == {
+        'accuracy': 0.67, 'correct_count': 2, 'total_count': 3, 'knowledge_points': {'python_basics': 0.5}
+    }
+    assert 'knowledge_stats' not in bulk_db.find_one('users', {'_id': untouched})
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-v']))
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试大模型响应缓存
+覆盖进程内缓存的TTL过期、LRU淘汰，共享缓存回填和命中统计，相同键的生成合并，以及MongoDB缓存的TTL索引
+
+用法:
+    python -m pytest test_llm_cache.py
+"""
+
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import utils.llm_cache as llm_cache
+from utils.llm_cache import MemoryCache, ResponseCache, MongoCacheBackend
+
+# clock夹具（见conftest.py）替换这些模块的time
+CLOCK_MODULES = [llm_cache]
+
+class DictBackend:
+    """内存中的共享缓存后端"""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ttl):
+        self.values[key] = value
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+def test_ttl_expiry(clock):
+    """条目在TTL内可读，到期后返回None并被移除"""
+    cache = MemoryCache()
+    cache.set('a', 'value', 60)
+
+    clock.now += 59
+    assert cache.get('a') == 'value'
+    clock.now += 1
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+def test_lru_eviction(clock):
+    """超过容量时淘汰最久未使用的条目，读取会刷新使用顺序"""
+    cache = MemoryCache(max_entries=2)
+    cache.set('a', 1, 60)
+    cache.set('b', 2, 60)
+    assert cache.get('a') == 1
+
+    cache.set('c', 3, 60)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert len(cache) == 2
+
+def test_response_cache_stats(clock):
+    """共享缓存命中后回填进程内缓存，stats按来源统计命中"""
+    shared = DictBackend()
+    cache = ResponseCache(ttl=60, max_entries=8, shared=shared)
+    assert cache.get('k') is None
+
+    ResponseCache(ttl=60, shared=shared).set('k', {'text': 'hi'})
+    assert cache.get('k') == {'text': 'hi'}
+    assert cache.get('k') == {'text': 'hi'}
+
+    stats = cache.stats()
+    assert stats['misses'] == 1
+    assert stats['shared_hits'] == 1
+    assert stats['local_hits'] == 1
+    assert stats['hit_rate'] == round(2 / 3, 4)
+    assert stats['local_size'] == 1
+
+def test_failed_generation_is_shared_and_released():
+    """生成失败时等待同一个键的请求收到同样的异常，之后的请求重新生成"""
+    cache = ResponseCache(ttl=60)
+    future, leader = cache._join('k')
+    assert leader
+    follower, leader = cache._join('k')
+    assert follower is future and not leader
+
+    def fail():
+        raise RuntimeError('llm down')
+
+    cache._compute('k', future, fail)
+    with pytest.raises(RuntimeError):
+        follower.result()
+    assert cache.get_or_compute('k', lambda: 'value') == 'value'
+    assert cache.stats()['coalesced'] == 1
+
+def test_mongo_backend_ttl_index_is_created_by_migration(mongo_db):
+    """创建缓存后端不再创建索引，TTL索引由create_indexes创建"""
+    collection = MongoCacheBackend().collection
+    assert 'expires_at_1' not in collection.index_information()
+
+    mongo_db.create_indexes()
+
+    assert collection.index_information()['expires_at_1']['expireAfterSeconds'] == 0
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-v']))
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试大模型调用调度器的准入控制
+覆盖排队已满、用户在途请求数、令牌额度三类拒绝，以及释放名额后恢复准入和用量统计对象
+
+用法:
+    python -m pytest test_llm_governor.py
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import utils.llm_governor as governor_module
+from utils.llm_governor import LLMGovernor, LLMThrottled, current_subject, llm_governed
+
+class FakeUsage:
+    """内存中的令牌用量存储"""
+
+    def __init__(self):
+        self.tokens = {}
+
+    def get_tokens(self, subject):
+        return self.tokens.get(subject, 0)
+
+    def add_tokens(self, subject, tokens):
+        self.tokens[subject] = self.tokens.get(subject, 0) + tokens
+
+def test_shed_when_queue_full():
+    """全局名额已满且排队数达到上限时，新请求直接被拒绝"""
+    governor = LLMGovernor(max_concurrency=1, max_queue=1, queue_timeout=5)
+    holding, done = threading.Event(), threading.Event()
+
+    def hold():
+        with governor.slot():
+            holding.set()
+            done.wait(5)
+
+    def wait_for_slot():
+        with governor.slot():
+            pass
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    assert holding.wait(5)
+    waiter = threading.Thread(target=wait_for_slot)
+    waiter.start()
+    for _ in range(500):
+        if governor.stats()['queue_depth'] == 1:
+            break
+        time.sleep(0.01)
+
+    try:
+        with pytest.raises(LLMThrottled) as exc:
+            governor.acquire_user('user:u1')
+        assert exc.value.reason == 'busy'
+        assert governor.stats()['shed_busy'] == 1
+    finally:
+        done.set()
+        holder.join(5)
+        waiter.join(5)
+
+    # 排队清空后恢复准入
+    governor.release_user('user:u1', governor.acquire_user('user:u1'))
+
+def test_queue_timeout():
+    """排队超过queue_timeout仍未获得名额时拒绝"""
+    governor = LLMGovernor(max_concurrency=1, queue_timeout=0.05)
+    with governor.slot():
+        with pytest.raises(LLMThrottled) as exc:
+            with governor.slot():
+                pass
+    assert exc.value.reason == 'queue_timeout'
+    assert governor.stats()['queue_timeouts'] == 1
+
+def test_shed_user_inflight_and_release():
+    """同一用户的在途请求达到上限时拒绝，释放后恢复准入，其他用户不受影响"""
+    governor = LLMGovernor(user_max_inflight=1)
+    token = governor.acquire_user('user:u1')
+
+    with pytest.raises(LLMThrottled) as exc:
+        governor.acquire_user('user:u1')
+    assert exc.value.reason == 'user_inflight'
+    governor.release_user('user:u2', governor.acquire_user('user:u2'))
+
+    governor.release_user('user:u1', token)
+    assert governor.stats()['users_in_flight'] == 0
+    governor.release_user('user:u1', governor.acquire_user('user:u1'))
+    assert governor.stats()['shed_user_inflight'] == 1
+
+def test_shed_quota():
+    """当天令牌用量达到额度后拒绝，Retry-After为距次日零点的秒数"""
+    usage = FakeUsage()
+    governor = LLMGovernor(daily_token_quota=100, usage=usage)
+
+    token = governor.acquire_user('user:u1')
+    governor.record_usage(100)
+    governor.release_user('user:u1', token)
+    assert usage.tokens == {'user:u1': 100}
+
+    with pytest.raises(LLMThrottled) as exc:
+        governor.acquire_user('user:u1')
+    assert exc.value.reason == 'quota'
+    assert 0 < exc.value.retry_after <= 86400
+    assert governor.stats()['users_in_flight'] == 0
+
+def test_release_restores_subject():
+    """释放后恢复准入前的用量统计对象，之后的调用不再记到上一个用户名下"""
+    usage = FakeUsage()
+    governor = LLMGovernor(daily_token_quota=100, usage=usage)
+
+    token = governor.acquire_user('user:u1')
+    assert current_subject.get() == 'user:u1'
+    governor.release_user('user:u1', token)
+    assert current_subject.get() is None
+
+    governor.record_usage(10)
+    assert usage.tokens == {}
+
+def test_decorator_resets_subject_after_request(monkeypatch):
+    """llm_governed装饰的接口返回后，同一线程上的用量统计对象被清除"""
+    governor = LLMGovernor()
+    monkeypatch.setattr(governor_module, 'llm_governor', governor)
+    app = Flask(__name__)
+    seen = []
+
+    @app.route('/generate', methods=['POST'])
+    @llm_governed
+    def generate():
+        seen.append(current_subject.get())
+        return {'success': True}
+
+    response = app.test_client().post('/generate', environ_base={'REMOTE_ADDR': '10.0.0.1'})
+
+    assert response.status_code == 200
+    assert seen == ['ip:10.0.0.1']
+    assert current_subject.get() is None
+    assert governor.stats()['users_in_flight'] == 0
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-v']))
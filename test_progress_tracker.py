@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试学习历史的写入和索引
+数据库夹具mongo_db见conftest.py
+
+用法:
+    python -m pytest test_progress_tracker.py
+"""
+
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bson import ObjectId
+from progress_tracker import ProgressTracker, LEARNING_EVENTS_COLLECTION, HISTORY_SORT
+
+USER_ID = str(ObjectId())
+
+def test_client_supplied_id_is_ignored(mongo_db):
+    """客户端传入的_id不会写入学习历史（_id用作分页游标）"""
+    assert ProgressTracker.add_learning_history(USER_ID, {'_id': 'forged', 'topic': 'python_basics'})
+    assert ProgressTracker.add_learning_events(USER_ID, [{'_id': 'forged_2', 'topic': 'functions'}])
+
+    events = mongo_db.find_many(LEARNING_EVENTS_COLLECTION, {'user_id': ObjectId(USER_ID)})
+    assert sorted(event['topic'] for event in events) == ['functions', 'python_basics']
+    assert all(isinstance(event['_id'], ObjectId) for event in events)
+
+def test_history_index_matches_page_sort(mongo_db):
+    """学习历史索引与分页排序一致，并替换旧的 (user_id, completed_at) 索引"""
+    events = mongo_db.get_collection(LEARNING_EVENTS_COLLECTION)
+    events.create_index([('user_id', 1), ('completed_at', -1)])
+
+    mongo_db.create_indexes()
+
+    keys = [index['key'] for index in events.index_information().values()]
+    assert [('user_id', 1)] + HISTORY_SORT in keys
+    assert [('user_id', 1), ('completed_at', -1)] not in keys
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-v']))
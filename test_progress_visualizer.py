@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试学习报告图表的渲染时间预算
+超出预算的图表返回None并标记charts_complete为False，已缓存和按时完成的图表正常返回URL
+
+用法:
+    python -m pytest test_progress_visualizer.py
+"""
+
+import logging
+import os
+import sys
+from concurrent.futures import Future
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.chart_cache import ChartCache, make_chart_key
+from utils.progress_visualizer import ProgressVisualizer, CHART_URL
+
+MASTERY = {'topics': ['python_basics'], 'values': [0.5]}
+TIMELINE = {'dates': ['2024-01-01'], 'values': [1]}
+
+@pytest.fixture
+def visualizer(tmp_path, monkeypatch):
+    """不访问数据库、不启动渲染进程的可视化工具"""
+    visualizer = ProgressVisualizer()
+    visualizer.chart_cache = ChartCache(str(tmp_path))
+    monkeypatch.setattr(visualizer, 'get_progress_summary', lambda user_id: {'total_lessons_completed': 1})
+    monkeypatch.setattr(visualizer, 'get_topic_mastery_data', lambda user_id: MASTERY)
+    monkeypatch.setattr(visualizer, 'get_timeline_data', lambda user_id, days=30: TIMELINE)
+    return visualizer
+
+def test_report_when_render_budget_runs_out(visualizer, monkeypatch, caplog):
+    """渲染未在预算内完成的图表为None，charts_complete为False，并记录警告"""
+    pending = {}
+
+    def submit_chart(chart_type, data):
+        pending[chart_type] = Future()
+        return make_chart_key(chart_type, data), pending[chart_type]
+
+    monkeypatch.setattr(visualizer, 'submit_chart', submit_chart)
+
+    with caplog.at_level(logging.WARNING, logger='utils.progress_visualizer'):
+        report = visualizer.generate_learning_report('u1', timeout=0.05)
+
+    assert report['charts'] == {'knowledge_map': None, 'progress_timeline': None, 'topic_mastery': None}
+    assert report['charts_complete'] is False
+    assert report['summary'] == {'total_lessons_completed': 1}
+    assert set(pending) == {'knowledge_map', 'progress_timeline', 'topic_mastery'}
+    assert '渲染图表 knowledge_map 超时' in caplog.text
+
+def test_report_with_cached_and_pending_charts(visualizer, monkeypatch):
+    """已缓存和按时渲染完成的图表返回URL，仍在渲染的图表为None"""
+    def submit_chart(chart_type, data):
+        key = make_chart_key(chart_type, data)
+        if chart_type == 'knowledge_map':
+            return key, None
+        future = Future()
+        if chart_type == 'topic_mastery':
+            future.set_result(b'png')
+        return key, future
+
+    monkeypatch.setattr(visualizer, 'submit_chart', submit_chart)
+    report = visualizer.generate_learning_report('u1', timeout=0.05)
+
+    assert report['charts']['knowledge_map'] == CHART_URL.format(key=make_chart_key('knowledge_map', MASTERY))
+    assert report['charts']['topic_mastery'] == CHART_URL.format(key=make_chart_key('topic_mastery', MASTERY))
+    assert report['charts']['progress_timeline'] is None
+    assert report['charts_complete'] is False
+
+def test_report_complete_when_all_charts_ready(visualizer, monkeypatch):
+    """全部图表就绪时charts_complete为True"""
+    monkeypatch.setattr(visualizer, 'submit_chart',
+                        lambda chart_type, data: (make_chart_key(chart_type, data), None))
+    report = visualizer.generate_learning_report('u1', timeout=0.05)
+
+    assert all(report['charts'].values())
+    assert report['charts_complete'] is True
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-v']))
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试滑动窗口限流器
+覆盖上一窗口按比例加权、retry_after、reset，以及进程内计数后端的容量和过期淘汰
+
+用法:
+    python -m pytest test_rate_limiter.py
+"""
+
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import utils.rate_limiter as rate_limiter
+from utils.rate_limiter import MemoryRateLimitBackend, RateLimiter
+
+# clock夹具（见conftest.py）替换这些模块的time
+CLOCK_MODULES = [rate_limiter]
+
+def hit_times(limiter, key, times):
+    """连续请求，返回最后一次的检查结果"""
+    result = None
+    for _ in range(times):
+        result = limiter.hit(key)
+    return result
+
+def test_previous_window_is_weighted(clock):
+    """上一窗口的计数按其在滑动窗口内所占比例计入"""
+    limiter = RateLimiter('test', limit=10, window=60)
+    hit_times(limiter, 'k', 8)
+
+    clock.now += 60 + 15
+    result = limiter.hit('k')
+    assert result.count == pytest.approx(8 * 0.75 + 1)
+    assert result.remaining == 3
+    assert result.allowed
+
+    # 两个窗口之后不再计入
+    clock.now += 60
+    assert limiter.hit('k').count == pytest.approx(1 * 0.75 + 1)
+
+def test_results_match_direct_weighting(clock):
+    """_result按 上一窗口计数 * (1 - 已过比例) + 当前计数 估算"""
+    limiter = RateLimiter('test', limit=10, window=60)
+    assert limiter._result(4, 10, 30).count == pytest.approx(9)
+    assert limiter._result(4, 10, 30).allowed
+    assert not limiter._result(6, 10, 30).allowed
+
+def test_retry_after_lets_retry_through(clock):
+    """被拒绝后等待retry_after秒重试即可通过，提前一秒重试仍被拒绝"""
+    limiter = RateLimiter('test', limit=10, window=60)
+    hit_times(limiter, 'k', 10)
+    clock.now += 60 + 30
+
+    result = hit_times(limiter, 'k', 6)
+    assert not result.allowed
+    assert result.retry_after == 12
+
+    clock.now += result.retry_after - 1
+    assert not limiter.peek('k').allowed
+    clock.now += 1
+    assert limiter.peek('k').allowed
+    assert limiter.hit('k').allowed
+
+def test_retry_after_when_current_window_is_full(clock):
+    """当前窗口已满时，retry_after跨到下一窗口"""
+    limiter = RateLimiter('test', limit=4, window=60)
+    clock.now += 30
+    result = hit_times(limiter, 'k', 5)
+    assert not result.allowed
+    assert limiter.peek('k').retry_after == result.retry_after
+
+    clock.now += result.retry_after - 1
+    assert not limiter.peek('k').allowed
+    clock.now += 1
+    assert limiter.hit('k').allowed
+
+def test_reset_clears_counts(clock):
+    """reset后同一限流键重新计数，其他键不受影响"""
+    limiter = RateLimiter('test', limit=2, window=60)
+    hit_times(limiter, 'a', 3)
+    hit_times(limiter, 'b', 3)
+    assert not limiter.peek('a').allowed
+
+    limiter.reset('a')
+    assert limiter.peek('a').allowed
+    assert limiter.peek('a').remaining == 1
+    assert not limiter.peek('b').allowed
+
+def test_memory_backend_evicts_least_recently_updated(clock):
+    """超过max_entries时淘汰最久未更新的计数条目"""
+    backend = MemoryRateLimitBackend(max_entries=2)
+    backend.increment('a', 100, 120)
+    backend.increment('b', 100, 120)
+    backend.increment('a', 100, 120)
+    backend.increment('c', 100, 120)
+
+    assert len(backend) == 2
+    assert backend.get('b', 100) == (0, 0)
+    assert backend.get('a', 100) == (2, 0)
+
+def test_memory_backend_evicts_expired(clock):
+    """条目在ttl后过期，下次写入时被清除"""
+    backend = MemoryRateLimitBackend()
+    backend.increment('a', 100, 120)
+    clock.now += 60
+    backend.increment('b', 101, 120)
+    assert len(backend) == 2
+
+    clock.now += 61
+    backend.increment('c', 102, 120)
+    assert len(backend) == 2
+    assert backend.get('a', 100) == (0, 0)
+    assert backend.get('b', 101) == (1, 0)
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-v']))
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试令牌吊销在多个工作进程间生效
+每个TokenCache实例模拟一个工作进程，吊销记录通过共享存储传递；夹具mongo_db、clock见conftest.py
+
+用法:
+    python -m pytest test_token_cache.py
+"""
+
+import datetime
+import os
+import sys
+import time
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import utils.llm_cache as llm_cache
+from utils.token_cache import TokenCache, TOKEN_REVOCATIONS_COLLECTION
+
+# clock夹具替换进程内缓存的时间，用于推进revocation_check_ttl
+CLOCK_MODULES = [llm_cache]
+
+PAYLOAD = {'user_id': 'u1', 'username': 'alice', 'iat': time.time() - 60, 'exp': time.time() + 3600}
+
+class DictStore:
+    """内存中的共享吊销记录存储，统计查询次数"""
+
+    def __init__(self):
+        self.records = {}
+        self.lookups = 0
+
+    def add(self, key, ttl, revoked_at=None):
+        self.records[key] = revoked_at
+
+    def lookup(self, keys):
+        self.lookups += 1
+        return {key: self.records[key] for key in keys if key in self.records}
+
+class BrokenStore:
+    """始终出错的吊销记录存储"""
+
+    def add(self, key, ttl, revoked_at=None):
+        raise ConnectionError('store down')
+
+    def lookup(self, keys):
+        raise ConnectionError('store down')
+
+def test_revocation_is_seen_by_other_workers(mongo_db, clock):
+    """在一个工作进程登出后立即生效，其他工作进程最迟在revocation_check_ttl秒后生效"""
+    worker_a, worker_b = TokenCache(revocation_check_ttl=10), TokenCache(revocation_check_ttl=10)
+    worker_b.put('token', PAYLOAD)
+    assert worker_b.get('token') == PAYLOAD
+    assert not worker_b.is_revoked('token', PAYLOAD)
+
+    worker_a.revoke('token', PAYLOAD)
+
+    assert worker_a.is_revoked('token', PAYLOAD)
+    assert not worker_b.is_revoked('token', PAYLOAD)
+    clock.now += 10
+    assert worker_b.is_revoked('token', PAYLOAD)
+    assert worker_b.get('token') is None
+    assert TokenCache().is_revoked('token', PAYLOAD)
+    assert not worker_b.is_revoked('other', PAYLOAD)
+
+def test_negative_lookups_are_cached(clock):
+    """确认未吊销的令牌在revocation_check_ttl内不再查询共享存储"""
+    store = DictStore()
+    cache = TokenCache(revocations=store, revocation_check_ttl=10)
+    for _ in range(5):
+        assert not cache.is_revoked('token', PAYLOAD)
+    assert store.lookups == 1
+
+    clock.now += 10
+    assert not cache.is_revoked('token', PAYLOAD)
+    assert store.lookups == 2
+    assert cache.stats()['revocation_lookups'] == 2
+
+def test_revocation_expires_with_token(mongo_db):
+    """吊销记录保留到令牌过期为止"""
+    TokenCache().revoke('token', PAYLOAD)
+
+    record = mongo_db.find_one(TOKEN_REVOCATIONS_COLLECTION, {})
+    remaining = (record["expires_at"] - datetime.datetime.utcnow()).total_seconds()
+    assert 3500 < remaining <= 3600
+
+def test_store_outage_fails_closed_by_default(clock):
+    """共享存储不可用时：登出报错；近期确认过的令牌继续放行，其余令牌默认拒绝，fail_open时放行"""
+    cache = TokenCache(revocations=BrokenStore())
+    with pytest.raises(ConnectionError):
+        cache.revoke('token', PAYLOAD)
+    with pytest.raises(ConnectionError):
+        cache.revoke_user('u1')
+
+    assert TokenCache(revocations=BrokenStore()).is_revoked('token', PAYLOAD)
+    assert not TokenCache(revocations=BrokenStore(), fail_open=True).is_revoked('token', PAYLOAD)
+
+    cache = TokenCache(revocations=DictStore(), revocation_check_ttl=10)
+    assert not cache.is_revoked('token', PAYLOAD)
+    cache.revocations = BrokenStore()
+    assert not cache.is_revoked('token', PAYLOAD)
+    clock.now += 10
+    assert cache.is_revoked('token', PAYLOAD)
+    assert cache.stats()['revocation_errors'] == 1
+
+def test_revoke_user_revokes_earlier_tokens(mongo_db):
+    """吊销用户后，之前签发的令牌在所有工作进程上失效，之后签发的令牌不受影响"""
+    worker_a, worker_b = TokenCache(), TokenCache()
+    old = dict(PAYLOAD, iat=time.time() - 1)
+    other_user = dict(PAYLOAD, user_id='u2')
+
+    revoked_at = worker_a.revoke_user('u1')
+    new = dict(PAYLOAD, iat=time.time())
+
+    assert new['iat'] > revoked_at
+    assert worker_a.is_revoked('old', old)
+    assert worker_b.is_revoked('old', old)
+    assert not worker_a.is_revoked('new', new)
+    assert not worker_b.is_revoked('new', new)
+    assert not worker_b.is_revoked('other', other_user)
+
+def test_stats_count_hits_and_revocations(mongo_db):
+    """统计命中率和拒绝的已吊销令牌数"""
+    cache = TokenCache()
+    cache.get('token')
+    cache.put('token', PAYLOAD)
+    cache.get('token')
+    TokenCache().revoke('token', PAYLOAD)
+    cache.is_revoked('token', PAYLOAD)
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate'], stats['revoked']) == (1, 1, 0.5, 1)
+
+def test_change_password_revokes_sessions(mongo_db):
+    """修改密码后旧令牌返回401，响应中的新令牌可用；退出全部会话后新令牌也失效"""
+    from app import app
+    from auth import Auth
+
+    assert Auth.register_user('alice', 'alice@example.com', 'Passw0rd!x')['success']
+    old_token = Auth.authenticate_user('alice', 'Passw0rd!x')['token']
+    other_device = Auth.authenticate_user('alice', 'Passw0rd!x')['token']
+    client = app.test_client()
+
+    def get_progress(token):
+        return client.get('/api/progress', headers={'Authorization': f'Bearer {token}'}).status_code
+
+    assert get_progress(other_device) == 200
+
+    response = client.post('/api/change-password', headers={'Authorization': f'Bearer {old_token}'},
+                           json={'old_password': 'wrong', 'new_password': 'N3wPassw0rd!'})
+    assert response.status_code == 400
+    response = client.post('/api/change-password', headers={'Authorization': f'Bearer {old_token}'},
+                           json={'old_password': 'Passw0rd!x', 'new_password': 'N3wPassw0rd!'})
+    assert response.status_code == 200
+    new_token = response.get_json()['data']['token']
+
+    assert get_progress(old_token) == 401
+    assert get_progress(other_device) == 401
+    assert get_progress(new_token) == 200
+    assert not Auth.authenticate_user('alice', 'Passw0rd!x')['success']
+
+    assert client.post('/api/logout-all', headers={'Authorization': f'Bearer {new_token}'}).status_code == 200
+    assert get_progress(new_token) == 401
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-v']))
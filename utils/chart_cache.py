@@ -0,0 +1,159 @@
+"""
+图表缓存模块
+按图表类型和输入数据的哈希缓存渲染好的PNG图表，数据不变时不再重复渲染
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 缓存键为64位十六进制SHA-256摘要
+KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+def make_chart_key(chart_type, data):
+    """
+    生成图表缓存键（输入数据以SECRET_KEY签名的HMAC-SHA256）
+
+    图表接口不需要登录（<img>标签无法携带Authorization头），缓存键同时作为访问凭证：
+    只有拿到学习报告的用户才知道图表URL。绘图数据的取值范围有限，因此用服务端密钥签名，
+    防止他人按猜测的数据算出键来读取其他用户的图表。
+
+    Args:
+        chart_type (str): 图表类型，例如 knowledge_map、progress_timeline
+        data (dict): 绘图所用的全部数据
+
+    Returns:
+        str: 缓存键
+    """
+    raw = json.dumps({'chart': chart_type, 'data': data}, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hmac.new(Config.SECRET_KEY.encode('utf-8'), raw.encode('utf-8'), hashlib.sha256).hexdigest()
+
+class ChartCache:
+    """磁盘图表缓存（多进程共享，按最近使用时间淘汰）"""
+
+    def __init__(self, directory=None, max_bytes=64 * 1024 * 1024):
+        """
+        初始化图表缓存
+
+        Args:
+            directory (str): 缓存目录，默认使用系统临时目录下的子目录
+            max_bytes (int): 缓存总大小上限（字节）
+        """
+        self.directory = directory or os.path.join(tempfile.gettempdir(), 'ai_learning_companion_charts')
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    @classmethod
+    def from_config(cls):
+        """根据Config创建图表缓存"""
+        return cls(directory=Config.CHART_CACHE_DIR, max_bytes=Config.CHART_CACHE_MAX_BYTES)
+
+    def _path(self, key):
+        """缓存键对应的文件路径"""
+        return os.path.join(self.directory, f"{key}.png")
+
+    def get(self, key):
+        """
+        读取缓存的图表
+
+        Args:
+            key (str): 缓存键
+
+        Returns:
+            bytes: PNG数据，不存在返回None
+        """
+        if not KEY_PATTERN.match(key):
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+            # 更新修改时间，作为最近使用时间
+            os.utime(path)
+            return content
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"读取图表缓存失败: {e}")
+            return None
+
+    def contains(self, key):
+        """缓存中是否已有该图表"""
+        return bool(KEY_PATTERN.match(key)) and os.path.exists(self._path(key))
+
+    def set(self, key, content):
+        """
+        写入图表，超过大小上限时淘汰最久未使用的图表
+
+        Args:
+            key (str): 缓存键
+            content (bytes): PNG数据
+        """
+        if not KEY_PATTERN.match(key):
+            raise ValueError(f"无效的图表缓存键: {key}")
+        try:
+            # 先写临时文件再原子替换，其他进程不会读到写了一半的文件
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"写入图表缓存失败: {e}")
+            return
+
+        # 目录由多个工作进程共享，各进程只知道自己写入的大小，每次都按目录实际大小判断
+        # （只在渲染新图表后写入，扫描目录的开销远小于渲染）
+        with self._lock:
+            entries, total = self._scan()
+            if total > self.max_bytes:
+                self._evict(entries, total)
+
+    def _scan(self):
+        """
+        扫描缓存目录
+
+        Returns:
+            tuple: ([(修改时间, 大小, 路径), ...], 总大小)
+        """
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.png'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        return entries, total
+
+    def _evict(self, entries, total):
+        """
+        淘汰最久未使用的图表，直到总大小降到上限的90%以下
+
+        Args:
+            entries (list): _scan返回的图表列表
+            total (int): 当前总大小
+        """
+        target = self.max_bytes * 0.9
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                # 已被其他进程淘汰
+                total -= size
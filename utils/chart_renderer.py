@@ -0,0 +1,155 @@
+"""
+图表渲染模块
+使用matplotlib面向对象的Figure接口渲染PNG图表，不依赖pyplot全局状态，
+可在渲染进程池中并行执行
+
+matplotlib只在渲染时导入，Web进程本身不加载它
+"""
+
+import importlib.util
+import math
+from io import BytesIO
+
+matplotlib_available = importlib.util.find_spec('matplotlib') is not None
+
+def render_chart(chart_type, data):
+    """
+    渲染指定类型的图表（进程池任务入口）
+
+    Args:
+        chart_type (str): 图表类型（CHART_RENDERERS中的键）
+        data (dict): 绘图数据
+
+    Returns:
+        bytes: PNG数据
+    """
+    return CHART_RENDERERS[chart_type](data)
+
+def _to_png(fig):
+    """将图表保存为PNG数据"""
+    img_buffer = BytesIO()
+    fig.savefig(img_buffer, format='png', bbox_inches='tight')
+    return img_buffer.getvalue()
+
+def render_knowledge_map(data):
+    """
+    渲染知识掌握情况雷达图
+
+    Args:
+        data (dict): {'topics': [...], 'values': [...]}
+
+    Returns:
+        bytes: PNG数据
+    """
+    from matplotlib.figure import Figure
+
+    # 创建雷达图
+    fig = Figure(figsize=(8, 6))
+    ax = fig.add_subplot(projection='polar')
+
+    # 准备数据
+    topic_names = data['topics']
+    mastery_levels = list(data['values'])
+
+    # 计算角度
+    angles = [n / float(len(topic_names)) * 2 * math.pi for n in range(len(topic_names))]
+    angles += angles[:1]  # 闭合图形
+
+    # 添加数据
+    mastery_levels += mastery_levels[:1]  # 闭合图形
+
+    # 绘制
+    ax.plot(angles, mastery_levels, 'o-', linewidth=2, color='#4361ee')
+    ax.fill(angles, mastery_levels, alpha=0.25, color='#4361ee')
+    ax.set_xticks(angles[:-1])
+    ax.set_xticklabels(topic_names)
+    ax.set_ylim(0, 1)
+    ax.set_yticks([0.25, 0.5, 0.75, 1.0])
+    ax.set_yticklabels(['25%', '50%', '75%', '100%'])
+    ax.set_title('知识点掌握情况', pad=20)
+
+    return _to_png(fig)
+
+def render_progress_timeline(data):
+    """
+    渲染学习进度时间线折线图
+
+    Args:
+        data (dict): {'dates': [...], 'values': [...]}
+
+    Returns:
+        bytes: PNG数据
+    """
+    from matplotlib.figure import Figure
+
+    # 创建折线图
+    fig = Figure(figsize=(10, 6))
+    ax = fig.add_subplot()
+
+    dates = data['dates']
+    activities = data['values']
+
+    ax.plot(dates, activities, marker='o', linewidth=2, markersize=4, color='#4361ee')
+    ax.fill_between(dates, activities, alpha=0.25, color='#4361ee')
+    ax.set_xlabel('日期')
+    ax.set_ylabel('学习活动数')
+    ax.set_title(f'最近{len(dates)}天学习活动统计')
+    ax.grid(True, alpha=0.3)
+
+    # 设置x轴标签间隔以避免重叠
+    if len(dates) > 10:
+        step = len(dates) // 10
+        ax.set_xticks(dates[::step])
+
+    ax.tick_params(axis='x', labelrotation=45)
+    for label in ax.get_xticklabels():
+        label.set_horizontalalignment('right')
+    fig.tight_layout()
+
+    return _to_png(fig)
+
+def render_topic_mastery(data):
+    """
+    渲染主题掌握情况柱状图
+
+    Args:
+        data (dict): {'topics': [...], 'values': [...]}
+
+    Returns:
+        bytes: PNG数据
+    """
+    from matplotlib.figure import Figure
+
+    # 创建柱状图
+    fig = Figure(figsize=(10, 6))
+    ax = fig.add_subplot()
+
+    topic_names = data['topics']
+    mastery_levels = data['values']
+
+    bars = ax.bar(range(len(topic_names)), mastery_levels,
+                  color=['#4361ee' if x < 0.5 else '#4cc9f0' if x < 0.8 else '#4caf50'
+                         for x in mastery_levels])
+
+    ax.set_xlabel('知识点')
+    ax.set_ylabel('掌握程度')
+    ax.set_title('各知识点掌握情况')
+    ax.set_xticks(range(len(topic_names)))
+    ax.set_xticklabels(topic_names, rotation=45, ha='right')
+    ax.set_ylim(0, 1)
+
+    # 添加数值标签
+    for bar, level in zip(bars, mastery_levels):
+        ax.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.01,
+                f'{level:.2f}', ha='center', va='bottom')
+
+    fig.tight_layout()
+
+    return _to_png(fig)
+
+# 图表类型 -> 渲染函数
+CHART_RENDERERS = {
+    'knowledge_map': render_knowledge_map,
+    'progress_timeline': render_progress_timeline,
+    'topic_mastery': render_topic_mastery
+}
@@ -0,0 +1,178 @@
+"""
+熔断器模块
+统计最近若干次调用的失败率和慢调用比例，超过阈值时熔断：熔断期间调用方直接使用回退内容，
+不再等待外部服务超时；熔断时间结束后进入半开状态，放行少量探测调用，成功则恢复，失败则继续熔断
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 熔断器状态
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+class CircuitBreaker:
+    """基于滑动窗口的熔断器（线程安全，每个工作进程独立统计）"""
+
+    def __init__(self, name, window_size=20, min_calls=10, error_rate=0.5,
+                 slow_call_seconds=10, slow_rate=0.8, open_seconds=30, half_open_probes=1):
+        """
+        初始化熔断器
+
+        Args:
+            name (str): 熔断器名称（用于日志）
+            window_size (int): 统计最近多少次调用
+            min_calls (int): 窗口内至少有多少次调用才判断是否熔断
+            error_rate (float): 失败率阈值
+            slow_call_seconds (float): 耗时超过该秒数的调用视为慢调用
+            slow_rate (float): 慢调用比例阈值
+            open_seconds (float): 熔断持续时间（秒）
+            half_open_probes (int): 半开状态下同时放行的探测调用数
+        """
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self.state = STATE_CLOSED
+        self._outcomes = deque(maxlen=window_size)
+        self._failures = 0
+        self._slow_calls = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+        self.counters = {'rejected': 0, 'opened': 0}
+
+    @classmethod
+    def from_config(cls, name):
+        """根据Config创建熔断器"""
+        return cls(
+            name,
+            window_size=Config.LLM_BREAKER_WINDOW,
+            min_calls=Config.LLM_BREAKER_MIN_CALLS,
+            error_rate=Config.LLM_BREAKER_ERROR_RATE,
+            slow_call_seconds=Config.LLM_BREAKER_SLOW_CALL_SECONDS,
+            slow_rate=Config.LLM_BREAKER_SLOW_RATE,
+            open_seconds=Config.LLM_BREAKER_OPEN_SECONDS
+        )
+
+    def allow(self):
+        """
+        是否放行本次调用（放行后必须调用record_success、record_failure或cancel）
+
+        Returns:
+            bool: 是否放行
+        """
+        with self._lock:
+            if self.state == STATE_OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    self.counters['rejected'] += 1
+                    return False
+                self.state = STATE_HALF_OPEN
+                self._probes = 0
+                logger.info(f"熔断器 {self.name} 进入半开状态，放行探测调用")
+
+            if self.state == STATE_HALF_OPEN:
+                if self._probes >= self.half_open_probes:
+                    self.counters['rejected'] += 1
+                    return False
+                self._probes += 1
+            return True
+
+    def cancel(self):
+        """放行后没有实际发起调用时（例如排队超时）调用，归还半开状态的探测名额"""
+        with self._lock:
+            if self.state == STATE_HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+
+    def record_success(self, duration):
+        """
+        记录成功调用
+
+        Args:
+            duration (float): 调用耗时（秒）
+        """
+        self._record(False, duration)
+
+    def record_failure(self, duration=0.0):
+        """
+        记录失败调用
+
+        Args:
+            duration (float): 调用耗时（秒）
+        """
+        self._record(True, duration)
+
+    def _record(self, failed, duration):
+        """记录调用结果并更新熔断状态"""
+        slow = duration >= self.slow_call_seconds
+        with self._lock:
+            if self.state == STATE_HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if failed or slow:
+                    self._open(f"探测调用{'失败' if failed else '过慢'}")
+                else:
+                    self.state = STATE_CLOSED
+                    self._reset_window()
+                    logger.info(f"熔断器 {self.name} 探测成功，恢复调用")
+                return
+            if self.state == STATE_OPEN:
+                # 熔断前已放行的调用，结果不再计入
+                return
+
+            if len(self._outcomes) == self._outcomes.maxlen:
+                old_failed, old_slow = self._outcomes[0]
+                self._failures -= old_failed
+                self._slow_calls -= old_slow
+            self._outcomes.append((failed, slow))
+            self._failures += failed
+            self._slow_calls += slow
+
+            calls = len(self._outcomes)
+            if calls < self.min_calls:
+                return
+            if self._failures / calls >= self.error_rate:
+                self._open(f"失败率 {self._failures}/{calls}")
+            elif self._slow_calls / calls >= self.slow_rate:
+                self._open(f"慢调用比例 {self._slow_calls}/{calls}")
+
+    def _open(self, reason):
+        """进入熔断状态，需持有锁"""
+        self.state = STATE_OPEN
+        self._opened_at = time.monotonic()
+        self._reset_window()
+        self.counters['opened'] += 1
+        logger.warning(f"熔断器 {self.name} 熔断（{reason}），{self.open_seconds}秒内直接使用回退内容")
+
+    def _reset_window(self):
+        """清空统计窗口，需持有锁"""
+        self._outcomes.clear()
+        self._failures = 0
+        self._slow_calls = 0
+
+    def stats(self):
+        """
+        获取熔断器状态
+
+        Returns:
+            dict: 状态、窗口内调用数、失败数、慢调用数及累计熔断和拒绝次数
+        """
+        with self._lock:
+            stats = dict(self.counters)
+            stats.update({
+                'state': self.state,
+                'window_calls': len(self._outcomes),
+                'window_failures': self._failures,
+                'window_slow_calls': self._slow_calls
+            })
+        return stats
@@ -1,33 +1,56 @@
 """
 内容生成器工具模块
 用于生成个性化的学习内容和练习题
-支持使用阿里云百炼API生成真实自适应内容
+支持使用阿里云百炼API（或本地模拟提供方，见utils.llm_provider）生成真实自适应内容
+以a开头的异步方法供ASGI服务使用，提示词、缓存键和回退逻辑与同步方法相同
 """
 
+import asyncio
+import contextvars
 import random
 import json
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from config import Config
+from progress_tracker import NON_TOPIC_FIELDS
+from utils.llm_cache import ResponseCache, make_fingerprint
+from utils.llm_governor import llm_governor, LLMThrottled
+from utils.circuit_breaker import CircuitBreaker
+from utils.llm_provider import create_provider, LLMProviderError
 
-try:
-    from dashscope import Generation
-    import dashscope
-    DASHSCOPE_AVAILABLE = True
-except ImportError:
-    DASHSCOPE_AVAILABLE = False
-    dashscope = None
-    Generation = None
+def _estimate_tokens(prompt, text):
+    """提供方未返回用量时，按字符数估算令牌数"""
+    return len(prompt) + len(text or '')
 
 logger = logging.getLogger(__name__)
 
+# 大模型接口熔断器（进程内共享）
+llm_breaker = CircuitBreaker.from_config('llm')
+
 class ContentGenerator:
     """内容生成器"""
     
+    # 进程内共享的线程池（首次使用时创建）：llm用于并行生成课程内容，
+    # background用于对冲模式下超出延迟预算后在后台继续完成生成
+    _executors = {}
+    _executor_lock = threading.Lock()
+    
     def __init__(self):
         """初始化内容生成器"""
         # 初始化API
         self._init_llm_api()
         
+        # 生成结果缓存（键为规范化的提示词输入指纹）
+        self.response_cache = ResponseCache.from_config()
+        
+        # 超时后仍在事件循环中执行的生成任务
+        self._background_tasks = set()
+        
+        # 正在事件循环中生成的缓存键 -> 生成任务
+        self._inflight_tasks = {}
+        
         # 学习材料库（当API不可用时的回退选项）
         self.learning_materials = {
             "python_basics": {
@@ -239,25 +262,22 @@ class ContentGenerator:
         }
     
     def _init_llm_api(self):
-        """初始化阿里云百炼API"""
+        """初始化大模型服务提供方（LLM_PROVIDER: dashscope/stub）"""
         self.api_type = None
-        self.dashscope_model = "qwen-plus"
+        self.provider = create_provider()
         
-        # 尝试初始化阿里云百炼API
-        if Config.DASHSCOPE_API_KEY and DASHSCOPE_AVAILABLE:
-            try:
-                dashscope.api_key = Config.DASHSCOPE_API_KEY
-                self.api_type = "dashscope"
-                logger.info("阿里云百炼API初始化成功")
-                return
-            except Exception as e:
-                logger.warning(f"阿里云百炼API初始化失败: {e}")
+        if self.provider.available:
+            self.api_type = self.provider.name
+            logger.info(f"大模型提供方 {self.provider.name} 初始化成功")
+            return
         
         logger.warning("未配置有效的阿里云百炼API，将使用预定义内容")
     
     def _generate_with_llm(self, prompt):
         """
-        使用阿里云百炼API生成内容
+        使用大模型生成内容
+        
+        熔断期间直接返回None，由调用方使用回退内容，不再等待接口超时。
         
         Args:
             prompt (str): 提示词
@@ -265,25 +285,178 @@ class ContentGenerator:
         Returns:
             str: 生成的内容
         """
+        if not self.api_type:
+            return None
+        if not llm_breaker.allow():
+            logger.warning("大模型接口已熔断，使用预定义内容")
+            return None
+        
+        # 先赋值，slot()抛出非LLMThrottled异常时各分支也能读取；获得名额后重新计时，排队时间不计入调用耗时
+        started = time.monotonic()
         try:
-            if self.api_type == "dashscope":
-                response = Generation.call(
-                    model=self.dashscope_model,
-                    prompt=prompt,
-                    max_tokens=1000,
-                    temperature=0.7
-                )
-                if response.status_code == 200:
-                    return response.output.text
-                else:
-                    logger.error(f"阿里云百炼API调用失败: {response}")
+            # 全局并发名额已满时排队，排队超时则使用预定义内容
+            with llm_governor.slot():
+                started = time.monotonic()
+                try:
+                    result = self.provider.generate(prompt, max_tokens=1000, temperature=0.7)
+                except LLMProviderError as e:
+                    llm_breaker.record_failure(time.monotonic() - started)
+                    logger.error(str(e))
+                    return None
+                except Exception as e:
+                    llm_breaker.record_failure(time.monotonic() - started)
+                    logger.error(f"大模型API调用出错: {e}")
                     return None
             
+            llm_breaker.record_success(time.monotonic() - started)
+            llm_governor.record_usage(result.tokens or _estimate_tokens(prompt, result.text))
+            return result.text
+        except LLMThrottled:
+            llm_breaker.cancel()
+            logger.warning("等待大模型调用名额超时，使用预定义内容")
             return None
-        except Exception as e:
-            logger.error(f"阿里云百炼API调用出错: {e}")
+    
+    def _stream_with_llm(self, prompt):
+        """
+        使用大模型流式生成内容
+        
+        熔断期间不产出任何内容；首个片段的等待时间计入熔断器的慢调用统计。
+        
+        Args:
+            prompt (str): 提示词
+            
+        Yields:
+            str: 增量生成的文本片段
+        """
+        if not self.api_type:
+            return
+        if not llm_breaker.allow():
+            logger.warning("大模型接口已熔断，使用预定义内容")
+            return
+        
+        recorded = False
+        started = time.monotonic()
+        try:
+            # 流式输出期间一直占用全局调用名额
+            with llm_governor.slot():
+                started = time.monotonic()
+                chunks = []
+                tokens = None
+                for result in self.provider.stream(prompt, max_tokens=1000, temperature=0.7):
+                    if not recorded:
+                        llm_breaker.record_success(time.monotonic() - started)
+                        recorded = True
+                    chunks.append(result.text)
+                    tokens = result.tokens or tokens
+                    yield result.text
+                llm_governor.record_usage(tokens or _estimate_tokens(prompt, ''.join(chunks)))
+        except LLMThrottled:
+            logger.warning("等待大模型调用名额超时，使用预定义内容")
+        except LLMProviderError as e:
+            logger.error(str(e))
+            if not recorded:
+                llm_breaker.record_failure(time.monotonic() - started)
+                recorded = True
+        except Exception:
+            if not recorded:
+                llm_breaker.record_failure(time.monotonic() - started)
+                recorded = True
+            raise
+        finally:
+            if not recorded:
+                llm_breaker.cancel()
+    
+    async def _agenerate_with_llm(self, prompt):
+        """
+        使用大模型生成内容（异步版本，等待模型响应时不占用线程）
+        
+        Args:
+            prompt (str): 提示词
+            
+        Returns:
+            str: 生成的内容，熔断、排队超时或调用失败时返回None
+        """
+        if not self.api_type:
+            return None
+        if not llm_breaker.allow():
+            logger.warning("大模型接口已熔断，使用预定义内容")
+            return None
+        
+        started = time.monotonic()
+        try:
+            async with llm_governor.async_slot():
+                started = time.monotonic()
+                try:
+                    result = await self.provider.agenerate(prompt, max_tokens=1000, temperature=0.7)
+                except LLMProviderError as e:
+                    llm_breaker.record_failure(time.monotonic() - started)
+                    logger.error(str(e))
+                    return None
+                except asyncio.CancelledError:
+                    llm_breaker.cancel()
+                    raise
+                except Exception as e:
+                    llm_breaker.record_failure(time.monotonic() - started)
+                    logger.error(f"大模型API调用出错: {e}")
+                    return None
+            
+            llm_breaker.record_success(time.monotonic() - started)
+            await llm_governor.arecord_usage(result.tokens or _estimate_tokens(prompt, result.text))
+            return result.text
+        except LLMThrottled:
+            llm_breaker.cancel()
+            logger.warning("等待大模型调用名额超时，使用预定义内容")
             return None
     
+    async def _astream_with_llm(self, prompt):
+        """
+        使用大模型流式生成内容（异步版本）
+        
+        Args:
+            prompt (str): 提示词
+            
+        Yields:
+            str: 增量生成的文本片段
+        """
+        if not self.api_type:
+            return
+        if not llm_breaker.allow():
+            logger.warning("大模型接口已熔断，使用预定义内容")
+            return
+        
+        recorded = False
+        started = time.monotonic()
+        try:
+            async with llm_governor.async_slot():
+                started = time.monotonic()
+                chunks = []
+                tokens = None
+                async for result in self.provider.astream(prompt, max_tokens=1000, temperature=0.7):
+                    if not recorded:
+                        llm_breaker.record_success(time.monotonic() - started)
+                        recorded = True
+                    chunks.append(result.text)
+                    tokens = result.tokens or tokens
+                    yield result.text
+                await llm_governor.arecord_usage(tokens or _estimate_tokens(prompt, ''.join(chunks)))
+        except LLMThrottled:
+            logger.warning("等待大模型调用名额超时，使用预定义内容")
+        except LLMProviderError as e:
+            logger.error(str(e))
+            if not recorded:
+                llm_breaker.record_failure(time.monotonic() - started)
+                recorded = True
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            if not recorded:
+                llm_breaker.record_failure(time.monotonic() - started)
+                recorded = True
+            raise
+        finally:
+            if not recorded:
+                llm_breaker.cancel()
+    
     def retrieve_materials(self, learning_goal, level_analysis):
         """
         检索学习材料
@@ -313,36 +486,15 @@ class ContentGenerator:
         # 如果API可用，使用大语言模型生成内容
         if self.api_type:
             try:
-                level = level_analysis.get('level', 'beginner')
-                concept = materials.get('concept', '未知概念')
-                key_points = materials.get('key_points', [])
-                
-                prompt = f"""
-                你是一个专业的编程教育专家，请根据以下信息生成个性化的学习内容：
-                
-                学习主题：{concept}
-                学习者水平：{level}
-                关键知识点：{', '.join(key_points)}
-                学习者已掌握的知识：{json.dumps(user_knowledge_graph, ensure_ascii=False)}
-                
-                请生成适合该学习者水平的详细解释内容，要求：
-                1. 如果是初学者，请用简单易懂的语言解释基础概念
-                2. 如果是中级学习者，请深入讲解核心概念并提供示例
-                3. 如果是高级学习者，请讲解高级特性和最佳实践
-                4. 内容长度适中，大约200-300字
-                5. 使用清晰的结构和适当的例子
-                """
-                
-                explanation = self._generate_with_llm(prompt)
+                prompt, cache_key = self._explanation_request(level_analysis, materials, user_knowledge_graph)
+                explanation = self._cached_generate(cache_key, lambda: self._generate_with_llm(prompt))
                 if explanation:
                     return explanation
             except Exception as e:
                 logger.error(f"使用LLM生成解释内容失败: {e}")
         
         # 回退到预定义内容
-        level = level_analysis.get('level', 'beginner')
-        content = materials.get('content', {})
-        return content.get(level, "默认解释内容")
+        return self._fallback_explanation(level_analysis, materials)
     
     def generate_exercises(self, level_analysis, materials):
         """
@@ -358,56 +510,182 @@ class ContentGenerator:
         # 如果API可用，使用大语言模型生成练习题
         if self.api_type:
             try:
-                level = level_analysis.get('level', 'beginner')
-                concept = materials.get('concept', '未知概念')
-                key_points = materials.get('key_points', [])
-                
-                prompt = f"""
-                你是一个专业的编程教育专家，请为以下学习内容生成3道练习题：
-                
-                学习主题：{concept}
-                学习者水平：{level}
-                关键知识点：{', '.join(key_points)}
+                prompt, cache_key = self._exercises_request(level_analysis, materials)
+                exercises = self._cached_generate(
+                    cache_key, lambda: self._parse_exercises(self._generate_with_llm(prompt))
+                )
+                if exercises:
+                    return exercises
+            except Exception as e:
+                logger.error(f"使用阿里云百炼API生成练习题失败: {e}")
+        
+        # 回退到预定义练习题
+        return self._fallback_exercises(level_analysis, materials)
+    
+    async def agenerate_explanation(self, level_analysis, materials, user_knowledge_graph):
+        """
+        生成解释内容（异步版本）
+        
+        Args:
+            level_analysis (dict): 用户水平分析结果
+            materials (dict): 学习材料
+            user_knowledge_graph (dict): 用户知识图谱
+            
+        Returns:
+            str: 解释内容
+        """
+        if self.api_type:
+            try:
+                prompt, cache_key = self._explanation_request(level_analysis, materials, user_knowledge_graph)
+                explanation = await self._acached_generate(cache_key, lambda: self._agenerate_with_llm(prompt))
+                if explanation:
+                    return explanation
+            except Exception as e:
+                logger.error(f"使用LLM生成解释内容失败: {e}")
+        
+        return self._fallback_explanation(level_analysis, materials)
+    
+    async def agenerate_exercises(self, level_analysis, materials):
+        """
+        生成练习题（异步版本）
+        
+        Args:
+            level_analysis (dict): 用户水平分析结果
+            materials (dict): 学习材料
+            
+        Returns:
+            list: 练习题列表
+        """
+        if self.api_type:
+            try:
+                prompt, cache_key = self._exercises_request(level_analysis, materials)
                 
-                请生成适合该学习者水平的练习题，要求：
-                1. 如果是初学者，生成选择题和简单的编程题
-                2. 如果是中级学习者，生成编程题和概念题
-                3. 如果是高级学习者，生成复杂编程题和设计题
-                4. 每道题都应该有明确的答案
-                5. 以JSON格式返回，结构如下：
-                [
-                    {{
-                        "type": "题目类型（multiple_choice/coding/conceptual）",
-                        "question": "题目内容",
-                        "options": ["选项A", "选项B", "选项C", "选项D"], （仅选择题需要）
-                        "answer": "答案"
-                    }}
-                ]
-                请只返回JSON格式的内容，不要包含其他文字。
-                """
+                async def compute():
+                    return self._parse_exercises(await self._agenerate_with_llm(prompt))
                 
-                exercises_json = self._generate_with_llm(prompt)
-                if exercises_json:
-                    try:
-                        # 清理可能的额外文本
-                        exercises_json = exercises_json.strip()
-                        if exercises_json.startswith("```json"):
-                            exercises_json = exercises_json[7:]
-                        if exercises_json.endswith("```"):
-                            exercises_json = exercises_json[:-3]
-                        exercises_json = exercises_json.strip()
-                        
-                        # 尝试解析JSON
-                        exercises = json.loads(exercises_json)
-                        if isinstance(exercises, list):
-                            return exercises[:3]  # 限制最多3道题
-                    except json.JSONDecodeError as e:
-                        logger.error(f"阿里云百炼API返回的练习题不是有效的JSON格式: {e}")
-                        logger.error(f"返回内容: {exercises_json}")
+                exercises = await self._acached_generate(cache_key, compute)
+                if exercises:
+                    return exercises
             except Exception as e:
                 logger.error(f"使用阿里云百炼API生成练习题失败: {e}")
         
-        # 回退到预定义练习题
+        return self._fallback_exercises(level_analysis, materials)
+    
+    def _explanation_request(self, level_analysis, materials, user_knowledge_graph):
+        """
+        构建解释内容的提示词和缓存键
+        
+        Args:
+            level_analysis (dict): 用户水平分析结果
+            materials (dict): 学习材料
+            user_knowledge_graph (dict): 用户知识图谱
+            
+        Returns:
+            tuple: (提示词, 缓存键)
+        """
+        level = level_analysis.get('level', 'beginner')
+        concept = materials.get('concept', '未知概念')
+        key_points = materials.get('key_points', [])
+        knowledge_bucket = self._bucket_knowledge_graph(user_knowledge_graph)
+        
+        prompt = f"""
+        你是一个专业的编程教育专家，请根据以下信息生成个性化的学习内容：
+        
+        学习主题：{concept}
+        学习者水平：{level}
+        关键知识点：{', '.join(key_points)}
+        学习者已掌握的知识：{json.dumps(knowledge_bucket, ensure_ascii=False)}
+        
+        请生成适合该学习者水平的详细解释内容，要求：
+        1. 如果是初学者，请用简单易懂的语言解释基础概念
+        2. 如果是中级学习者，请深入讲解核心概念并提供示例
+        3. 如果是高级学习者，请讲解高级特性和最佳实践
+        4. 内容长度适中，大约200-300字
+        5. 使用清晰的结构和适当的例子
+        """
+        
+        cache_key = make_fingerprint(
+            'explanation',
+            concept=concept,
+            level=level,
+            key_points=key_points,
+            knowledge=knowledge_bucket
+        )
+        return prompt, cache_key
+    
+    def _exercises_request(self, level_analysis, materials):
+        """
+        构建练习题的提示词和缓存键
+        
+        Args:
+            level_analysis (dict): 用户水平分析结果
+            materials (dict): 学习材料
+            
+        Returns:
+            tuple: (提示词, 缓存键)
+        """
+        level = level_analysis.get('level', 'beginner')
+        concept = materials.get('concept', '未知概念')
+        key_points = materials.get('key_points', [])
+        
+        prompt = f"""
+        你是一个专业的编程教育专家，请为以下学习内容生成3道练习题：
+        
+        学习主题：{concept}
+        学习者水平：{level}
+        关键知识点：{', '.join(key_points)}
+        
+        请生成适合该学习者水平的练习题，要求：
+        1. 如果是初学者，生成选择题和简单的编程题
+        2. 如果是中级学习者，生成编程题和概念题
+        3. 如果是高级学习者，生成复杂编程题和设计题
+        4. 每道题都应该有明确的答案
+        5. 以JSON格式返回，结构如下：
+        [
+            {{
+                "type": "题目类型（multiple_choice/coding/conceptual）",
+                "question": "题目内容",
+                "options": ["选项A", "选项B", "选项C", "选项D"], （仅选择题需要）
+                "answer": "答案"
+            }}
+        ]
+        请只返回JSON格式的内容，不要包含其他文字。
+        """
+        
+        cache_key = make_fingerprint(
+            'exercises',
+            concept=concept,
+            level=level,
+            key_points=key_points
+        )
+        return prompt, cache_key
+    
+    def _fallback_explanation(self, level_analysis, materials):
+        """
+        获取预定义的解释内容
+        
+        Args:
+            level_analysis (dict): 用户水平分析结果
+            materials (dict): 学习材料
+            
+        Returns:
+            str: 预定义解释内容
+        """
+        level = level_analysis.get('level', 'beginner')
+        content = materials.get('content', {})
+        return content.get(level, "默认解释内容")
+    
+    def _fallback_exercises(self, level_analysis, materials):
+        """
+        获取预定义的练习题
+        
+        Args:
+            level_analysis (dict): 用户水平分析结果
+            materials (dict): 学习材料
+            
+        Returns:
+            list: 预定义练习题列表
+        """
         level = level_analysis.get('level', 'beginner')
         exercises = materials.get('exercises', {})
         level_exercises = exercises.get(level, [])
@@ -417,6 +695,567 @@ class ContentGenerator:
             return random.sample(level_exercises, 3)
         return level_exercises
     
+    @classmethod
+    def _get_executor(cls, name='llm'):
+        """
+        获取共享线程池
+        
+        Args:
+            name (str): 线程池名称（llm/background）
+        
+        Returns:
+            ThreadPoolExecutor: 线程池
+        """
+        if name not in cls._executors:
+            with cls._executor_lock:
+                if name not in cls._executors:
+                    cls._executors[name] = ThreadPoolExecutor(
+                        max_workers=Config.LLM_POOL_WORKERS,
+                        thread_name_prefix=name
+                    )
+        return cls._executors[name]
+    
+    def _cached_generate(self, cache_key, compute):
+        """
+        获取缓存的生成结果，未命中时调用compute生成并写入缓存
+        
+        相同缓存键的并发请求共享同一次生成（见ResponseCache.get_or_compute）。
+        配置了LLM_HEDGE_BUDGET时启用对冲模式：生成超过该预算仍未完成则返回None，
+        由调用方先返回预定义内容，生成在后台继续执行并写入缓存，之后的相同请求直接命中缓存。
+        
+        Args:
+            cache_key (str): 缓存键
+            compute (callable): 生成函数，返回None时不缓存
+            
+        Returns:
+            any: 缓存或新生成的值，生成失败或超出预算时返回None
+        """
+        budget = Config.LLM_HEDGE_BUDGET
+        if not budget:
+            return self.response_cache.get_or_compute(cache_key, compute)
+        
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        future = self.response_cache.submit(cache_key, compute, self._get_executor('background'))
+        try:
+            return future.result(timeout=budget)
+        except FutureTimeoutError:
+            logger.info(f"生成超过延迟预算{budget}秒，先返回预定义内容，生成完成后写入缓存")
+            return None
+    
+    async def _acached_generate(self, cache_key, compute):
+        """
+        获取缓存的生成结果，未命中时等待compute()生成并写入缓存（异步版本）
+        
+        同一事件循环中相同缓存键的并发请求共享同一个生成任务。
+        对冲模式与_cached_generate相同：超出LLM_HEDGE_BUDGET时返回None，
+        生成任务在事件循环中继续执行并写入缓存。
+        
+        Args:
+            cache_key (str): 缓存键
+            compute (callable): 返回协程的生成函数，协程结果为None时不缓存
+            
+        Returns:
+            any: 缓存或新生成的值，生成失败或超出预算时返回None
+        """
+        cached = await self._acache_call(self.response_cache.get, cache_key)
+        if cached is not None:
+            return cached
+        
+        task = self._inflight_tasks.get(cache_key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(self._acompute_and_cache(cache_key, compute))
+            # 登记的任务引用同时避免超出预算后仍在执行的任务被回收
+            self._inflight_tasks[cache_key] = task
+            task.add_done_callback(lambda done: self._release_task(cache_key, done))
+        
+        # 等待方被取消时不取消共享的生成任务
+        budget = Config.LLM_HEDGE_BUDGET
+        if not budget:
+            return await asyncio.shield(task)
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), budget)
+        except asyncio.TimeoutError:
+            logger.info(f"生成超过延迟预算{budget}秒，先返回预定义内容，生成完成后写入缓存")
+            return None
+    
+    def _release_task(self, cache_key, task):
+        """生成任务完成后取消登记（只移除该任务自己的登记）"""
+        if self._inflight_tasks.get(cache_key) is task:
+            del self._inflight_tasks[cache_key]
+    
+    async def _acompute_and_cache(self, cache_key, compute):
+        """等待生成函数的结果并写入缓存"""
+        value = await compute()
+        if value is not None:
+            await self._acache_call(self.response_cache.set, cache_key, value)
+        return value
+    
+    async def _acache_call(self, method, *args):
+        """调用缓存方法：配置了共享缓存时在线程中执行，避免网络读写阻塞事件循环"""
+        if self.response_cache.shared is None:
+            return method(*args)
+        return await asyncio.to_thread(method, *args)
+    
+    def generate_lesson_content(self, level_analysis, materials, user_knowledge_graph, timeout=None):
+        """
+        并发生成课程解释内容和练习题
+        
+        两次大模型调用互不依赖，在线程池中并行执行，总耗时约为两者中较慢的一个。
+        任一调用失败或超时时，该部分回退到预定义内容；超时的调用会在后台继续执行并写入缓存。
+        
+        Args:
+            level_analysis (dict): 用户水平分析结果
+            materials (dict): 学习材料
+            user_knowledge_graph (dict): 用户知识图谱
+            timeout (float): 每个调用的超时时间（秒），默认使用Config.LLM_CALL_TIMEOUT
+            
+        Returns:
+            tuple: (解释内容, 练习题列表)
+        """
+        if timeout is None:
+            timeout = Config.LLM_CALL_TIMEOUT
+        
+        executor = self._get_executor()
+        # 在当前上下文的副本中执行，令牌用量记到发起请求的用户名下
+        explanation_future = executor.submit(
+            contextvars.copy_context().run,
+            self.generate_explanation, level_analysis, materials, user_knowledge_graph
+        )
+        exercises_future = executor.submit(
+            contextvars.copy_context().run, self.generate_exercises, level_analysis, materials
+        )
+        
+        # 两个调用同时开始，因此共享同一个截止时间
+        deadline = time.monotonic() + timeout
+        explanation = self._wait_for(
+            explanation_future, deadline, lambda: self._fallback_explanation(level_analysis, materials), '解释内容'
+        )
+        exercises = self._wait_for(
+            exercises_future, deadline, lambda: self._fallback_exercises(level_analysis, materials), '练习题'
+        )
+        return explanation, exercises
+    
+    def _wait_for(self, future, deadline, fallback, label):
+        """
+        在截止时间前等待生成结果，失败或超时时返回回退内容
+        
+        Args:
+            future (Future): 生成任务
+            deadline (float): 截止时间（time.monotonic）
+            fallback (callable): 回退内容生成函数
+            label (str): 日志中的内容名称
+            
+        Returns:
+            any: 生成结果或回退内容
+        """
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            logger.warning(f"生成{label}超时，使用预定义内容")
+        except Exception as e:
+            logger.error(f"生成{label}失败，使用预定义内容: {e}")
+        return fallback()
+    
+    async def agenerate_lesson_content(self, level_analysis, materials, user_knowledge_graph, timeout=None):
+        """
+        并发生成课程解释内容和练习题（异步版本）
+        
+        两次调用在事件循环中并发执行，任一调用失败或超时时，该部分回退到预定义内容；
+        超时的调用会继续执行并写入缓存。
+        
+        Args:
+            level_analysis (dict): 用户水平分析结果
+            materials (dict): 学习材料
+            user_knowledge_graph (dict): 用户知识图谱
+            timeout (float): 超时时间（秒），默认使用Config.LLM_CALL_TIMEOUT
+            
+        Returns:
+            tuple: (解释内容, 练习题列表)
+        """
+        if timeout is None:
+            timeout = Config.LLM_CALL_TIMEOUT
+        
+        explanation_task = asyncio.ensure_future(
+            self.agenerate_explanation(level_analysis, materials, user_knowledge_graph)
+        )
+        exercises_task = asyncio.ensure_future(self.agenerate_exercises(level_analysis, materials))
+        await asyncio.wait([explanation_task, exercises_task], timeout=timeout)
+        
+        explanation = self._task_result(
+            explanation_task, lambda: self._fallback_explanation(level_analysis, materials), '解释内容'
+        )
+        exercises = self._task_result(
+            exercises_task, lambda: self._fallback_exercises(level_analysis, materials), '练习题'
+        )
+        return explanation, exercises
+    
+    def _task_result(self, task, fallback, label):
+        """
+        获取已等待的生成任务的结果，超时或失败时返回回退内容；
+        超时的任务在事件循环中继续执行并写入缓存
+        
+        Args:
+            task (asyncio.Task): 生成任务
+            fallback (callable): 回退内容生成函数
+            label (str): 日志中的内容名称
+            
+        Returns:
+            any: 生成结果或回退内容
+        """
+        if not task.done():
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+            logger.warning(f"生成{label}超时，使用预定义内容")
+        elif task.exception() is not None:
+            logger.error(f"生成{label}失败，使用预定义内容: {task.exception()}")
+        else:
+            return task.result()
+        return fallback()
+    
+    def generate_subtopic_contents(self, level_analysis, materials, subtopics, user_knowledge_graph):
+        """
+        在一次大模型请求中为多个子主题生成解释内容和练习题
+        
+        Args:
+            level_analysis (dict): 用户水平分析结果
+            materials (dict): 学习材料
+            subtopics (list): 子主题列表
+            user_knowledge_graph (dict): 用户知识图谱
+            
+        Returns:
+            dict: {子主题: {"explanation": str, "exercises": list}}，
+                  模型未返回的子主题使用预定义内容
+        """
+        # 去重并保持顺序
+        subtopics = list(dict.fromkeys(subtopics))
+        contents = {}
+        
+        if self.api_type and subtopics:
+            try:
+                prompt, cache_key = self._subtopics_request(level_analysis, materials, subtopics, user_knowledge_graph)
+                contents = self._cached_generate(
+                    cache_key, lambda: self._parse_subtopic_contents(self._generate_with_llm(prompt), subtopics)
+                ) or {}
+            except Exception as e:
+                logger.error(f"使用LLM批量生成子主题内容失败: {e}")
+        
+        return self._merge_subtopic_contents(level_analysis, materials, subtopics, contents)
+    
+    async def agenerate_subtopic_contents(self, level_analysis, materials, subtopics, user_knowledge_graph):
+        """
+        在一次大模型请求中为多个子主题生成解释内容和练习题（异步版本）
+        
+        Args:
+            level_analysis (dict): 用户水平分析结果
+            materials (dict): 学习材料
+            subtopics (list): 子主题列表
+            user_knowledge_graph (dict): 用户知识图谱
+            
+        Returns:
+            dict: {子主题: {"explanation": str, "exercises": list}}
+        """
+        subtopics = list(dict.fromkeys(subtopics))
+        contents = {}
+        
+        if self.api_type and subtopics:
+            try:
+                prompt, cache_key = self._subtopics_request(level_analysis, materials, subtopics, user_knowledge_graph)
+                
+                async def compute():
+                    return self._parse_subtopic_contents(await self._agenerate_with_llm(prompt), subtopics)
+                
+                contents = await self._acached_generate(cache_key, compute) or {}
+            except Exception as e:
+                logger.error(f"使用LLM批量生成子主题内容失败: {e}")
+        
+        return self._merge_subtopic_contents(level_analysis, materials, subtopics, contents)
+    
+    def stream_subtopic_contents(self, level_analysis, materials, subtopics, user_knowledge_graph):
+        """
+        在一次大模型流式请求中为多个子主题生成内容，每个子主题生成完成后立即产出
+        
+        模型逐行输出各子主题（JSON Lines），每解析出一行就产出该子主题；缓存命中时直接产出全部内容，
+        模型未返回的子主题最后使用预定义内容。生成结果与generate_subtopic_contents共用同一个缓存键。
+        
+        Args:
+            level_analysis (dict): 用户水平分析结果
+            materials (dict): 学习材料
+            subtopics (list): 子主题列表
+            user_knowledge_graph (dict): 用户知识图谱
+            
+        Yields:
+            tuple: (子主题, {"explanation": str, "exercises": list})，按生成完成的顺序
+        """
+        subtopics = list(dict.fromkeys(subtopics))
+        contents = {}
+        streamed = set()
+        
+        if self.api_type and subtopics:
+            try:
+                prompt, cache_key = self._subtopics_request(level_analysis, materials, subtopics, user_knowledge_graph)
+                cached = self.response_cache.get(cache_key)
+                if cached is not None:
+                    contents = cached
+                else:
+                    buffer = ''
+                    for chunk in self._stream_with_llm(prompt):
+                        *lines, buffer = (buffer + chunk).split('\n')
+                        for subtopic in self._parse_subtopic_lines(lines, subtopics, contents):
+                            streamed.add(subtopic)
+                            yield subtopic, self._merge_subtopic_content(level_analysis, materials, contents[subtopic])
+                    for subtopic in self._parse_subtopic_lines([buffer], subtopics, contents):
+                        streamed.add(subtopic)
+                        yield subtopic, self._merge_subtopic_content(level_analysis, materials, contents[subtopic])
+                    if contents:
+                        self.response_cache.set(cache_key, contents)
+            except Exception as e:
+                logger.error(f"使用LLM流式生成子主题内容失败: {e}")
+        
+        for subtopic in subtopics:
+            if subtopic not in streamed:
+                yield subtopic, self._merge_subtopic_content(level_analysis, materials, contents.get(subtopic))
+    
+    async def astream_subtopic_contents(self, level_analysis, materials, subtopics, user_knowledge_graph):
+        """
+        在一次大模型流式请求中为多个子主题生成内容，每个子主题生成完成后立即产出（异步版本）
+        
+        Args:
+            level_analysis (dict): 用户水平分析结果
+            materials (dict): 学习材料
+            subtopics (list): 子主题列表
+            user_knowledge_graph (dict): 用户知识图谱
+            
+        Yields:
+            tuple: (子主题, {"explanation": str, "exercises": list})，按生成完成的顺序
+        """
+        subtopics = list(dict.fromkeys(subtopics))
+        contents = {}
+        streamed = set()
+        
+        if self.api_type and subtopics:
+            try:
+                prompt, cache_key = self._subtopics_request(level_analysis, materials, subtopics, user_knowledge_graph)
+                cached = await self._acache_call(self.response_cache.get, cache_key)
+                if cached is not None:
+                    contents = cached
+                else:
+                    buffer = ''
+                    async for chunk in self._astream_with_llm(prompt):
+                        *lines, buffer = (buffer + chunk).split('\n')
+                        for subtopic in self._parse_subtopic_lines(lines, subtopics, contents):
+                            streamed.add(subtopic)
+                            yield subtopic, self._merge_subtopic_content(level_analysis, materials, contents[subtopic])
+                    for subtopic in self._parse_subtopic_lines([buffer], subtopics, contents):
+                        streamed.add(subtopic)
+                        yield subtopic, self._merge_subtopic_content(level_analysis, materials, contents[subtopic])
+                    if contents:
+                        await self._acache_call(self.response_cache.set, cache_key, contents)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"使用LLM流式生成子主题内容失败: {e}")
+        
+        for subtopic in subtopics:
+            if subtopic not in streamed:
+                yield subtopic, self._merge_subtopic_content(level_analysis, materials, contents.get(subtopic))
+    
+    def _subtopics_request(self, level_analysis, materials, subtopics, user_knowledge_graph):
+        """
+        构建批量生成子主题内容的提示词和缓存键
+        
+        Args:
+            level_analysis (dict): 用户水平分析结果
+            materials (dict): 学习材料
+            subtopics (list): 去重后的子主题列表
+            user_knowledge_graph (dict): 用户知识图谱
+            
+        Returns:
+            tuple: (提示词, 缓存键)
+        """
+        level = level_analysis.get('level', 'beginner')
+        concept = materials.get('concept', '未知概念')
+        knowledge_bucket = self._bucket_knowledge_graph(user_knowledge_graph)
+        
+        prompt = f"""
+        你是一个专业的编程教育专家，请为以下学习路径中的每个子主题生成学习内容：
+        
+        学习主题：{concept}
+        学习者水平：{level}
+        子主题：{', '.join(subtopics)}
+        学习者已掌握的知识：{json.dumps(knowledge_bucket, ensure_ascii=False)}
+        
+        要求：
+        1. 每个子主题生成100-200字的解释内容，难度适合该学习者水平
+        2. 每个子主题生成2道练习题，每道题都应该有明确的答案
+        3. 按子主题顺序逐个输出，每个子主题单独占一行JSON（JSON Lines格式，不要换行缩进，不要用数组包裹），每行结构如下：
+        {{"subtopic": "子主题名称", "explanation": "解释内容", "exercises": [{{"type": "题目类型（multiple_choice/coding/conceptual）", "question": "题目内容", "options": ["选项A", "选项B", "选项C", "选项D"], "answer": "答案"}}]}}
+        其中options仅选择题需要。
+        请只返回JSON Lines内容，不要包含其他文字。
+        """
+        
+        cache_key = make_fingerprint(
+            'subtopics',
+            concept=concept,
+            level=level,
+            subtopics=subtopics,
+            knowledge=knowledge_bucket
+        )
+        return prompt, cache_key
+    
+    def _merge_subtopic_contents(self, level_analysis, materials, subtopics, contents):
+        """
+        合并模型生成的子主题内容，缺失的子主题回退到预定义内容
+        
+        Args:
+            level_analysis (dict): 用户水平分析结果
+            materials (dict): 学习材料
+            subtopics (list): 子主题列表
+            contents (dict): 模型生成的内容
+            
+        Returns:
+            dict: {子主题: {"explanation": str, "exercises": list}}
+        """
+        return {
+            subtopic: self._merge_subtopic_content(level_analysis, materials, contents.get(subtopic))
+            for subtopic in subtopics
+        }
+    
+    def _merge_subtopic_content(self, level_analysis, materials, item):
+        """
+        补全单个子主题的内容，缺失的解释或练习题回退到预定义内容
+        
+        Args:
+            level_analysis (dict): 用户水平分析结果
+            materials (dict): 学习材料
+            item (dict): 模型生成的子主题内容，可以为None
+            
+        Returns:
+            dict: {"explanation": str, "exercises": list}
+        """
+        item = item or {}
+        return {
+            "explanation": item.get("explanation") or self._fallback_explanation(level_analysis, materials),
+            "exercises": item.get("exercises") or self._fallback_exercises(level_analysis, materials)
+        }
+    
+    def _parse_subtopic_contents(self, contents_json, subtopics):
+        """
+        解析批量生成的子主题内容（JSON Lines）
+        
+        Args:
+            contents_json (str): 模型返回的文本
+            subtopics (list): 请求的子主题列表
+            
+        Returns:
+            dict: 子主题内容，解析失败返回None
+        """
+        contents = {}
+        if contents_json:
+            self._parse_subtopic_lines(contents_json.splitlines(), subtopics, contents)
+        return contents or None
+    
+    def _parse_subtopic_lines(self, lines, subtopics, contents):
+        """
+        解析模型输出的若干行子主题内容，写入contents
+        
+        空行、代码块标记和无法解析的行被忽略；已解析过的子主题不会被后面的重复行覆盖。
+        
+        Args:
+            lines (list): 完整的输出行
+            subtopics (list): 请求的子主题列表
+            contents (dict): 已解析的子主题内容，新解析的内容写入其中
+            
+        Returns:
+            list: 本次新解析出的子主题
+        """
+        parsed = []
+        for line in lines:
+            line = line.strip().rstrip(',')
+            if not line.startswith('{'):
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.warning(f"子主题内容不是有效的JSON行: {e}")
+                continue
+            subtopic = item.get("subtopic") if isinstance(item, dict) else None
+            if not isinstance(subtopic, str) or subtopic not in subtopics or subtopic in contents:
+                continue
+            exercises = item.get("exercises")
+            contents[subtopic] = {
+                "explanation": item.get("explanation") if isinstance(item.get("explanation"), str) else None,
+                "exercises": exercises[:3] if isinstance(exercises, list) else None
+            }
+            parsed.append(subtopic)
+        return parsed
+    
+    def _parse_json_response(self, response_text):
+        """
+        解析大语言模型返回的JSON文本（去除代码块标记）
+        
+        Args:
+            response_text (str): 模型返回的文本
+            
+        Returns:
+            any: 解析后的对象，解析失败返回None
+        """
+        if not response_text:
+            return None
+        try:
+            # 清理可能的额外文本
+            response_text = response_text.strip()
+            if response_text.startswith("```json"):
+                response_text = response_text[7:]
+            if response_text.endswith("```"):
+                response_text = response_text[:-3]
+            return json.loads(response_text.strip())
+        except json.JSONDecodeError as e:
+            logger.error(f"阿里云百炼API返回的内容不是有效的JSON格式: {e}")
+            logger.error(f"返回内容: {response_text}")
+            return None
+    
+    def _parse_exercises(self, exercises_json):
+        """
+        解析大语言模型返回的练习题JSON
+        
+        Args:
+            exercises_json (str): 模型返回的文本
+            
+        Returns:
+            list: 练习题列表（最多3道），解析失败返回None
+        """
+        exercises = self._parse_json_response(exercises_json)
+        if isinstance(exercises, list):
+            return exercises[:3]  # 限制最多3道题
+        return None
+    
+    def _bucket_knowledge_graph(self, knowledge_graph):
+        """
+        将知识图谱粗粒度化，用于提示词和缓存键
+        
+        只保留知识点掌握度（0~1之间的数值），按0.25分档；level、时间戳和统计数据等
+        其他字段（与可视化使用相同的排除字段）不参与，使掌握情况相近的学习者可以共享同一份生成结果。
+        
+        Args:
+            knowledge_graph (dict): 用户知识图谱
+            
+        Returns:
+            dict: 粗粒度知识图谱（知识点 -> 分档后的掌握度）
+        """
+        if not isinstance(knowledge_graph, dict):
+            return {}
+        
+        bucket = {}
+        for topic, value in knowledge_graph.items():
+            if topic in NON_TOPIC_FIELDS or isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            if 0 <= value <= 1:
+                bucket[topic] = round(value * 4) / 4
+        return bucket
+    
     def generate_interactive_response(self, message, context, topic, knowledge_graph):
         """
         生成交互式对话响应
@@ -433,14 +1272,118 @@ class ContentGenerator:
         # 如果API可用，使用大语言模型生成响应
         if self.api_type:
             try:
-                # 构建提示词
-                prompt = f"""
+                prompt = self._build_interactive_prompt(message, context, topic, knowledge_graph)
+                response = self._generate_with_llm(prompt)
+                if response:
+                    return response.strip()
+            except Exception as e:
+                logger.error(f"使用LLM生成交互式响应失败: {e}")
+        
+        # 回退到预定义响应
+        return self._generate_fallback_response(message, topic)
+    
+    def stream_interactive_response(self, message, context, topic, knowledge_graph):
+        """
+        以流式方式生成交互式对话响应
+        
+        模型每输出一段增量文本就立即产出，用于降低首字延迟。
+        在产出任何内容之前失败时，回退到预定义响应。
+        
+        Args:
+            message (str): 用户消息
+            context (dict): 对话上下文
+            topic (str): 学习主题
+            knowledge_graph (dict): 用户知识图谱
+            
+        Yields:
+            str: 响应文本片段
+        """
+        produced = False
+        if self.api_type:
+            try:
+                prompt = self._build_interactive_prompt(message, context, topic, knowledge_graph)
+                for chunk in self._stream_with_llm(prompt):
+                    if chunk:
+                        produced = True
+                        yield chunk
+            except Exception as e:
+                logger.error(f"使用LLM流式生成交互式响应失败: {e}")
+        
+        if not produced:
+            # 回退到预定义响应
+            yield self._generate_fallback_response(message, topic)
+    
+    async def agenerate_interactive_response(self, message, context, topic, knowledge_graph):
+        """
+        生成交互式对话响应（异步版本）
+        
+        Args:
+            message (str): 用户消息
+            context (dict): 对话上下文
+            topic (str): 学习主题
+            knowledge_graph (dict): 用户知识图谱
+            
+        Returns:
+            str: 生成的响应
+        """
+        if self.api_type:
+            try:
+                prompt = self._build_interactive_prompt(message, context, topic, knowledge_graph)
+                response = await self._agenerate_with_llm(prompt)
+                if response:
+                    return response.strip()
+            except Exception as e:
+                logger.error(f"使用LLM生成交互式响应失败: {e}")
+        
+        return self._generate_fallback_response(message, topic)
+    
+    async def astream_interactive_response(self, message, context, topic, knowledge_graph):
+        """
+        以流式方式生成交互式对话响应（异步版本）
+        
+        Args:
+            message (str): 用户消息
+            context (dict): 对话上下文
+            topic (str): 学习主题
+            knowledge_graph (dict): 用户知识图谱
+            
+        Yields:
+            str: 响应文本片段
+        """
+        produced = False
+        if self.api_type:
+            try:
+                prompt = self._build_interactive_prompt(message, context, topic, knowledge_graph)
+                async for chunk in self._astream_with_llm(prompt):
+                    if chunk:
+                        produced = True
+                        yield chunk
+            except Exception as e:
+                logger.error(f"使用LLM流式生成交互式响应失败: {e}")
+        
+        if not produced:
+            yield self._generate_fallback_response(message, topic)
+    
+    def _build_interactive_prompt(self, message, context, topic, knowledge_graph):
+        """
+        构建交互式对话提示词
+        
+        Args:
+            message (str): 用户消息
+            context (dict): 对话上下文
+            topic (str): 学习主题
+            knowledge_graph (dict): 用户知识图谱
+            
+        Returns:
+            str: 提示词
+        """
+        return f"""
                 你是一个专业的编程教育AI助手，正在与学习者进行交互式对话。请根据以下信息生成合适的响应：
                 
                 学习者消息：{message}
                 学习主题：{topic}
                 对话上下文：{json.dumps(context, ensure_ascii=False)}
-                学习者知识图谱：{json.dumps(knowledge_graph, ensure_ascii=False)}
+                学习者知识图谱：{json.dumps(knowledge_graph, ensure_ascii=False, default=str)}
                 
                 请以教育性、友好和专业的语气回复学习者，要求：
                 1. 准确理解学习者的问题或需求
@@ -452,15 +1395,6 @@ class ContentGenerator:
                 7. 如果学习者表达了困惑，请耐心解释并提供额外示例
                 8. 鼓励学习者继续学习和探索
                 """
-                
-                response = self._generate_with_llm(prompt)
-                if response:
-                    return response.strip()
-            except Exception as e:
-                logger.error(f"使用LLM生成交互式响应失败: {e}")
-        
-        # 回退到预定义响应
-        return self._generate_fallback_response(message, topic)
     
     def _generate_fallback_response(self, message, topic):
         """
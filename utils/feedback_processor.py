@@ -3,11 +3,16 @@
 用于即时评估学习效果并调整学习路径
 """
 
+import logging
 import random
 from datetime import datetime
 from utils.knowledge_analyzer import KnowledgeAnalyzer
 from database import db
 from bson import ObjectId
+from progress_tracker import ProgressTracker
+from utils.user_loader import invalidate_user
+
+logger = logging.getLogger(__name__)
 
 class FeedbackProcessor:
     """实时反馈处理器"""
@@ -136,36 +141,58 @@ class FeedbackProcessor:
         """
         更新用户知识图谱
         
+        在MongoDB服务端用聚合管道完成指数平滑（0.7 * 旧值 + 0.3 * 新值），
+        只修改涉及的 knowledge_graph.<topic> 字段。单次原子写入，并发提交不会互相覆盖。
+        同一次写入中刷新用户的最近活跃时间 last_active_at。
+        
         Args:
             user_id (str): 用户ID
             topic_mastery (dict): 知识点掌握情况
         """
         try:
-            # 获取当前知识图谱
-            user = db.find_one('users', {'_id': ObjectId(user_id)})
-            if not user:
+            updates = self._build_mastery_updates(topic_mastery)
+            if not updates:
                 return
+            updates['last_active_at'] = {'$max': ['$last_active_at', {'$literal': datetime.utcnow()}]}
             
-            knowledge_graph = user.get('knowledge_graph', {})
-            
-            # 更新知识点掌握情况
-            for topic, mastery in topic_mastery.items():
-                if topic != "confidence":
-                    # 使用指数平滑更新掌握程度
-                    current_mastery = knowledge_graph.get(topic, 0)
-                    updated_mastery = 0.7 * current_mastery + 0.3 * mastery
-                    knowledge_graph[topic] = round(updated_mastery, 2)
-            
-            # 更新知识图谱
-            db.update_one(
+            db.update_one_pipeline(
                 'users',
                 {'_id': ObjectId(user_id)},
-                {'knowledge_graph': knowledge_graph}
+                [{'$set': updates}]
             )
+            invalidate_user(user_id)
             
         except Exception as e:
             print(f"更新知识图谱时出错: {e}")
     
+    def _build_mastery_updates(self, topic_mastery):
+        """
+        构建知识点掌握程度的服务端更新表达式
+        
+        Args:
+            topic_mastery (dict): 知识点掌握情况
+            
+        Returns:
+            dict: {'knowledge_graph.<topic>': 聚合表达式}
+        """
+        updates = {}
+        for topic, mastery in topic_mastery.items():
+            if topic == "confidence":
+                continue
+            # 主题名来自客户端，含 . 或以 $ 开头时无法作为字段路径
+            if not isinstance(topic, str) or not topic or '.' in topic or topic.startswith('$'):
+                logger.warning(f"忽略无效的知识点名称: {topic}")
+                continue
+            
+            field = f"knowledge_graph.{topic}"
+            current = {'$cond': [{'$isNumber': f"${field}"}, f"${field}", 0]}
+            smoothed = {'$add': [{'$multiply': [0.7, current]}, 0.3 * mastery]}
+            # 保留两位小数（四舍五入）
+            updates[field] = {
+                '$divide': [{'$floor': {'$add': [{'$multiply': [smoothed, 100]}, 0.5]}}, 100]
+            }
+        return updates
+    
     def _generate_feedback_suggestion(self, score, topic_mastery):
         """
         生成反馈建议
@@ -254,15 +281,16 @@ class FeedbackProcessor:
         Returns:
             dict: 会话反馈处理结果
         """
-        # 计算会话整体表现
+        # 每道题只评分一次
         exercises = session_data.get('exercises', [])
-        total_score = sum(self._calculate_exercise_score(ex) for ex in exercises)
-        average_score = total_score / len(exercises) if exercises else 0
+        scores = [self._calculate_exercise_score(ex) for ex in exercises]
+        
+        # 计算会话整体表现
+        average_score = sum(scores) / len(scores) if scores else 0
         
         # 分析会话中的知识点掌握情况
         session_mastery = {}
-        for exercise in exercises:
-            exercise_score = self._calculate_exercise_score(exercise)
+        for exercise, exercise_score in zip(exercises, scores):
             topic_mastery = self._analyze_topic_mastery(exercise, exercise_score)
             for topic, mastery in topic_mastery.items():
                 if topic != "confidence":
@@ -276,8 +304,12 @@ class FeedbackProcessor:
         for topic, mastery_list in session_mastery.items():
             avg_mastery[topic] = sum(mastery_list) / len(mastery_list)
         
-        # 更新知识图谱
+        # 合并后的掌握程度一次写入知识图谱，练习记录一次批量写入学习历史
         self._update_knowledge_graph(user_id, avg_mastery)
+        ProgressTracker.add_learning_events(user_id, [
+            self._build_exercise_event(exercise, exercise_score, session_data.get('session_id'))
+            for exercise, exercise_score in zip(exercises, scores)
+        ])
         
         # 生成会话反馈
         session_feedback = self._generate_session_feedback(average_score, avg_mastery, session_data)
@@ -286,11 +318,38 @@ class FeedbackProcessor:
             "user_id": user_id,
             "session_id": session_data.get('session_id'),
             "average_score": average_score,
+            "exercise_scores": [
+                {"exercise_id": exercise.get('exercise_id'), "score": exercise_score}
+                for exercise, exercise_score in zip(exercises, scores)
+            ],
             "topic_mastery": avg_mastery,
             "feedback": session_feedback,
             "processed_at": datetime.utcnow()
         }
     
+    def _build_exercise_event(self, exercise_data, score, session_id=None):
+        """
+        构建练习的学习历史记录
+        
+        Args:
+            exercise_data (dict): 练习数据
+            score (float): 练习得分
+            session_id (str): 学习会话ID
+            
+        Returns:
+            dict: 学习历史记录
+        """
+        return {
+            "type": "exercise",
+            "topic": exercise_data.get('topic', 'general'),
+            "exercise_id": exercise_data.get('exercise_id'),
+            "exercise_type": exercise_data.get('type'),
+            "score": round(score, 2),
+            "correct": score >= 0.6,
+            "time_spent": exercise_data.get('time_spent', 0),
+            "session_id": session_id
+        }
+    
     def _generate_session_feedback(self, average_score, topic_mastery, session_data):
         """
         生成会话反馈
@@ -0,0 +1,365 @@
+"""
+分片任务跟踪模块
+将用户 _id 空间切分为连续区间，记录每次运行及各分片的完成情况，
+使定时任务可以并行执行，并在工作进程崩溃后从未完成的分片继续。
+领取分片时记录租约，租约有效期内其他工作进程不会重复处理同一区间；
+分片多次失败或运行时间过长时放弃该运行，下次触发时重新规划
+"""
+
+from config import Config
+from database import db
+from bson import ObjectId
+from pymongo import ReturnDocument
+import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+JOB_RUNS_COLLECTION = 'job_runs'
+JOB_CHUNKS_COLLECTION = 'job_chunks'
+
+# 运行状态
+RUN_RUNNING = 'running'
+RUN_COMPLETED = 'completed'
+RUN_FAILED = 'failed'
+
+# 分片状态
+CHUNK_PENDING = 'pending'
+CHUNK_RUNNING = 'running'
+CHUNK_DONE = 'done'
+CHUNK_FAILED = 'failed'
+
+class JobTracker:
+    """分片任务跟踪类"""
+
+    @staticmethod
+    def plan_id_ranges(collection_name, chunk_size):
+        """
+        按 _id 顺序将集合切分为若干区间
+
+        只遍历 _id 索引，每 chunk_size 个文档取一个边界。第一个区间没有下界、
+        最后一个区间没有上界，因此规划之后新增的文档也会被最后一个分片处理。
+
+        Args:
+            collection_name (str): 集合名称
+            chunk_size (int): 每个分片的文档数
+
+        Returns:
+            list: [(下界, 上界), ...]，边界为ObjectId或None（不限）
+        """
+        boundaries = []
+        cursor = db.find_iter(collection_name, {}, projection={'_id': 1}, sort=[('_id', 1)], batch_size=chunk_size)
+        for position, doc in enumerate(cursor):
+            if position and position % chunk_size == 0:
+                boundaries.append(doc['_id'])
+
+        lowers = [None] + boundaries
+        uppers = boundaries + [None]
+        return list(zip(lowers, uppers))
+
+    @staticmethod
+    def range_query(lower, upper):
+        """
+        构造 _id 区间查询条件 [lower, upper)
+
+        Args:
+            lower (ObjectId): 下界（包含），None表示不限
+            upper (ObjectId): 上界（不包含），None表示不限
+
+        Returns:
+            dict: 查询条件
+        """
+        condition = {}
+        if lower is not None:
+            condition['$gte'] = lower
+        if upper is not None:
+            condition['$lt'] = upper
+        return {'_id': condition} if condition else {}
+
+    @staticmethod
+    def start_run(job, chunk_size, collection_name='users'):
+        """
+        开始一次运行；若该任务有未完成的运行则继续该运行
+
+        只有租约已过期（一段时间内没有分片被领取或完成）的运行才会继续，
+        仍在处理中的运行不重新分发分片；运行已无法完成（有分片领取次数用尽）
+        或超过最长运行时间时标记为失败，并重新规划一次完整的运行。
+
+        Args:
+            job (str): 任务名称
+            chunk_size (int): 每个分片的文档数
+            collection_name (str): 被切分的集合
+
+        Returns:
+            tuple: (运行ID, 待处理的分片序号列表, 是否为继续运行)
+        """
+        runs = db.get_collection(JOB_RUNS_COLLECTION)
+        now = datetime.datetime.utcnow()
+        run = runs.find_one({'job': job, 'status': RUN_RUNNING}, sort=[('started_at', -1)])
+        if run:
+            reason = JobTracker._abandon_reason(run, now)
+            if reason:
+                JobTracker._fail_run(run['_id'], reason, now)
+            elif run['updated_at'] > now - datetime.timedelta(seconds=Config.JOB_CHUNK_LEASE_SECONDS):
+                logger.info(f"运行 {run['_id']}（{job}）仍在处理中，本次不重复分发")
+                return str(run['_id']), [], True
+            else:
+                pending = JobTracker.claimable_chunks(run['_id'], now)
+                runs.update_one({'_id': run['_id']}, {'$set': {'updated_at': now}})
+                logger.info(f"继续未完成的运行 {run['_id']}（{job}），剩余 {len(pending)}/{run['total_chunks']} 个分片")
+                return str(run['_id']), pending, True
+
+        ranges = JobTracker.plan_id_ranges(collection_name, chunk_size)
+        run_id = runs.insert_one({
+            'job': job,
+            'status': RUN_RUNNING,
+            'chunk_size': chunk_size,
+            'total_chunks': len(ranges),
+            'completed_chunks': 0,
+            'totals': {},
+            'started_at': now,
+            'updated_at': now
+        }).inserted_id
+
+        db.insert_many(JOB_CHUNKS_COLLECTION, [
+            {
+                'run_id': run_id,
+                'index': index,
+                'lower': lower,
+                'upper': upper,
+                'status': CHUNK_PENDING,
+                'attempts': 0
+            }
+            for index, (lower, upper) in enumerate(ranges)
+        ])
+        logger.info(f"开始运行 {run_id}（{job}），共 {len(ranges)} 个分片")
+        return str(run_id), list(range(len(ranges))), False
+
+    @staticmethod
+    def _abandon_reason(run, now):
+        """
+        判断运行是否应当放弃
+
+        Args:
+            run (dict): 运行文档
+            now (datetime): 当前时间
+
+        Returns:
+            str: 放弃原因，无需放弃返回None
+        """
+        if run['started_at'] < now - datetime.timedelta(hours=Config.JOB_RUN_MAX_AGE_HOURS):
+            return f"运行超过{Config.JOB_RUN_MAX_AGE_HOURS}小时仍未完成"
+        exhausted = db.get_collection(JOB_CHUNKS_COLLECTION).count_documents({
+            'run_id': run['_id'],
+            'status': {'$ne': CHUNK_DONE},
+            'attempts': {'$gte': Config.JOB_CHUNK_MAX_ATTEMPTS}
+        }, limit=1)
+        if exhausted:
+            return f"有分片已领取{Config.JOB_CHUNK_MAX_ATTEMPTS}次仍未完成"
+        return None
+
+    @staticmethod
+    def _fail_run(run_id, reason, now):
+        """将运行标记为失败"""
+        db.get_collection(JOB_RUNS_COLLECTION).update_one(
+            {'_id': run_id, 'status': RUN_RUNNING},
+            {'$set': {'status': RUN_FAILED, 'error': reason, 'finished_at': now, 'updated_at': now}}
+        )
+        logger.warning(f"放弃运行 {run_id}：{reason}，重新规划")
+
+    @staticmethod
+    def pending_chunks(run_id):
+        """
+        获取运行中尚未完成的分片序号
+
+        Args:
+            run_id (str): 运行ID
+
+        Returns:
+            list: 分片序号列表
+        """
+        chunks = db.find_many(
+            JOB_CHUNKS_COLLECTION,
+            {'run_id': ObjectId(run_id), 'status': {'$ne': CHUNK_DONE}},
+            sort=[('index', 1)],
+            projection={'index': 1}
+        )
+        return [chunk['index'] for chunk in chunks]
+
+    @staticmethod
+    def _claimable_query(run_id, now, owner=None):
+        """
+        可领取分片的查询条件：未完成、领取次数未用尽，且没有有效租约或租约属于owner
+
+        Celery重新投递acks_late任务（例如工作进程崩溃后）时任务ID不变，
+        同一owner可以重新领取自己仍在有效期内的租约，不必等到租约过期。
+        """
+        unleased = [
+            {'status': {'$ne': CHUNK_RUNNING}},
+            {'lease_expires_at': {'$lte': now}}
+        ]
+        if owner is not None:
+            unleased.append({'owner': owner})
+        return {
+            'run_id': ObjectId(run_id),
+            'status': {'$ne': CHUNK_DONE},
+            'attempts': {'$lt': Config.JOB_CHUNK_MAX_ATTEMPTS},
+            '$or': unleased
+        }
+
+    @staticmethod
+    def claimable_chunks(run_id, now=None):
+        """
+        获取运行中可以重新分发的分片序号（租约有效的分片仍由原工作进程处理）
+
+        Args:
+            run_id (str): 运行ID
+            now (datetime): 当前时间，默认为现在
+
+        Returns:
+            list: 分片序号列表
+        """
+        chunks = db.find_many(
+            JOB_CHUNKS_COLLECTION,
+            JobTracker._claimable_query(run_id, now or datetime.datetime.utcnow()),
+            sort=[('index', 1)],
+            projection={'index': 1}
+        )
+        return [chunk['index'] for chunk in chunks]
+
+    @staticmethod
+    def claim_chunk(run_id, index, owner=None):
+        """
+        领取分片并记录租约，返回其区间
+
+        分片已完成、领取次数已用尽或其他领取者的租约仍有效时返回None；
+        同一领取者（重新投递的同一任务）可以重新领取。
+
+        Args:
+            run_id (str): 运行ID
+            index (int): 分片序号
+            owner (str): 领取者标识（例如Celery任务ID）
+
+        Returns:
+            dict: 分片文档（含lower、upper），无法领取返回None
+        """
+        now = datetime.datetime.utcnow()
+        query = JobTracker._claimable_query(run_id, now, owner)
+        query['index'] = index
+        chunk = db.get_collection(JOB_CHUNKS_COLLECTION).find_one_and_update(
+            query,
+            {
+                '$inc': {'attempts': 1},
+                '$set': {
+                    'status': CHUNK_RUNNING,
+                    'owner': owner,
+                    'started_at': now,
+                    'lease_expires_at': now + datetime.timedelta(seconds=Config.JOB_CHUNK_LEASE_SECONDS)
+                }
+            },
+            return_document=ReturnDocument.AFTER
+        )
+        if chunk:
+            # 运行的租约随分片领取延长
+            db.get_collection(JOB_RUNS_COLLECTION).update_one(
+                {'_id': ObjectId(run_id)}, {'$set': {'updated_at': now}}
+            )
+        return chunk
+
+    @staticmethod
+    def complete_chunk(run_id, index, result):
+        """
+        标记分片完成并累加运行统计
+
+        分片可能因重新投递被执行多次，只有第一次完成会计入统计。
+
+        Args:
+            run_id (str): 运行ID
+            index (int): 分片序号
+            result (dict): 分片统计，例如 {'users': 1000, 'updated': 800}
+
+        Returns:
+            dict: 更新后的运行文档，分片此前已完成返回None
+        """
+        now = datetime.datetime.utcnow()
+        updated = db.get_collection(JOB_CHUNKS_COLLECTION).update_one(
+            {'run_id': ObjectId(run_id), 'index': index, 'status': {'$ne': CHUNK_DONE}},
+            {'$set': {'status': CHUNK_DONE, 'result': result, 'finished_at': now},
+             '$unset': {'error': '', 'lease_expires_at': ''}}
+        )
+        if not updated.modified_count:
+            return None
+
+        increments = {f"totals.{key}": value for key, value in result.items()}
+        increments['completed_chunks'] = 1
+        return db.get_collection(JOB_RUNS_COLLECTION).find_one_and_update(
+            {'_id': ObjectId(run_id)},
+            {'$inc': increments, '$set': {'updated_at': now}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    @staticmethod
+    def fail_chunk(run_id, index, error):
+        """
+        标记分片失败并释放租约（重试或下次运行时会重新领取，直到领取次数用尽）
+
+        Args:
+            run_id (str): 运行ID
+            index (int): 分片序号
+            error (str): 错误信息
+        """
+        db.get_collection(JOB_CHUNKS_COLLECTION).update_one(
+            {'run_id': ObjectId(run_id), 'index': index, 'status': {'$ne': CHUNK_DONE}},
+            {'$set': {'status': CHUNK_FAILED, 'error': error}, '$unset': {'lease_expires_at': ''}}
+        )
+
+    @staticmethod
+    def finish_run(run_id):
+        """
+        汇总运行结果；所有分片都已完成时将运行标记为完成
+
+        Args:
+            run_id (str): 运行ID
+
+        Returns:
+            dict: 运行摘要
+        """
+        pending = JobTracker.pending_chunks(run_id)
+        if not pending:
+            now = datetime.datetime.utcnow()
+            db.get_collection(JOB_RUNS_COLLECTION).update_one(
+                {'_id': ObjectId(run_id), 'status': RUN_RUNNING},
+                {'$set': {'status': RUN_COMPLETED, 'finished_at': now, 'updated_at': now}}
+            )
+        return JobTracker.get_run_summary(run_id)
+
+    @staticmethod
+    def get_run_summary(run_id):
+        """
+        获取运行摘要（进度、统计和处理速度）
+
+        Args:
+            run_id (str): 运行ID
+
+        Returns:
+            dict: 运行摘要，运行不存在返回None
+        """
+        run = db.find_one(JOB_RUNS_COLLECTION, {'_id': ObjectId(run_id)})
+        if not run:
+            return None
+
+        end = run.get('finished_at') or datetime.datetime.utcnow()
+        elapsed = (end - run['started_at']).total_seconds()
+        users = run['totals'].get('users', 0)
+        total_chunks = run['total_chunks']
+        return {
+            'run_id': str(run['_id']),
+            'job': run['job'],
+            'status': run['status'],
+            'completed_chunks': run['completed_chunks'],
+            'total_chunks': total_chunks,
+            'progress': round(run['completed_chunks'] / total_chunks, 4) if total_chunks else 1.0,
+            'totals': run['totals'],
+            'elapsed_seconds': round(elapsed, 2),
+            'users_per_second': round(users / elapsed, 1) if elapsed > 0 else 0.0
+        }
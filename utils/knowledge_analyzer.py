@@ -25,6 +25,12 @@ class KnowledgeAnalyzer:
             'intermediate': 0.7,
             'advanced': 1.0
         }
+        
+        # 按答题正确率分级的阈值
+        self.accuracy_thresholds = {
+            'advanced': 0.8,
+            'intermediate': 0.5
+        }
     
     def analyze_user_level(self, knowledge_graph):
         """
@@ -155,9 +161,9 @@ class KnowledgeAnalyzer:
             accuracy = 0
         else:
             accuracy = correct_count / total_count
-            if accuracy >= 0.8:
+            if accuracy >= self.accuracy_thresholds['advanced']:
                 level = "advanced"
-            elif accuracy >= 0.5:
+            elif accuracy >= self.accuracy_thresholds['intermediate']:
                 level = "intermediate"
             else:
                 level = "beginner"
@@ -173,6 +179,58 @@ class KnowledgeAnalyzer:
             "knowledge_points": knowledge_points
         }
     
+    def assess_knowledge_batch(self, topic_stats):
+        """
+        批量评估多个用户的知识水平（向量化计算）
+        
+        Args:
+            topic_stats (list): (用户ID, 知识点, 答题数, 正确数) 元组列表，
+                                通常由数据库按用户和知识点分组统计得到
+            
+        Returns:
+            dict: {用户ID: 知识水平评估结果}，结构与assess_knowledge_by_questions一致，
+                  knowledge_points为各知识点的实际正确率
+        """
+        import numpy as np
+        
+        if not topic_stats:
+            return {}
+        
+        user_ids, topics, totals, corrects = zip(*topic_stats)
+        unique_users, user_index = np.unique(np.array(user_ids, dtype=object), return_inverse=True)
+        totals = np.asarray(totals, dtype=np.float64)
+        corrects = np.asarray(corrects, dtype=np.float64)
+        
+        # 各知识点正确率
+        topic_accuracy = np.round(np.divide(corrects, totals, out=np.zeros_like(totals), where=totals > 0), 2)
+        
+        # 每个用户的总答题数、正确数和正确率
+        user_totals = np.bincount(user_index, weights=totals, minlength=len(unique_users))
+        user_corrects = np.bincount(user_index, weights=corrects, minlength=len(unique_users))
+        user_accuracy = np.divide(user_corrects, user_totals, out=np.zeros_like(user_totals), where=user_totals > 0)
+        levels = np.select(
+            [user_accuracy >= self.accuracy_thresholds['advanced'],
+             user_accuracy >= self.accuracy_thresholds['intermediate']],
+            ['advanced', 'intermediate'],
+            default='beginner'
+        )
+        
+        results = {}
+        for i, user_id in enumerate(unique_users):
+            results[user_id] = {
+                "level": str(levels[i]),
+                "correct_count": int(user_corrects[i]),
+                "total_count": int(user_totals[i]),
+                "accuracy": float(user_accuracy[i]),
+                "knowledge_points": {}
+            }
+        for i, topic in enumerate(topics):
+            # 没有知识点的记录只计入总正确率
+            if topic:
+                results[unique_users[user_index[i]]]["knowledge_points"][topic] = float(topic_accuracy[i])
+        
+        return results
+    
     def _generate_knowledge_points(self, answers, accuracy):
         """
         根据答题情况生成知识点掌握情况
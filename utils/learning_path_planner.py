@@ -52,6 +52,90 @@ class LearningPathPlanner:
         Returns:
             dict: 个性化学习路径
         """
+        level_analysis, learning_goal, path, materials = self._plan_path(knowledge_graph, learning_goal)
+        
+        # 在一次大模型请求中生成所有子主题的内容
+        subtopic_contents = self.content_generator.generate_subtopic_contents(
+            level_analysis, materials, path, knowledge_graph
+        )
+        return self._build_path(user_id, learning_goal, level_analysis, path, subtopic_contents)
+    
+    async def agenerate_personalized_learning_path(self, user_id, knowledge_graph, learning_goal):
+        """
+        生成个性化学习路径（异步版本，供ASGI服务使用）
+        
+        Args:
+            user_id (str): 用户ID
+            knowledge_graph (dict): 用户知识图谱
+            learning_goal (str): 学习目标
+            
+        Returns:
+            dict: 个性化学习路径
+        """
+        level_analysis, learning_goal, path, materials = self._plan_path(knowledge_graph, learning_goal)
+        subtopic_contents = await self.content_generator.agenerate_subtopic_contents(
+            level_analysis, materials, path, knowledge_graph
+        )
+        return self._build_path(user_id, learning_goal, level_analysis, path, subtopic_contents)
+    
+    def stream_personalized_learning_path(self, user_id, knowledge_graph, learning_goal):
+        """
+        生成个性化学习路径，每个子主题的内容生成完成后立即产出
+        
+        Args:
+            user_id (str): 用户ID
+            knowledge_graph (dict): 用户知识图谱
+            learning_goal (str): 学习目标
+            
+        Yields:
+            tuple: (事件名, 数据)：先产出path（学习目标、用户水平和子主题顺序），
+                   每个子主题完成时产出topic（子主题详情），最后产出done（完整学习路径）
+        """
+        level_analysis, learning_goal, path, materials = self._plan_path(knowledge_graph, learning_goal)
+        yield 'path', self._path_summary(user_id, learning_goal, level_analysis, path)
+        
+        subtopic_contents = {}
+        for topic, content in self.content_generator.stream_subtopic_contents(
+            level_analysis, materials, path, knowledge_graph
+        ):
+            subtopic_contents[topic] = content
+            yield 'topic', self._topic_details(learning_goal, level_analysis, topic, content)
+        yield 'done', self._build_path(user_id, learning_goal, level_analysis, path, subtopic_contents)
+    
+    async def astream_personalized_learning_path(self, user_id, knowledge_graph, learning_goal):
+        """
+        生成个性化学习路径，每个子主题的内容生成完成后立即产出（异步版本）
+        
+        Args:
+            user_id (str): 用户ID
+            knowledge_graph (dict): 用户知识图谱
+            learning_goal (str): 学习目标
+            
+        Yields:
+            tuple: (事件名, 数据)，同stream_personalized_learning_path
+        """
+        level_analysis, learning_goal, path, materials = self._plan_path(knowledge_graph, learning_goal)
+        yield 'path', self._path_summary(user_id, learning_goal, level_analysis, path)
+        
+        subtopic_contents = {}
+        async for topic, content in self.content_generator.astream_subtopic_contents(
+            level_analysis, materials, path, knowledge_graph
+        ):
+            subtopic_contents[topic] = content
+            yield 'topic', self._topic_details(learning_goal, level_analysis, topic, content)
+        yield 'done', self._build_path(user_id, learning_goal, level_analysis, path, subtopic_contents)
+    
+    def _plan_path(self, knowledge_graph, learning_goal):
+        """
+        分析用户水平并确定学习路径的子主题
+        
+        Args:
+            knowledge_graph (dict): 用户知识图谱
+            learning_goal (str): 学习目标
+            
+        Returns:
+            tuple: (水平分析结果, 学习目标, 子主题列表, 学习材料)
+        """
         # 分析用户水平
         level_analysis = self.knowledge_analyzer.analyze_user_level(knowledge_graph)
         user_level = level_analysis.get('level', 'beginner')
@@ -62,30 +146,78 @@ class LearningPathPlanner:
         
         path = self.learning_paths[learning_goal].get(user_level, [])
         
-        # 生成学习路径详情
-        learning_path_details = []
-        for topic in path:
-            # 获取相关学习材料
-            materials = self.content_generator.retrieve_materials(learning_goal, level_analysis)
-            explanation = self.content_generator.generate_explanation(level_analysis, materials, knowledge_graph)
-            exercises = self.content_generator.generate_exercises(level_analysis, materials)
+        # 获取相关学习材料
+        materials = self.content_generator.retrieve_materials(learning_goal, level_analysis)
+        return level_analysis, learning_goal, path, materials
+    
+    def _build_path(self, user_id, learning_goal, level_analysis, path, subtopic_contents):
+        """
+        组装学习路径详情
+        
+        Args:
+            user_id (str): 用户ID
+            learning_goal (str): 学习目标
+            level_analysis (dict): 用户水平分析结果
+            path (list): 子主题列表
+            subtopic_contents (dict): 各子主题的解释内容和练习题
             
-            learning_path_details.append({
-                "topic": topic,
-                "explanation": explanation,
-                "exercises": exercises,
-                "estimated_time": self._estimate_learning_time(topic, user_level),
-                "prerequisites": self._get_prerequisites(learning_goal, topic)
-            })
+        Returns:
+            dict: 个性化学习路径
+        """
+        learning_path_details = [
+            self._topic_details(learning_goal, level_analysis, topic, subtopic_contents[topic])
+            for topic in path
+        ]
         
         return {
             "user_id": user_id,
             "learning_goal": learning_goal,
-            "user_level": user_level,
+            "user_level": level_analysis.get('level', 'beginner'),
             "path": learning_path_details,
             "generated_at": datetime.utcnow()
         }
     
+    def _path_summary(self, user_id, learning_goal, level_analysis, path):
+        """
+        学习路径概要（流式返回时在子主题内容之前发送）
+        
+        Args:
+            user_id (str): 用户ID
+            learning_goal (str): 学习目标
+            level_analysis (dict): 用户水平分析结果
+            path (list): 子主题列表
+            
+        Returns:
+            dict: 学习目标、用户水平和子主题顺序
+        """
+        return {
+            "user_id": user_id,
+            "learning_goal": learning_goal,
+            "user_level": level_analysis.get('level', 'beginner'),
+            "topics": list(path)
+        }
+    
+    def _topic_details(self, learning_goal, level_analysis, topic, content):
+        """
+        组装单个子主题的详情
+        
+        Args:
+            learning_goal (str): 学习目标
+            level_analysis (dict): 用户水平分析结果
+            topic (str): 子主题
+            content (dict): 子主题的解释内容和练习题
+            
+        Returns:
+            dict: 子主题详情
+        """
+        return {
+            "topic": topic,
+            "explanation": content["explanation"],
+            "exercises": content["exercises"],
+            "estimated_time": self._estimate_learning_time(topic, level_analysis.get('level', 'beginner')),
+            "prerequisites": self._get_prerequisites(learning_goal, topic)
+        }
+    
     def _estimate_learning_time(self, topic, user_level):
         """
         估算学习时间
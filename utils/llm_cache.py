@@ -0,0 +1,316 @@
+"""
+大模型响应缓存模块
+按规范化的提示词指纹缓存生成结果，支持进程内LRU缓存和可插拔的共享缓存
+"""
+
+import contextvars
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+def make_fingerprint(kind, **parts):
+    """
+    生成内容寻址的缓存键
+
+    Args:
+        kind (str): 生成内容类型，例如 explanation、exercises
+        **parts: 影响提示词的全部输入
+
+    Returns:
+        str: 缓存键
+    """
+    normalized = {key: _normalize(value) for key, value in parts.items()}
+    raw = json.dumps(normalized, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    digest = hashlib.sha256(raw.encode('utf-8')).hexdigest()
+    return f"llm:{kind}:{digest}"
+
+def _normalize(value):
+    """规范化输入：去除首尾空白、统一大小写，列表保持顺序"""
+    if isinstance(value, str):
+        return ' '.join(value.split()).lower()
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+class MemoryCache:
+    """带TTL的进程内LRU缓存"""
+
+    def __init__(self, max_entries=512):
+        """
+        初始化缓存
+
+        Args:
+            max_entries (int): 最大缓存条目数
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """获取缓存值，不存在或已过期返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        """写入缓存值，超过容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        """删除缓存值"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        """当前缓存条目数"""
+        return len(self._entries)
+
+class RedisCacheBackend:
+    """基于Redis的共享缓存"""
+
+    def __init__(self, url=None):
+        """
+        初始化Redis缓存
+
+        Args:
+            url (str): Redis连接字符串，默认使用Config.REDIS_URL
+        """
+        import redis
+        self.client = redis.Redis.from_url(url or Config.REDIS_URL)
+
+    def get(self, key):
+        """获取缓存值，不存在返回None"""
+        value = self.client.get(key)
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key, value, ttl):
+        """写入缓存值并设置过期时间（秒）"""
+        self.client.set(key, value, ex=int(ttl))
+
+    def delete(self, key):
+        """删除缓存值"""
+        self.client.delete(key)
+
+class MongoCacheBackend:
+    """基于MongoDB的共享缓存（依赖TTL索引自动清理过期条目，索引由 python migrate.py create-indexes 创建）"""
+
+    def __init__(self, collection_name='llm_cache'):
+        """
+        初始化MongoDB缓存
+
+        Args:
+            collection_name (str): 缓存集合名称
+        """
+        from database import db
+        self.collection = db.get_collection(collection_name)
+
+    def get(self, key):
+        """获取缓存值，不存在返回None"""
+        doc = self.collection.find_one({'_id': key})
+        # TTL索引的清理有延迟，读取时再判断一次
+        if not doc or doc['expires_at'] <= datetime.utcnow():
+            return None
+        return doc['value']
+
+    def set(self, key, value, ttl):
+        """写入缓存值并设置过期时间（秒）"""
+        self.collection.update_one(
+            {'_id': key},
+            {'$set': {'value': value, 'expires_at': datetime.utcnow() + timedelta(seconds=ttl)}},
+            upsert=True
+        )
+
+    def delete(self, key):
+        """删除缓存值"""
+        self.collection.delete_one({'_id': key})
+
+class ResponseCache:
+    """两级响应缓存：进程内LRU + 可选共享缓存"""
+
+    def __init__(self, ttl=3600, max_entries=512, shared=None):
+        """
+        初始化响应缓存
+
+        Args:
+            ttl (int): 缓存有效期（秒）
+            max_entries (int): 进程内缓存最大条目数
+            shared: 共享缓存后端，需实现 get/set/delete
+        """
+        self.ttl = ttl
+        self.local = MemoryCache(max_entries)
+        self.shared = shared
+        self._lock = threading.Lock()
+        # 正在生成的缓存键 -> Future，相同键的并发请求共享同一次生成
+        self._inflight = {}
+        self.counters = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'errors': 0, 'coalesced': 0}
+
+    @classmethod
+    def from_config(cls):
+        """根据Config创建响应缓存"""
+        shared = None
+        backend = Config.LLM_CACHE_BACKEND
+        try:
+            if backend == 'redis':
+                shared = RedisCacheBackend()
+            elif backend == 'mongo':
+                shared = MongoCacheBackend()
+        except Exception as e:
+            logger.warning(f"初始化共享缓存 {backend} 失败，仅使用进程内缓存: {e}")
+        return cls(ttl=Config.LLM_CACHE_TTL, max_entries=Config.LLM_CACHE_MAX_ENTRIES, shared=shared)
+
+    def get(self, key):
+        """
+        获取缓存值
+
+        Args:
+            key (str): 缓存键
+
+        Returns:
+            any: 缓存的值，未命中返回None
+        """
+        value = self.local.get(key)
+        if value is not None:
+            self._count('local_hits')
+            return value
+
+        if self.shared is not None:
+            try:
+                raw = self.shared.get(key)
+                if raw is not None:
+                    value = json.loads(raw)
+                    self.local.set(key, value, self.ttl)
+                    self._count('shared_hits')
+                    return value
+            except Exception as e:
+                self._count('errors')
+                logger.warning(f"读取共享缓存失败: {e}")
+
+        self._count('misses')
+        return None
+
+    def set(self, key, value):
+        """
+        写入缓存值
+
+        Args:
+            key (str): 缓存键
+            value (any): 可JSON序列化的值
+        """
+        self.local.set(key, value, self.ttl)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, json.dumps(value, ensure_ascii=False), self.ttl)
+            except Exception as e:
+                self._count('errors')
+                logger.warning(f"写入共享缓存失败: {e}")
+
+    def get_or_compute(self, key, compute):
+        """
+        获取缓存值，未命中时调用compute生成并写入缓存（compute返回None时不缓存）
+
+        同一个键同时只生成一次：生成期间到达的相同请求等待并共享这次生成的结果（或异常）。
+
+        Args:
+            key (str): 缓存键
+            compute (callable): 生成函数
+
+        Returns:
+            any: 缓存或新生成的值
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        future, leader = self._join(key)
+        if leader:
+            self._compute(key, future, compute)
+        return future.result()
+
+    def submit(self, key, compute, executor):
+        """
+        在线程池中生成并写入缓存，不等待结果（调用方应先用get确认未命中）
+
+        与get_or_compute共享正在进行的生成，同一个键同时只生成一次。
+
+        Args:
+            key (str): 缓存键
+            compute (callable): 生成函数
+            executor (Executor): 执行生成的线程池
+
+        Returns:
+            Future: 生成结果
+        """
+        future, leader = self._join(key)
+        if leader:
+            executor.submit(contextvars.copy_context().run, self._compute, key, future, compute)
+        return future
+
+    def _join(self, key):
+        """
+        获取键正在进行的生成，没有时登记一个新的
+
+        Returns:
+            tuple: (Future, 是否由调用方负责生成)
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.counters['coalesced'] += 1
+                return future, False
+            future = self._inflight[key] = Future()
+            return future, True
+
+    def _compute(self, key, future, compute):
+        """调用生成函数、写入缓存，并把结果或异常交给等待同一个键的请求"""
+        try:
+            value = compute()
+            if value is not None:
+                self.set(key, value)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(value)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self):
+        """
+        获取缓存命中统计
+
+        Returns:
+            dict: 命中、未命中次数和命中率
+        """
+        with self._lock:
+            counters = dict(self.counters)
+        lookups = counters['local_hits'] + counters['shared_hits'] + counters['misses']
+        hits = counters['local_hits'] + counters['shared_hits']
+        counters['hit_rate'] = round(hits / lookups, 4) if lookups else 0.0
+        counters['local_size'] = len(self.local)
+        return counters
+
+    def _count(self, name):
+        """累加计数器"""
+        with self._lock:
+            self.counters[name] += 1
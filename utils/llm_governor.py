@@ -0,0 +1,418 @@
+"""
+大模型调用调度模块
+在大模型调用前统一进行准入控制，避免少数用户的重复请求占满全部工作线程：
+- 全局并发上限：同时进行的大模型调用数，超出时排队等待，队列已满时直接拒绝
+- 每用户在途请求上限：同一用户同时进行中的大模型请求数
+- 令牌额度：按用户统计每天消耗的令牌数，超过额度后当天不再调用
+
+ASGI服务中的异步调用不占用线程，使用单独的（更高的）并发上限
+"""
+
+import asyncio
+import contextvars
+import datetime
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+from functools import wraps
+
+from flask import request, Response
+
+from config import Config
+from database import db, async_db
+from utils.rate_limiter import client_ip
+from utils.response import ResponseUtil
+
+logger = logging.getLogger(__name__)
+
+LLM_USAGE_COLLECTION = 'llm_usage'
+DATE_FORMAT = '%Y-%m-%d'
+
+# 当前请求的用量统计对象（"user:<用户ID>" 或 "ip:<IP地址>"），用于令牌额度记账
+current_subject = contextvars.ContextVar('llm_subject', default=None)
+
+class LLMThrottled(Exception):
+    """大模型调用被调度器拒绝"""
+
+    def __init__(self, message, reason, retry_after=1):
+        """
+        Args:
+            message (str): 返回给客户端的提示
+            reason (str): 拒绝原因（busy/user_inflight/quota/queue_timeout）
+            retry_after (int): 建议等待秒数
+        """
+        super().__init__(message)
+        self.message = message
+        self.reason = reason
+        self.retry_after = retry_after
+
+class TokenUsage:
+    """按天汇总的令牌用量（存储在MongoDB中，多个工作进程共享）"""
+
+    @staticmethod
+    def _today():
+        """当天日期（UTC）"""
+        return datetime.datetime.utcnow().strftime(DATE_FORMAT)
+
+    @staticmethod
+    def get_tokens(subject):
+        """
+        获取当天已消耗的令牌数
+
+        Args:
+            subject (str): 用量统计对象
+
+        Returns:
+            int: 令牌数
+        """
+        doc = db.find_one(LLM_USAGE_COLLECTION, {'subject': subject, 'date': TokenUsage._today()}, {'tokens': 1})
+        return doc['tokens'] if doc else 0
+
+    @staticmethod
+    def add_tokens(subject, tokens):
+        """
+        累加当天消耗的令牌数和调用次数
+
+        Args:
+            subject (str): 用量统计对象
+            tokens (int): 令牌数
+        """
+        db.get_collection(LLM_USAGE_COLLECTION).update_one(
+            {'subject': subject, 'date': TokenUsage._today()},
+            {'$inc': {'tokens': tokens, 'calls': 1}},
+            upsert=True
+        )
+
+    @staticmethod
+    async def aget_tokens(subject):
+        """异步获取当天已消耗的令牌数"""
+        doc = await async_db.find_one(LLM_USAGE_COLLECTION, {'subject': subject, 'date': TokenUsage._today()}, {'tokens': 1})
+        return doc['tokens'] if doc else 0
+
+    @staticmethod
+    async def aadd_tokens(subject, tokens):
+        """异步累加当天消耗的令牌数和调用次数"""
+        await async_db.update_one(
+            LLM_USAGE_COLLECTION,
+            {'subject': subject, 'date': TokenUsage._today()},
+            {'$inc': {'tokens': tokens, 'calls': 1}},
+            upsert=True
+        )
+
+def seconds_until_tomorrow():
+    """距离UTC次日零点的秒数（令牌额度按UTC日期重置）"""
+    now = datetime.datetime.utcnow()
+    tomorrow = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time())
+    return math.ceil((tomorrow - now).total_seconds())
+
+class LLMGovernor:
+    """大模型调用调度器（每个工作进程一个实例）"""
+
+    def __init__(self, max_concurrency=8, max_queue=16, queue_timeout=5, user_max_inflight=2,
+                 daily_token_quota=0, usage=TokenUsage, async_max_concurrency=256):
+        """
+        初始化调度器
+
+        Args:
+            max_concurrency (int): 同时进行的大模型调用数上限
+            async_max_concurrency (int): 异步调用（ASGI服务）同时进行数上限
+            max_queue (int): 等待调用的最大排队数，排队已满时新请求直接返回429
+            queue_timeout (float): 排队等待的最长时间（秒），超时的调用使用预定义内容
+            user_max_inflight (int): 每个用户同时进行中的请求数上限
+            daily_token_quota (int): 每个用户每天的令牌额度，0表示不限
+            usage: 令牌用量存储，需实现 get_tokens/add_tokens
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.user_max_inflight = user_max_inflight
+        self.daily_token_quota = daily_token_quota
+        self.usage = usage
+
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._user_inflight = {}
+        self.async_max_concurrency = async_max_concurrency
+        self._async_semaphore = None
+        self._async_active = 0
+        self._async_waiting = 0
+        self.counters = {
+            'admitted': 0,
+            'calls': 0,
+            'shed_busy': 0,
+            'shed_user_inflight': 0,
+            'shed_quota': 0,
+            'queue_timeouts': 0,
+            'max_queue_depth': 0,
+            'wait_seconds': 0.0,
+            'tokens': 0
+        }
+
+    @classmethod
+    def from_config(cls):
+        """根据Config创建调度器"""
+        return cls(
+            max_concurrency=Config.LLM_MAX_CONCURRENCY,
+            max_queue=Config.LLM_MAX_QUEUE,
+            queue_timeout=Config.LLM_QUEUE_TIMEOUT,
+            user_max_inflight=Config.LLM_USER_MAX_INFLIGHT,
+            daily_token_quota=Config.LLM_USER_DAILY_TOKENS,
+            async_max_concurrency=Config.LLM_ASYNC_MAX_CONCURRENCY
+        )
+
+    def acquire_user(self, subject):
+        """
+        请求准入：检查排队深度、用户在途请求数和令牌额度，通过后占用一个用户在途名额，
+        并将subject设为当前上下文的用量统计对象
+
+        Args:
+            subject (str): 用量统计对象
+
+        Returns:
+            contextvars.Token: 传给release_user，用于恢复current_subject
+
+        Raises:
+            LLMThrottled: 未通过准入检查
+        """
+        if self.daily_token_quota:
+            try:
+                used = self.usage.get_tokens(subject)
+            except Exception as e:
+                # 用量存储不可用时不阻止请求
+                logger.warning(f"读取令牌用量失败: {e}")
+                used = 0
+            self._check_quota(used)
+        return self._admit(subject)
+
+    async def aacquire_user(self, subject):
+        """
+        请求准入（异步版本，令牌用量通过异步数据库读取）
+
+        Args:
+            subject (str): 用量统计对象
+
+        Returns:
+            contextvars.Token: 传给release_user，用于恢复current_subject
+
+        Raises:
+            LLMThrottled: 未通过准入检查
+        """
+        if self.daily_token_quota:
+            try:
+                used = await self.usage.aget_tokens(subject)
+            except Exception as e:
+                logger.warning(f"读取令牌用量失败: {e}")
+                used = 0
+            self._check_quota(used)
+        return self._admit(subject)
+
+    def _check_quota(self, used):
+        """当天令牌用量已达额度时拒绝"""
+        if used >= self.daily_token_quota:
+            self._count('shed_quota')
+            raise LLMThrottled('今日生成额度已用完，请明天再试', 'quota', seconds_until_tomorrow())
+
+    def _admit(self, subject):
+        """检查排队深度和用户在途请求数，通过后占用一个用户在途名额并设置current_subject"""
+        with self._cond:
+            if self._waiting + self._async_waiting >= self.max_queue:
+                self.counters['shed_busy'] += 1
+                raise LLMThrottled('服务繁忙，请稍后再试', 'busy', max(1, math.ceil(self.queue_timeout)))
+            if self._user_inflight.get(subject, 0) >= self.user_max_inflight:
+                self.counters['shed_user_inflight'] += 1
+                raise LLMThrottled('上一个请求仍在处理中，请稍后再试', 'user_inflight', 1)
+            self._user_inflight[subject] = self._user_inflight.get(subject, 0) + 1
+            self.counters['admitted'] += 1
+        return current_subject.set(subject)
+
+    def release_user(self, subject, context_token=None):
+        """
+        释放用户在途名额，并恢复准入前的current_subject
+
+        同步工作线程会复用上下文处理下一个请求，不恢复的话之后的调用会记到上一个用户名下。
+
+        Args:
+            subject (str): 用量统计对象
+            context_token (contextvars.Token): acquire_user的返回值
+        """
+        with self._cond:
+            remaining = self._user_inflight.get(subject, 0) - 1
+            if remaining > 0:
+                self._user_inflight[subject] = remaining
+            else:
+                self._user_inflight.pop(subject, None)
+        if context_token is not None:
+            try:
+                current_subject.reset(context_token)
+            except ValueError:
+                # 在准入时以外的上下文中释放（例如流式响应关闭时），直接清除
+                current_subject.set(None)
+
+    @contextmanager
+    def slot(self):
+        """
+        占用一个全局调用名额，名额已满时排队等待
+
+        Raises:
+            LLMThrottled: 排队超过queue_timeout仍未获得名额
+        """
+        started = time.monotonic()
+        deadline = started + self.queue_timeout
+        with self._cond:
+            if self._active >= self.max_concurrency:
+                self._waiting += 1
+                self.counters['max_queue_depth'] = max(self.counters['max_queue_depth'], self._waiting)
+                try:
+                    while self._active >= self.max_concurrency:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.counters['queue_timeouts'] += 1
+                            raise LLMThrottled('服务繁忙，请稍后再试', 'queue_timeout',
+                                               max(1, math.ceil(self.queue_timeout)))
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._active += 1
+            self.counters['calls'] += 1
+            self.counters['wait_seconds'] += time.monotonic() - started
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify()
+
+    @asynccontextmanager
+    async def async_slot(self):
+        """
+        占用一个异步调用名额，名额已满时排队等待（等待期间不占用线程）
+
+        Raises:
+            LLMThrottled: 排队超过queue_timeout仍未获得名额
+        """
+        if self._async_semaphore is None:
+            self._async_semaphore = asyncio.Semaphore(self.async_max_concurrency)
+        started = time.monotonic()
+        waiting = self._async_semaphore.locked()
+        if waiting:
+            with self._cond:
+                self._async_waiting += 1
+                self.counters['max_queue_depth'] = max(self.counters['max_queue_depth'],
+                                                       self._waiting + self._async_waiting)
+        try:
+            await asyncio.wait_for(self._async_semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._count('queue_timeouts')
+            raise LLMThrottled('服务繁忙，请稍后再试', 'queue_timeout', max(1, math.ceil(self.queue_timeout)))
+        finally:
+            if waiting:
+                with self._cond:
+                    self._async_waiting -= 1
+        with self._cond:
+            self._async_active += 1
+            self.counters['calls'] += 1
+            self.counters['wait_seconds'] += time.monotonic() - started
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._async_active -= 1
+            self._async_semaphore.release()
+
+    def record_usage(self, tokens):
+        """
+        为当前请求的用量统计对象记账
+
+        Args:
+            tokens (int): 本次调用消耗的令牌数
+        """
+        self._count('tokens', tokens)
+        subject = current_subject.get()
+        if not subject or not self.daily_token_quota:
+            return
+        try:
+            self.usage.add_tokens(subject, tokens)
+        except Exception as e:
+            logger.warning(f"记录令牌用量失败: {e}")
+
+    async def arecord_usage(self, tokens):
+        """
+        为当前请求的用量统计对象记账（异步版本）
+
+        Args:
+            tokens (int): 本次调用消耗的令牌数
+        """
+        self._count('tokens', tokens)
+        subject = current_subject.get()
+        if not subject or not self.daily_token_quota:
+            return
+        try:
+            await self.usage.aadd_tokens(subject, tokens)
+        except Exception as e:
+            logger.warning(f"记录令牌用量失败: {e}")
+
+    def stats(self):
+        """
+        获取调度指标
+
+        Returns:
+            dict: 当前并发数、排队深度及各类拒绝次数
+        """
+        with self._cond:
+            stats = dict(self.counters)
+            stats['active'] = self._active
+            stats['queue_depth'] = self._waiting
+            stats['async_active'] = self._async_active
+            stats['async_queue_depth'] = self._async_waiting
+            stats['users_in_flight'] = len(self._user_inflight)
+        wait_seconds = stats.pop('wait_seconds')
+        stats['avg_wait_ms'] = round(wait_seconds / stats['calls'] * 1000, 1) if stats['calls'] else 0.0
+        stats['max_concurrency'] = self.max_concurrency
+        stats['max_queue'] = self.max_queue
+        return stats
+
+    def _count(self, name, value=1):
+        """累加计数器"""
+        with self._cond:
+            self.counters[name] += value
+
+# 进程内共享的调度器
+llm_governor = LLMGovernor.from_config()
+
+def llm_governed(f):
+    """
+    装饰器：大模型接口的准入控制，未通过时返回429并携带Retry-After
+
+    放在token_required之后时按用户统计，否则按客户端IP统计。
+    流式响应在流结束后才释放在途名额。
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        user_id = getattr(request, 'user_id', None)
+        subject = f"user:{user_id}" if user_id else f"ip:{client_ip()}"
+        try:
+            context_token = llm_governor.acquire_user(subject)
+        except LLMThrottled as e:
+            logger.warning(f"大模型请求被拒绝（{e.reason}）: {subject}")
+            return ResponseUtil.too_many_requests(e.message, e.retry_after)
+
+        def release():
+            llm_governor.release_user(subject, context_token)
+
+        try:
+            result = f(*args, **kwargs)
+        except Exception:
+            release()
+            raise
+
+        response = result[0] if isinstance(result, tuple) else result
+        if isinstance(response, Response) and response.is_streamed:
+            response.call_on_close(release)
+        else:
+            release()
+        return result
+
+    return decorated
@@ -0,0 +1,349 @@
+"""
+大模型服务提供方模块
+ContentGenerator通过统一的提供方接口调用大模型：
+- dashscope：阿里云百炼API
+- stub：本地模拟提供方，按配置模拟延迟、令牌吞吐量和失败率，输出由提示词确定，
+  用于在无网络环境下压测缓存、并发和流式输出
+
+每个提供方同时提供同步接口（generate/stream，供Flask视图使用）和异步接口
+（agenerate/astream，供ASGI服务使用，等待模型响应时不占用线程）
+"""
+
+import asyncio
+import hashlib
+import importlib.util
+import json
+import logging
+import random
+import threading
+import time
+from collections import namedtuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# dashscope导入较慢，只检查是否已安装，首次调用大模型时才导入
+DASHSCOPE_AVAILABLE = importlib.util.find_spec('dashscope') is not None
+
+# 阿里云百炼文本生成HTTP接口（异步调用时使用，同步调用使用dashscope SDK）
+DASHSCOPE_GENERATION_URL = 'https://dashscope.aliyuncs.com/api/v1/services/aigc/text-generation/generation'
+
+# 生成结果：文本（流式时为增量片段）、消耗的令牌数（未知时为None）
+LLMResult = namedtuple('LLMResult', ['text', 'tokens'])
+
+class LLMProviderError(Exception):
+    """大模型调用失败（接口返回错误状态）"""
+
+class LLMProvider:
+    """大模型服务提供方接口"""
+
+    name = None
+
+    @property
+    def available(self):
+        """提供方是否可用（已配置且依赖已安装）"""
+        return True
+
+    def generate(self, prompt, max_tokens=1000, temperature=0.7):
+        """
+        生成内容
+
+        Args:
+            prompt (str): 提示词
+            max_tokens (int): 最大生成令牌数
+            temperature (float): 采样温度
+
+        Returns:
+            LLMResult: 生成结果
+
+        Raises:
+            LLMProviderError: 调用失败
+        """
+        raise NotImplementedError
+
+    def stream(self, prompt, max_tokens=1000, temperature=0.7):
+        """
+        流式生成内容
+
+        Args:
+            prompt (str): 提示词
+            max_tokens (int): 最大生成令牌数
+            temperature (float): 采样温度
+
+        Yields:
+            LLMResult: 增量文本片段；tokens为截至当前片段的累计用量，未知时为None
+
+        Raises:
+            LLMProviderError: 调用失败
+        """
+        raise NotImplementedError
+
+    async def agenerate(self, prompt, max_tokens=1000, temperature=0.7):
+        """
+        异步生成内容（默认在线程中执行同步接口）
+
+        Returns:
+            LLMResult: 生成结果
+
+        Raises:
+            LLMProviderError: 调用失败
+        """
+        return await asyncio.to_thread(self.generate, prompt, max_tokens, temperature)
+
+    async def astream(self, prompt, max_tokens=1000, temperature=0.7):
+        """
+        异步流式生成内容（默认一次性返回完整内容）
+
+        Yields:
+            LLMResult: 增量文本片段
+
+        Raises:
+            LLMProviderError: 调用失败
+        """
+        yield await self.agenerate(prompt, max_tokens, temperature)
+
+    async def aclose(self):
+        """释放异步接口占用的连接"""
+
+def _load_generation():
+    """
+    导入dashscope并返回Generation接口（模块导入后由Python缓存，重复调用开销很小）
+
+    Returns:
+        type: dashscope.Generation
+    """
+    import dashscope
+    from dashscope import Generation
+    dashscope.api_key = Config.DASHSCOPE_API_KEY
+    return Generation
+
+def _usage_tokens(response):
+    """
+    获取阿里云百炼API响应中的令牌用量
+
+    Args:
+        response: 阿里云百炼SDK响应或HTTP接口返回的JSON
+
+    Returns:
+        int: 令牌数，响应未包含用量时返回None
+    """
+    usage = response.get('usage') if isinstance(response, dict) else getattr(response, 'usage', None)
+    try:
+        return int(usage.get('total_tokens') or usage['input_tokens'] + usage['output_tokens'])
+    except (AttributeError, KeyError, TypeError):
+        return None
+
+class DashScopeProvider(LLMProvider):
+    """阿里云百炼API"""
+
+    name = 'dashscope'
+
+    def __init__(self, model='qwen-plus'):
+        """
+        Args:
+            model (str): 模型名称
+        """
+        self.model = model
+        self._http = None
+
+    @property
+    def available(self):
+        """已配置API密钥且已安装dashscope时可用"""
+        return bool(Config.DASHSCOPE_API_KEY) and DASHSCOPE_AVAILABLE
+
+    def generate(self, prompt, max_tokens=1000, temperature=0.7):
+        """调用阿里云百炼API生成内容"""
+        response = _load_generation().call(
+            model=self.model,
+            prompt=prompt,
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        if response.status_code != 200:
+            raise LLMProviderError(f"阿里云百炼API调用失败: {response}")
+        return LLMResult(response.output.text, _usage_tokens(response))
+
+    def stream(self, prompt, max_tokens=1000, temperature=0.7):
+        """调用阿里云百炼API流式生成内容（每个响应只包含增量文本）"""
+        responses = _load_generation().call(
+            model=self.model,
+            prompt=prompt,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+            incremental_output=True
+        )
+        for response in responses:
+            if response.status_code != 200:
+                raise LLMProviderError(f"阿里云百炼API流式调用失败: {response}")
+            yield LLMResult(response.output.text, _usage_tokens(response))
+
+    def _http_client(self):
+        """异步HTTP客户端（首次异步调用时创建，连接在并发请求间复用）"""
+        if self._http is None:
+            import httpx
+            self._http = httpx.AsyncClient(
+                timeout=Config.LLM_CALL_TIMEOUT,
+                limits=httpx.Limits(max_connections=Config.LLM_ASYNC_MAX_CONCURRENCY)
+            )
+        return self._http
+
+    def _request(self, prompt, max_tokens, temperature, stream=False):
+        """构造HTTP接口的请求头和请求体"""
+        headers = {'Authorization': f"Bearer {Config.DASHSCOPE_API_KEY}"}
+        parameters = {'max_tokens': max_tokens, 'temperature': temperature}
+        if stream:
+            headers['X-DashScope-SSE'] = 'enable'
+            parameters['incremental_output'] = True
+        body = {'model': self.model, 'input': {'prompt': prompt}, 'parameters': parameters}
+        return headers, body
+
+    async def agenerate(self, prompt, max_tokens=1000, temperature=0.7):
+        """通过HTTP接口异步生成内容"""
+        headers, body = self._request(prompt, max_tokens, temperature)
+        response = await self._http_client().post(DASHSCOPE_GENERATION_URL, headers=headers, json=body)
+        if response.status_code != 200:
+            raise LLMProviderError(f"阿里云百炼API调用失败: {response.status_code} {response.text}")
+        data = response.json()
+        return LLMResult(data['output']['text'], _usage_tokens(data))
+
+    async def astream(self, prompt, max_tokens=1000, temperature=0.7):
+        """通过HTTP接口（Server-Sent Events）异步流式生成内容"""
+        headers, body = self._request(prompt, max_tokens, temperature, stream=True)
+        async with self._http_client().stream('POST', DASHSCOPE_GENERATION_URL, headers=headers, json=body) as response:
+            if response.status_code != 200:
+                await response.aread()
+                raise LLMProviderError(f"阿里云百炼API流式调用失败: {response.status_code} {response.text}")
+            async for line in response.aiter_lines():
+                if not line.startswith('data:'):
+                    continue
+                data = json.loads(line[len('data:'):])
+                if 'output' not in data:
+                    raise LLMProviderError(f"阿里云百炼API流式调用失败: {data}")
+                yield LLMResult(data['output'].get('text', ''), _usage_tokens(data))
+
+    async def aclose(self):
+        """关闭异步HTTP客户端"""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+class StubProvider(LLMProvider):
+    """本地模拟提供方（不访问网络）"""
+
+    name = 'stub'
+
+    # 模拟输出使用的词表
+    WORDS = ['Python', '函数', '变量', '循环', '列表', '字典', '类', '对象', '模块', '异常',
+             '装饰器', '生成器', '迭代', '索引', '参数', '返回值', '示例', '练习', '概念', '代码']
+
+    def __init__(self, latency=0.5, tokens_per_second=50, output_tokens=200, failure_rate=0.0, seed=0):
+        """
+        Args:
+            latency (float): 首个令牌前的等待时间（秒）
+            tokens_per_second (float): 生成速度（令牌/秒），0表示不限
+            output_tokens (int): 每次生成的令牌数（不超过max_tokens）
+            failure_rate (float): 调用失败的概率
+            seed (int): 失败序列的随机种子，相同种子下失败出现的位置相同
+        """
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls):
+        """根据Config创建模拟提供方"""
+        return cls(
+            latency=Config.STUB_LLM_LATENCY,
+            tokens_per_second=Config.STUB_LLM_TOKENS_PER_SECOND,
+            output_tokens=Config.STUB_LLM_OUTPUT_TOKENS,
+            failure_rate=Config.STUB_LLM_FAILURE_RATE,
+            seed=Config.STUB_LLM_SEED
+        )
+
+    def _should_fail(self):
+        """按失败率决定本次调用是否失败"""
+        with self._lock:
+            return self._random.random() < self.failure_rate
+
+    def _tokens(self, prompt, max_tokens):
+        """由提示词确定的输出令牌序列（相同提示词输出相同）"""
+        digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+        count = min(self.output_tokens, max_tokens)
+        return [self.WORDS[digest[i % len(digest)] % len(self.WORDS)] for i in range(count)]
+
+    def _prompt_tokens(self, prompt):
+        """估算提示词令牌数"""
+        return len(prompt.split()) + len(prompt) // 2
+
+    def _wait(self, tokens):
+        """模拟生成若干令牌所需的时间"""
+        if self.tokens_per_second:
+            time.sleep(tokens / self.tokens_per_second)
+
+    def generate(self, prompt, max_tokens=1000, temperature=0.7):
+        """模拟生成内容"""
+        time.sleep(self.latency)
+        if self._should_fail():
+            raise LLMProviderError("模拟大模型调用失败")
+        tokens = self._tokens(prompt, max_tokens)
+        self._wait(len(tokens))
+        return LLMResult(' '.join(tokens), self._prompt_tokens(prompt) + len(tokens))
+
+    def stream(self, prompt, max_tokens=1000, temperature=0.7):
+        """模拟流式生成内容，每个片段包含若干令牌"""
+        time.sleep(self.latency)
+        if self._should_fail():
+            raise LLMProviderError("模拟大模型流式调用失败")
+        tokens = self._tokens(prompt, max_tokens)
+        prompt_tokens = self._prompt_tokens(prompt)
+        chunk_size = 8
+        for start in range(0, len(tokens), chunk_size):
+            chunk = tokens[start:start + chunk_size]
+            self._wait(len(chunk))
+            yield LLMResult(' '.join(chunk) + ' ', prompt_tokens + start + len(chunk))
+
+    async def agenerate(self, prompt, max_tokens=1000, temperature=0.7):
+        """模拟异步生成内容（等待期间不占用线程）"""
+        await asyncio.sleep(self.latency)
+        if self._should_fail():
+            raise LLMProviderError("模拟大模型调用失败")
+        tokens = self._tokens(prompt, max_tokens)
+        if self.tokens_per_second:
+            await asyncio.sleep(len(tokens) / self.tokens_per_second)
+        return LLMResult(' '.join(tokens), self._prompt_tokens(prompt) + len(tokens))
+
+    async def astream(self, prompt, max_tokens=1000, temperature=0.7):
+        """模拟异步流式生成内容"""
+        await asyncio.sleep(self.latency)
+        if self._should_fail():
+            raise LLMProviderError("模拟大模型流式调用失败")
+        tokens = self._tokens(prompt, max_tokens)
+        prompt_tokens = self._prompt_tokens(prompt)
+        chunk_size = 8
+        for start in range(0, len(tokens), chunk_size):
+            chunk = tokens[start:start + chunk_size]
+            if self.tokens_per_second:
+                await asyncio.sleep(len(chunk) / self.tokens_per_second)
+            yield LLMResult(' '.join(chunk) + ' ', prompt_tokens + start + len(chunk))
+
+def create_provider(name=None):
+    """
+    根据配置创建大模型服务提供方
+
+    Args:
+        name (str): 提供方名称（dashscope/stub），默认使用Config.LLM_PROVIDER
+
+    Returns:
+        LLMProvider: 提供方
+    """
+    name = name or Config.LLM_PROVIDER
+    if name == 'stub':
+        return StubProvider.from_config()
+    if name != 'dashscope':
+        logger.warning(f"未知的大模型提供方 {name}，使用阿里云百炼API")
+    return DashScopeProvider(model=Config.LLM_MODEL)
@@ -4,6 +4,11 @@
 """
 
 from flask import request
+from bson import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime
+import base64
+import json
 import math
 
 class Paginator:
@@ -21,6 +26,7 @@ class Paginator:
         self.page = page or self._get_page_from_request()
         self.per_page = per_page or self._get_per_page_from_request()
         self.max_per_page = max_per_page
+        self.cursor = self._get_cursor_from_request()
         
         # 限制每页数量不超过最大值
         if self.per_page > self.max_per_page:
@@ -44,6 +50,14 @@ class Paginator:
         except (TypeError, ValueError):
             return 10
     
+    def _get_cursor_from_request(self):
+        """从请求中获取游标（未提供时返回None）"""
+        try:
+            return request.args.get('cursor') or None
+        except RuntimeError:
+            # 不在请求上下文中
+            return None
+    
     def paginate_list(self, items):
         """
         对列表进行分页
@@ -87,6 +101,47 @@ class Paginator:
             'pages': math.ceil(total / self.per_page)
         }
     
+    @staticmethod
+    def encode_cursor(sort_value, object_id):
+        """
+        生成不透明的游标，基于 (排序字段值, _id)
+        
+        Args:
+            sort_value (datetime): 排序字段值，可以为None
+            object_id (ObjectId): 文档ID
+            
+        Returns:
+            str: URL安全的游标字符串
+        """
+        payload = {
+            't': sort_value.isoformat() if isinstance(sort_value, datetime) else None,
+            'id': str(object_id)
+        }
+        raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+    
+    @staticmethod
+    def decode_cursor(cursor):
+        """
+        解析游标
+        
+        Args:
+            cursor (str): encode_cursor生成的游标
+            
+        Returns:
+            tuple: (排序字段值, ObjectId)
+            
+        Raises:
+            ValueError: 游标格式无效
+        """
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            sort_value = datetime.fromisoformat(payload['t']) if payload.get('t') else None
+            return sort_value, ObjectId(payload['id'])
+        except (TypeError, ValueError, KeyError, InvalidId, UnicodeError) as e:
+            raise ValueError(f"无效的分页游标: {cursor}") from e
+    
     @staticmethod
     def get_default_pagination():
         """
@@ -4,88 +4,200 @@
 """
 
 import json
-from datetime import datetime, timedelta
-from database import db
-from bson import ObjectId
-import base64
-from io import BytesIO
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime
+from config import Config
+from progress_tracker import ProgressTracker, NON_TOPIC_FIELDS
+from utils.user_loader import load_user
+from utils.chart_cache import ChartCache, make_chart_key
+from utils.chart_renderer import render_chart, matplotlib_available
 
-try:
-    import matplotlib
-    matplotlib.use('Agg')  # 使用非交互式后端
-    import matplotlib.pyplot as plt
-    matplotlib_available = True
-except ImportError:
-    matplotlib_available = False
-    plt = None
+logger = logging.getLogger(__name__)
+
+# 图表通过URL获取，缓存键为绘图数据的内容哈希
+CHART_URL = '/api/charts/{key}.png'
 
 class ProgressVisualizer:
     """进度可视化工具"""
     
+    # 图表渲染进程池（所有实例共享，首次使用时创建）
+    _render_pool = None
+    _render_pool_lock = threading.Lock()
+    
     def __init__(self):
         """初始化进度可视化工具"""
-        pass
+        self.chart_cache = ChartCache.from_config()
     
-    def generate_knowledge_map_chart(self, user_id):
+    def get_topic_mastery_data(self, user_id):
         """
-        生成知识掌握情况图表
+        获取各知识点掌握程度（知识掌握雷达图和柱状图的数据）
         
         Args:
             user_id (str): 用户ID
             
         Returns:
-            str: 图表的base64编码数据URL
+            dict: {'topics': [知识点], 'values': [掌握程度]}，没有知识点数据返回None
         """
-        if not matplotlib_available:
+        user = load_user(user_id, ['knowledge_graph'])
+        knowledge_graph = user.get('knowledge_graph', {}) if user else {}
+        
+        # 过滤掉非知识点数据
+        topics = {k: v for k, v in knowledge_graph.items() 
+                 if k not in NON_TOPIC_FIELDS and isinstance(v, (int, float))}
+        
+        if not topics:
             return None
+        
+        return {'topics': list(topics.keys()), 'values': list(topics.values())}
+    
+    def get_timeline_data(self, user_id, days=30):
+        """
+        获取最近N天每天的学习活动数（时间线图表的数据）
+        
+        Args:
+            user_id (str): 用户ID
+            days (int): 天数范围
             
-        try:
-            # 获取用户知识图谱
-            user = db.find_one('users', {'_id': ObjectId(user_id)})
-            knowledge_graph = user.get('knowledge_graph', {}) if user else {}
-            
-            # 过滤掉非知识点数据
-            topics = {k: v for k, v in knowledge_graph.items() 
-                     if k not in ['level', 'updated_at'] and isinstance(v, (int, float))}
-            
-            if not topics:
-                return None
-            
-            # 创建雷达图
-            fig, ax = plt.subplots(figsize=(8, 6), subplot_kw=dict(projection='polar'))
-            
-            # 准备数据
-            topic_names = list(topics.keys())
-            mastery_levels = list(topics.values())
-            
-            # 计算角度
-            angles = [n / float(len(topic_names)) * 2 * 3.14159 for n in range(len(topic_names))]
-            angles += angles[:1]  # 闭合图形
-            
-            # 添加数据
-            mastery_levels += mastery_levels[:1]  # 闭合图形
+        Returns:
+            dict: {'dates': [日期], 'values': [活动数]}
+        """
+        daily_activity = ProgressTracker.get_daily_activity(user_id, days)
+        return {'dates': list(daily_activity.keys()), 'values': list(daily_activity.values())}
+    
+    @classmethod
+    def _get_render_pool(cls):
+        """
+        获取共享的图表渲染进程池
+        
+        渲染在独立进程中执行，不占用请求线程的GIL。使用spawn方式启动子进程，
+        避免在多线程的Web进程中fork。
+        
+        Returns:
+            ProcessPoolExecutor: 进程池
+        """
+        if cls._render_pool is None:
+            with cls._render_pool_lock:
+                if cls._render_pool is None:
+                    cls._render_pool = ProcessPoolExecutor(
+                        max_workers=Config.CHART_POOL_WORKERS,
+                        mp_context=multiprocessing.get_context('spawn')
+                    )
+        return cls._render_pool
+    
+    @classmethod
+    def _reset_render_pool(cls, pool):
+        """渲染进程意外退出后丢弃进程池，下次使用时重新创建"""
+        with cls._render_pool_lock:
+            if cls._render_pool is pool:
+                cls._render_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+    
+    def submit_chart(self, chart_type, data):
+        """
+        提交图表渲染任务，缓存中已有时不再渲染
+        
+        渲染完成后在回调中写入缓存，因此即使调用方等待超时，结果也会被后续请求复用。
+        
+        Args:
+            chart_type (str): 图表类型
+            data (dict): 绘图数据
             
-            # 绘制
-            ax.plot(angles, mastery_levels, 'o-', linewidth=2, color='#4361ee')
-            ax.fill(angles, mastery_levels, alpha=0.25, color='#4361ee')
-            ax.set_xticks(angles[:-1])
-            ax.set_xticklabels(topic_names)
-            ax.set_ylim(0, 1)
-            ax.set_yticks([0.25, 0.5, 0.75, 1.0])
-            ax.set_yticklabels(['25%', '50%', '75%', '100%'])
-            ax.set_title('知识点掌握情况', pad=20)
+        Returns:
+            tuple: (缓存键, Future)，已缓存时Future为None；无数据或matplotlib不可用返回None
+        """
+        if not matplotlib_available or not data:
+            return None
+        
+        key = make_chart_key(chart_type, data)
+        if self.chart_cache.contains(key):
+            return key, None
+        
+        pool = self._get_render_pool()
+        try:
+            future = pool.submit(render_chart, chart_type, data)
+        except RuntimeError:
+            # 进程池已损坏（BrokenProcessPool 是 RuntimeError 的子类）
+            self._reset_render_pool(pool)
+            future = self._get_render_pool().submit(render_chart, chart_type, data)
+        
+        def store(done):
+            if not done.cancelled() and done.exception() is None:
+                self.chart_cache.set(key, done.result())
+        
+        future.add_done_callback(store)
+        return key, future
+    
+    def get_chart_url(self, chart_type, data, timeout=None):
+        """
+        获取图表URL，缓存中没有时先渲染并写入缓存
+        
+        Args:
+            chart_type (str): 图表类型
+            data (dict): 绘图数据
+            timeout (float): 渲染等待时间（秒），默认使用Config.CHART_RENDER_TIMEOUT
             
-            # 保存为base64
-            img_buffer = BytesIO()
-            plt.savefig(img_buffer, format='png', bbox_inches='tight')
-            img_buffer.seek(0)
-            img_str = base64.b64encode(img_buffer.read()).decode()
-            plt.close(fig)
+        Returns:
+            str: 图表URL，无数据、渲染失败或超时返回None
+        """
+        urls = self.get_chart_urls({chart_type: data}, timeout)
+        return urls[chart_type]
+    
+    def get_chart_urls(self, charts, timeout=None):
+        """
+        并行渲染多个图表，在时间预算内返回已就绪的图表URL
+        
+        Args:
+            charts (dict): {图表类型: 绘图数据}
+            timeout (float): 总等待时间（秒），默认使用Config.CHART_RENDER_TIMEOUT
             
-            return f"data:image/png;base64,{img_str}"
+        Returns:
+            dict: {图表类型: 图表URL}，未在预算内完成的图表为None
+        """
+        if timeout is None:
+            timeout = Config.CHART_RENDER_TIMEOUT
+        
+        submitted = {chart_type: self.submit_chart(chart_type, data) for chart_type, data in charts.items()}
+        
+        # 所有图表同时开始渲染，共享同一个截止时间
+        deadline = time.monotonic() + timeout
+        urls = {}
+        for chart_type, task in submitted.items():
+            urls[chart_type] = None
+            if task is None:
+                continue
+            key, future = task
+            if future is not None:
+                try:
+                    # 渲染结果由回调写入缓存
+                    future.result(timeout=max(0, deadline - time.monotonic()))
+                except FutureTimeoutError:
+                    logger.warning(f"渲染图表 {chart_type} 超时，本次返回不含该图表的报告")
+                    continue
+                except Exception as e:
+                    logger.error(f"渲染图表 {chart_type} 时出错: {e}")
+                    continue
+            urls[chart_type] = CHART_URL.format(key=key)
+        
+        return urls
+    
+    def generate_knowledge_map_chart(self, user_id):
+        """
+        生成知识掌握情况图表
+        
+        Args:
+            user_id (str): 用户ID
             
+        Returns:
+            str: 图表URL
+        """
+        try:
+            return self.get_chart_url('knowledge_map', self.get_topic_mastery_data(user_id))
         except Exception as e:
-            print(f"生成知识掌握情况图表时出错: {e}")
+            logger.error(f"生成知识掌握情况图表时出错: {e}")
             return None
     
     def generate_progress_timeline_chart(self, user_id, days=30):
@@ -97,68 +209,12 @@ class ProgressVisualizer:
             days (int): 天数范围
             
         Returns:
-            str: 图表的base64编码数据URL
+            str: 图表URL
         """
-        if not matplotlib_available:
-            return None
-            
         try:
-            # 获取用户学习历史
-            user = db.find_one('users', {'_id': ObjectId(user_id)})
-            learning_history = user.get('learning_history', []) if user else []
-            
-            # 计算日期范围
-            end_date = datetime.utcnow()
-            start_date = end_date - timedelta(days=days)
-            
-            # 按日期统计学习活动
-            daily_activity = {}
-            current_date = start_date
-            while current_date <= end_date:
-                date_str = current_date.strftime('%Y-%m-%d')
-                daily_activity[date_str] = 0
-                current_date += timedelta(days=1)
-            
-            # 统计学习历史
-            for activity in learning_history:
-                completed_at = activity.get('completed_at')
-                if completed_at and isinstance(completed_at, datetime):
-                    date_str = completed_at.strftime('%Y-%m-%d')
-                    if date_str in daily_activity:
-                        daily_activity[date_str] += 1
-            
-            # 创建折线图
-            fig, ax = plt.subplots(figsize=(10, 6))
-            
-            dates = list(daily_activity.keys())
-            activities = list(daily_activity.values())
-            
-            ax.plot(dates, activities, marker='o', linewidth=2, markersize=4, color='#4361ee')
-            ax.fill_between(dates, activities, alpha=0.25, color='#4361ee')
-            ax.set_xlabel('日期')
-            ax.set_ylabel('学习活动数')
-            ax.set_title(f'最近{days}天学习活动统计')
-            ax.grid(True, alpha=0.3)
-            
-            # 设置x轴标签间隔以避免重叠
-            if len(dates) > 10:
-                step = len(dates) // 10
-                ax.set_xticks(dates[::step])
-            
-            plt.xticks(rotation=45, ha='right')
-            plt.tight_layout()
-            
-            # 保存为base64
-            img_buffer = BytesIO()
-            plt.savefig(img_buffer, format='png', bbox_inches='tight')
-            img_buffer.seek(0)
-            img_str = base64.b64encode(img_buffer.read()).decode()
-            plt.close(fig)
-            
-            return f"data:image/png;base64,{img_str}"
-            
+            return self.get_chart_url('progress_timeline', self.get_timeline_data(user_id, days))
         except Exception as e:
-            print(f"生成学习进度时间线图表时出错: {e}")
+            logger.error(f"生成学习进度时间线图表时出错: {e}")
             return None
     
     def generate_topic_mastery_chart(self, user_id):
@@ -169,58 +225,12 @@ class ProgressVisualizer:
             user_id (str): 用户ID
             
         Returns:
-            str: 图表的base64编码数据URL
+            str: 图表URL
         """
-        if not matplotlib_available:
-            return None
-            
         try:
-            # 获取用户知识图谱
-            user = db.find_one('users', {'_id': ObjectId(user_id)})
-            knowledge_graph = user.get('knowledge_graph', {}) if user else {}
-            
-            # 过滤知识点数据
-            topics = {k: v for k, v in knowledge_graph.items() 
-                     if k not in ['level', 'updated_at'] and isinstance(v, (int, float))}
-            
-            if not topics:
-                return None
-            
-            # 创建柱状图
-            fig, ax = plt.subplots(figsize=(10, 6))
-            
-            topic_names = list(topics.keys())
-            mastery_levels = list(topics.values())
-            
-            bars = ax.bar(range(len(topic_names)), mastery_levels, 
-                         color=['#4361ee' if x < 0.5 else '#4cc9f0' if x < 0.8 else '#4caf50' 
-                               for x in mastery_levels])
-            
-            ax.set_xlabel('知识点')
-            ax.set_ylabel('掌握程度')
-            ax.set_title('各知识点掌握情况')
-            ax.set_xticks(range(len(topic_names)))
-            ax.set_xticklabels(topic_names, rotation=45, ha='right')
-            ax.set_ylim(0, 1)
-            
-            # 添加数值标签
-            for i, (bar, level) in enumerate(zip(bars, mastery_levels)):
-                ax.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.01,
-                       f'{level:.2f}', ha='center', va='bottom')
-            
-            plt.tight_layout()
-            
-            # 保存为base64
-            img_buffer = BytesIO()
-            plt.savefig(img_buffer, format='png', bbox_inches='tight')
-            img_buffer.seek(0)
-            img_str = base64.b64encode(img_buffer.read()).decode()
-            plt.close(fig)
-            
-            return f"data:image/png;base64,{img_str}"
-            
+            return self.get_chart_url('topic_mastery', self.get_topic_mastery_data(user_id))
         except Exception as e:
-            print(f"生成主题掌握情况图表时出错: {e}")
+            logger.error(f"生成主题掌握情况图表时出错: {e}")
             return None
     
     def get_progress_summary(self, user_id):
@@ -234,38 +244,30 @@ class ProgressVisualizer:
             dict: 进度摘要数据
         """
         try:
-            user = db.find_one('users', {'_id': ObjectId(user_id)})
+            user = load_user(user_id, ['knowledge_graph'])
             if not user:
                 return {}
             
             knowledge_graph = user.get('knowledge_graph', {})
-            learning_history = user.get('learning_history', [])
             
             # 计算统计数据
-            total_lessons = len(learning_history)
+            total_lessons = ProgressTracker.count_learning_history(user_id)
             completed_topics = len([k for k in knowledge_graph.keys() 
-                                  if k not in ['level', 'updated_at']])
+                                  if k not in NON_TOPIC_FIELDS])
             
             # 计算平均掌握程度
             mastery_values = [v for k, v in knowledge_graph.items() 
-                            if k not in ['level', 'updated_at'] and isinstance(v, (int, float))]
+                            if k not in NON_TOPIC_FIELDS and isinstance(v, (int, float))]
             avg_mastery = sum(mastery_values) / len(mastery_values) if mastery_values else 0
             
             # 计算学习趋势（最近7天的学习活动）
-            weekly_activity = self._calculate_weekly_activity(learning_history)
+            weekly_activity = list(ProgressTracker.get_daily_activity(user_id, 7).values())
             
             # 知识水平
             knowledge_level = knowledge_graph.get('level', 'beginner')
             
             # 最近学习活动
-            recent_activity = []
-            if learning_history:
-                sorted_history = sorted(
-                    learning_history, 
-                    key=lambda x: x.get('completed_at', datetime.min), 
-                    reverse=True
-                )
-                recent_activity = sorted_history[:5]  # 最近5个活动
+            recent_activity = ProgressTracker.get_learning_history(user_id, limit=5)  # 最近5个活动
             
             summary = {
                 'total_lessons_completed': total_lessons,
@@ -280,94 +282,95 @@ class ProgressVisualizer:
             return summary
             
         except Exception as e:
-            print(f"获取进度摘要时出错: {e}")
+            logger.error(f"获取进度摘要时出错: {e}")
             return {}
     
-    def _calculate_weekly_activity(self, learning_history):
+    def generate_learning_report(self, user_id, timeout=None):
         """
-        计算最近7天的学习活动
+        生成学习报告
+        
+        三个图表在渲染进程池中并行渲染。超出时间预算的图表返回None
+        （charts_complete为False），渲染会在后台完成并写入缓存，下次请求即可获得。
         
         Args:
-            learning_history (list): 学习历史记录列表
+            user_id (str): 用户ID
+            timeout (float): 图表渲染时间预算（秒），默认使用Config.CHART_RENDER_TIMEOUT
             
         Returns:
-            list: 每天的学习活动计数
+            dict: 学习报告数据
         """
-        if not learning_history:
-            return [0] * 7
-        
-        # 获取最近7天的日期
-        today = datetime.utcnow().date()
-        week_dates = [(today - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(6, -1, -1)]
+        # 获取进度摘要
+        summary = self.get_progress_summary(user_id)
         
-        # 统计每天的活动数
-        activity_count = {date: 0 for date in week_dates}
+        # 并行生成图表
+        charts = {}
+        try:
+            mastery_data = self.get_topic_mastery_data(user_id)
+            charts = self.get_chart_urls({
+                'knowledge_map': mastery_data,
+                'progress_timeline': self.get_timeline_data(user_id),
+                'topic_mastery': mastery_data
+            }, timeout)
+        except Exception as e:
+            logger.error(f"生成学习报告图表时出错: {e}")
         
-        for activity in learning_history:
-            completed_date = activity.get('completed_at')
-            if completed_date and isinstance(completed_date, datetime):
-                date_str = completed_date.date().strftime('%Y-%m-%d')
-                if date_str in activity_count:
-                    activity_count[date_str] += 1
+        chart_names = ['knowledge_map', 'progress_timeline', 'topic_mastery']
+        report = {
+            'summary': summary,
+            'charts': {name: charts.get(name) for name in chart_names},
+            'charts_complete': all(charts.get(name) for name in chart_names),
+            'generated_at': datetime.utcnow()
+        }
         
-        # 返回按日期顺序排列的活动数
-        return [activity_count[date] for date in week_dates]
+        return report
     
-    def generate_learning_report(self, user_id):
+    def get_learning_report_data(self, user_id):
         """
-        生成学习报告
+        生成只含数据序列的学习报告（由客户端绘制图表，不渲染图片）
         
         Args:
             user_id (str): 用户ID
             
         Returns:
-            dict: 学习报告数据
+            dict: 学习报告数据，series中为各图表的数据序列
         """
-        # 获取进度摘要
         summary = self.get_progress_summary(user_id)
+        mastery_data = self.get_topic_mastery_data(user_id) or {'topics': [], 'values': []}
         
-        # 生成图表
-        knowledge_map_chart = self.generate_knowledge_map_chart(user_id)
-        progress_timeline_chart = self.generate_progress_timeline_chart(user_id)
-        topic_mastery_chart = self.generate_topic_mastery_chart(user_id)
-        
-        report = {
+        return {
             'summary': summary,
-            'charts': {
-                'knowledge_map': knowledge_map_chart,
-                'progress_timeline': progress_timeline_chart,
-                'topic_mastery': topic_mastery_chart
+            'series': {
+                'knowledge_map': {'axes': mastery_data['topics'], 'values': mastery_data['values']},
+                'progress_timeline': self.get_timeline_data(user_id),
+                'topic_mastery': mastery_data
             },
             'generated_at': datetime.utcnow()
         }
-        
-        return report
     
-    def get_topic_progress(self, user_id, topic):
+    def get_topic_progress(self, user_id, topic, data_only=False):
         """
         获取特定主题的学习进度
         
         Args:
             user_id (str): 用户ID
             topic (str): 主题名称
+            data_only (bool): 为True时用按天汇总的数据序列代替最近活动列表
             
         Returns:
             dict: 主题学习进度
         """
         try:
-            user = db.find_one('users', {'_id': ObjectId(user_id)})
+            user = load_user(user_id, ['knowledge_graph'])
             if not user:
                 return {}
             
             knowledge_graph = user.get('knowledge_graph', {})
-            learning_history = user.get('learning_history', [])
             
             # 获取主题掌握程度
             mastery = knowledge_graph.get(topic, 0)
             
-            # 统计该主题的学习活动
-            topic_activities = [activity for activity in learning_history 
-                              if activity.get('topic') == topic]
+            # 统计该主题的学习活动（按完成时间正序）
+            topic_activities = ProgressTracker.get_topic_learning_history(user_id, topic)
             
             # 计算相关统计数据
             time_spent = sum(activity.get('time_spent', 0) for activity in topic_activities)
@@ -379,15 +382,48 @@ class ProgressVisualizer:
                                    if activity.get('type') == 'exercise' and activity.get('correct', False)])
             accuracy = correct_exercises / exercises_completed if exercises_completed > 0 else 0
             
-            return {
+            progress = {
                 'topic': topic,
                 'mastery': mastery,
                 'time_spent': time_spent,
                 'exercises_completed': exercises_completed,
-                'accuracy': round(accuracy, 2),
-                'activities': topic_activities[-10:]  # 最近10个活动
+                'accuracy': round(accuracy, 2)
             }
+            if data_only:
+                progress['series'] = self._topic_daily_series(topic_activities)
+            else:
+                progress['activities'] = topic_activities[-10:]  # 最近10个活动
+            return progress
             
         except Exception as e:
-            print(f"获取主题进度时出错: {e}")
-            return {}
\ No newline at end of file
+            logger.error(f"获取主题进度时出错: {e}")
+            return {}
+    
+    def _topic_daily_series(self, topic_activities):
+        """
+        按天汇总主题学习活动
+        
+        Args:
+            topic_activities (list): 按完成时间正序的学习活动
+            
+        Returns:
+            dict: {'dates': [日期], 'activities': [活动数], 'accuracy': [当天练习正确率，无练习为None]}
+        """
+        daily = {}
+        for activity in topic_activities:
+            completed_at = activity.get('completed_at')
+            if not isinstance(completed_at, datetime):
+                continue
+            day = daily.setdefault(completed_at.strftime('%Y-%m-%d'), [0, 0, 0])
+            day[0] += 1
+            if activity.get('type') == 'exercise':
+                day[1] += 1
+                if activity.get('correct', False):
+                    day[2] += 1
+        
+        dates = list(daily.keys())
+        return {
+            'dates': dates,
+            'activities': [daily[date][0] for date in dates],
+            'accuracy': [round(daily[date][2] / daily[date][1], 2) if daily[date][1] else None for date in dates]
+        }
\ No newline at end of file
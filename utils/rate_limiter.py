@@ -0,0 +1,304 @@
+"""
+限流模块
+使用滑动窗口计数算法限制请求频率：只保存当前窗口和上一窗口的计数，
+按上一窗口在滑动窗口内所占比例加权估算请求数，每次检查都是O(1)。
+支持进程内后端和多个工作进程共享的Redis后端
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from flask import request
+
+from config import Config
+from utils.response import ResponseUtil
+
+logger = logging.getLogger(__name__)
+
+# 限流检查结果：是否允许、估算的请求数、剩余次数、建议重试等待秒数
+RateLimitResult = namedtuple('RateLimitResult', ['allowed', 'count', 'remaining', 'retry_after'])
+
+class MemoryRateLimitBackend:
+    """进程内限流计数后端（条目在两个窗口后过期，按最近更新顺序淘汰）"""
+
+    def __init__(self, max_entries=100000):
+        """
+        初始化计数后端
+
+        Args:
+            max_entries (int): 最大计数条目数（超过时淘汰最久未更新的条目）
+        """
+        self.max_entries = max_entries
+        # 键 -> [窗口序号, 当前窗口计数, 上一窗口计数, 过期时间]
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _counts(self, key, window_id):
+        """读取键在指定窗口的 (当前计数, 上一窗口计数)，需持有锁"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return 0, 0
+        stored_window, current, previous, _ = entry
+        if stored_window == window_id:
+            return current, previous
+        if stored_window == window_id - 1:
+            return 0, current
+        return 0, 0
+
+    def _evict_expired(self, now):
+        """淘汰过期条目：条目按更新时间排列，只需检查队首，需持有锁"""
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry[3] > now and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[key]
+
+    def increment(self, key, window_id, ttl):
+        """
+        当前窗口计数加一
+
+        Args:
+            key (str): 限流键
+            window_id (int): 当前窗口序号
+            ttl (float): 计数保留时间（秒）
+
+        Returns:
+            tuple: (当前窗口计数, 上一窗口计数)
+        """
+        now = time.time()
+        with self._lock:
+            current, previous = self._counts(key, window_id)
+            current += 1
+            self._entries[key] = [window_id, current, previous, now + ttl]
+            self._entries.move_to_end(key)
+            self._evict_expired(now)
+            return current, previous
+
+    def get(self, key, window_id):
+        """
+        读取计数
+
+        Args:
+            key (str): 限流键
+            window_id (int): 当前窗口序号
+
+        Returns:
+            tuple: (当前窗口计数, 上一窗口计数)
+        """
+        with self._lock:
+            return self._counts(key, window_id)
+
+    def reset(self, key, window_id):
+        """清除键的计数"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        """当前计数条目数"""
+        return len(self._entries)
+
+class RedisRateLimitBackend:
+    """基于Redis的共享限流计数后端（每个窗口一个计数键，到期由Redis自动删除）"""
+
+    def __init__(self, url=None):
+        """
+        初始化Redis计数后端
+
+        Args:
+            url (str): Redis连接字符串，默认使用Config.REDIS_URL
+        """
+        import redis
+        self.client = redis.Redis.from_url(url or Config.REDIS_URL)
+
+    @staticmethod
+    def _window_key(key, window_id):
+        """窗口计数键"""
+        return f"ratelimit:{key}:{window_id}"
+
+    def increment(self, key, window_id, ttl):
+        """当前窗口计数加一，返回 (当前窗口计数, 上一窗口计数)"""
+        pipe = self.client.pipeline()
+        pipe.incr(self._window_key(key, window_id))
+        pipe.expire(self._window_key(key, window_id), math.ceil(ttl))
+        pipe.get(self._window_key(key, window_id - 1))
+        current, _, previous = pipe.execute()
+        return int(current), int(previous or 0)
+
+    def get(self, key, window_id):
+        """读取计数，返回 (当前窗口计数, 上一窗口计数)"""
+        current, previous = self.client.mget(
+            self._window_key(key, window_id),
+            self._window_key(key, window_id - 1)
+        )
+        return int(current or 0), int(previous or 0)
+
+    def reset(self, key, window_id):
+        """清除键在当前和上一窗口的计数"""
+        self.client.delete(self._window_key(key, window_id), self._window_key(key, window_id - 1))
+
+class RateLimiter:
+    """滑动窗口限流器"""
+
+    def __init__(self, name, limit, window, backend=None):
+        """
+        初始化限流器
+
+        Args:
+            name (str): 限流器名称（作为计数键前缀，区分不同接口）
+            limit (int): 窗口内允许的最大请求数
+            window (int): 窗口长度（秒）
+            backend: 计数后端，需实现 increment/get/reset，默认使用进程内后端
+        """
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.backend = backend if backend is not None else MemoryRateLimitBackend()
+        # 共享后端不可用时退回进程内计数，保证限流仍然生效
+        self.fallback = self.backend if isinstance(self.backend, MemoryRateLimitBackend) else MemoryRateLimitBackend()
+
+    @classmethod
+    def from_config(cls, name, limit, window):
+        """
+        根据Config创建限流器（RATE_LIMIT_BACKEND: memory/redis）
+
+        Args:
+            name (str): 限流器名称
+            limit (int): 窗口内允许的最大请求数
+            window (int): 窗口长度（秒）
+
+        Returns:
+            RateLimiter: 限流器
+        """
+        backend = None
+        if Config.RATE_LIMIT_BACKEND == 'redis':
+            try:
+                backend = RedisRateLimitBackend()
+            except Exception as e:
+                logger.warning(f"初始化Redis限流后端失败，使用进程内计数: {e}")
+        return cls(name, limit, window, backend=backend)
+
+    def _call_backend(self, method, *args):
+        """调用计数后端，出错时改用进程内后端"""
+        try:
+            return getattr(self.backend, method)(*args)
+        except Exception as e:
+            logger.warning(f"限流后端 {method} 调用失败，使用进程内计数: {e}")
+            return getattr(self.fallback, method)(*args)
+
+    def _result(self, current, previous, elapsed, counted=True):
+        """
+        根据两个窗口的计数估算滑动窗口内的请求数
+
+        Args:
+            current (int): 当前窗口计数（含本次请求）
+            previous (int): 上一窗口计数
+            elapsed (float): 当前窗口已经过的秒数
+            counted (bool): 本次请求是否已写入计数（hit会计入被拒绝的请求，peek不计数）
+
+        Returns:
+            RateLimitResult: 检查结果，retry_after为重试请求能被允许的最短等待时间
+        """
+        weight = 1 - elapsed / self.window
+        count = previous * weight + current
+        allowed = count <= self.limit
+        retry_after = 0
+        if not allowed:
+            # 重试时当前窗口的计数：已计数的被拒绝请求不会撤销，重试还要再加一
+            stored = current if counted else current - 1
+            retried = stored + 1
+            if retried <= self.limit:
+                # 等待上一窗口的权重衰减到足以容纳重试请求
+                retry_after = self.window * (1 - (self.limit - retried) / previous) - elapsed
+            else:
+                # 当前窗口已满，等待本窗口结束，并衰减到下一窗口中还能容纳一个请求
+                retry_after = (self.window - elapsed) + self.window * (1 - (self.limit - 1) / stored)
+        return RateLimitResult(
+            allowed=allowed,
+            count=count,
+            remaining=max(0, int(self.limit - count)),
+            retry_after=max(1, math.ceil(retry_after)) if retry_after > 0 else 0
+        )
+
+    def _window(self):
+        """当前窗口序号及已经过的秒数"""
+        now = time.time()
+        window_id = int(now // self.window)
+        return window_id, now - window_id * self.window
+
+    def hit(self, key):
+        """
+        记录一次请求并检查是否超过限制
+
+        Args:
+            key (str): 限流键，例如用户ID或IP地址
+
+        Returns:
+            RateLimitResult: 检查结果（含本次请求）
+        """
+        window_id, elapsed = self._window()
+        current, previous = self._call_backend('increment', f"{self.name}:{key}", window_id, 2 * self.window)
+        return self._result(current, previous, elapsed)
+
+    def peek(self, key):
+        """
+        检查再发起一次请求是否会超过限制（不计数）
+
+        Args:
+            key (str): 限流键
+
+        Returns:
+            RateLimitResult: 检查结果，allowed表示下一次请求是否被允许
+        """
+        window_id, elapsed = self._window()
+        current, previous = self._call_backend('get', f"{self.name}:{key}", window_id)
+        return self._result(current + 1, previous, elapsed, counted=False)
+
+    def reset(self, key):
+        """
+        清除限流键的计数
+
+        Args:
+            key (str): 限流键
+        """
+        window_id, _ = self._window()
+        self._call_backend('reset', f"{self.name}:{key}", window_id)
+
+def client_ip():
+    """获取客户端IP地址（优先使用反向代理设置的X-Real-IP）"""
+    return request.environ.get('HTTP_X_REAL_IP', request.remote_addr)
+
+def rate_limit(limiter, key_func=None):
+    """
+    装饰器：按用户或IP限流，超过限制时返回429并携带Retry-After
+
+    放在token_required之后时按用户ID限流，否则按客户端IP限流。
+
+    Args:
+        limiter (RateLimiter): 限流器
+        key_func (callable): 自定义限流键函数
+
+    Returns:
+        callable: 装饰器
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if key_func:
+                key = key_func()
+            else:
+                user_id = getattr(request, 'user_id', None)
+                key = f"user:{user_id}" if user_id else f"ip:{client_ip()}"
+
+            result = limiter.hit(key)
+            if not result.allowed:
+                logger.warning(f"{limiter.name} 请求过于频繁: {key}")
+                return ResponseUtil.too_many_requests(retry_after=result.retry_after)
+            return f(*args, **kwargs)
+
+        return decorated
+
+    return decorator
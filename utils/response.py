@@ -3,7 +3,8 @@
 用于生成标准化的API响应
 """
 
-from flask import jsonify
+from flask import jsonify, request, Response, stream_with_context
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -60,16 +61,33 @@ class ResponseUtil:
         return jsonify(response), status_code
     
     @staticmethod
-    def paginated(data, page, per_page, total, message="获取成功"):
+    def too_many_requests(message="请求过于频繁，请稍后再试", retry_after=1):
+        """
+        生成429限流响应，通过Retry-After告知客户端等待时间
+        
+        Args:
+            message (str): 错误消息
+            retry_after (int): 建议等待秒数
+            
+        Returns:
+            tuple: (Response, status_code)
+        """
+        response, status_code = ResponseUtil.error(message, 429, {'retry_after': retry_after})
+        response.headers['Retry-After'] = str(retry_after)
+        return response, status_code
+    
+    @staticmethod
+    def paginated(data, page, per_page, total, message="获取成功", next_cursor=None):
         """
         生成分页响应
         
         Args:
             data (list): 数据列表
-            page (int): 当前页码
+            page (int): 当前页码，游标分页时为None
             per_page (int): 每页数量
-            total (int): 总数量
+            total (int): 总数量，未统计时为None
             message (str): 响应消息
+            next_cursor (str): 下一页游标，没有更多数据时为None
             
         Returns:
             tuple: (Response, status_code)
@@ -82,9 +100,56 @@ class ResponseUtil:
                 'page': page,
                 'per_page': per_page,
                 'total': total,
-                'pages': (total + per_page - 1) // per_page  # 向上取整计算总页数
+                # 向上取整计算总页数
+                'pages': (total + per_page - 1) // per_page if total is not None else None,
+                'next_cursor': next_cursor
             }
         }
         
         logger.debug(f"分页响应: 第{page}页，共{total}条记录")
-        return jsonify(response), 200
\ No newline at end of file
+        return jsonify(response), 200
+    
+    @staticmethod
+    def event_stream(events):
+        """
+        生成Server-Sent Events流式响应
+        
+        Args:
+            events (iterable): (事件名, 数据) 元组的迭代器，事件名为None时使用默认的message事件
+            
+        Returns:
+            Response: text/event-stream响应
+        """
+        def generate():
+            for event, data in events:
+                payload = json.dumps(data, ensure_ascii=False, default=str)
+                if event:
+                    yield f"event: {event}\ndata: {payload}\n\n"
+                else:
+                    yield f"data: {payload}\n\n"
+        
+        response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        # 禁止Nginx等反向代理缓冲，保证片段立即送达客户端
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+    
+    @staticmethod
+    def cached_content(content, mimetype, etag, max_age=86400):
+        """
+        生成带ETag的可缓存响应，客户端携带匹配的If-None-Match时返回304
+        
+        Args:
+            content (bytes): 响应内容
+            mimetype (str): 内容类型
+            etag (str): 实体标签（内容哈希）
+            max_age (int): 客户端缓存时间（秒）
+            
+        Returns:
+            Response: 200或304响应
+        """
+        response = Response(content, mimetype=mimetype)
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.max_age = max_age
+        return response.make_conditional(request)
@@ -14,6 +14,7 @@ import jwt
 import secrets
 import hashlib
 import re
+import time
 from datetime import datetime, timedelta
 from config import Config
 import logging
@@ -87,7 +88,8 @@ class SecurityUtil:
                 'user_id': user_id,
                 'username': username,
                 'exp': datetime.utcnow() + timedelta(days=expires_in),
-                'iat': datetime.utcnow()
+                # 保留小数部分：修改密码后同一秒内签发的新令牌不会被当作吊销前签发的令牌
+                'iat': time.time()
             }
             token = jwt.encode(payload, Config.JWT_SECRET_KEY, algorithm='HS256')
             return token
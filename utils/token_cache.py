@@ -0,0 +1,308 @@
+"""
+令牌验证缓存模块
+缓存最近验证通过的JWT，避免每个请求都重新解码和校验签名。
+已吊销的令牌（登出）和用户（修改密码、退出全部会话）记录在多个工作进程共享的存储中
+（MongoDB或Redis），保留到令牌过期为止。
+
+为了不让每个请求都访问共享存储，确认未吊销的令牌在进程内缓存revocation_check_ttl秒：
+本进程发起的吊销立即生效，其他工作进程发起的吊销最迟在revocation_check_ttl秒后生效。
+"""
+
+import datetime
+import hashlib
+import logging
+import threading
+import time
+
+from config import Config
+from utils.llm_cache import MemoryCache
+
+logger = logging.getLogger(__name__)
+
+TOKEN_REVOCATIONS_COLLECTION = 'token_revocations'
+
+class MongoRevocationStore:
+    """基于MongoDB的吊销记录存储（依赖expires_at上的TTL索引清理过期记录）"""
+
+    def __init__(self, collection_name=TOKEN_REVOCATIONS_COLLECTION):
+        """
+        初始化吊销记录存储（不在此处连接数据库）
+
+        Args:
+            collection_name (str): 集合名称
+        """
+        self.collection_name = collection_name
+
+    def _collection(self):
+        """吊销记录集合"""
+        from database import db
+        return db.get_collection(self.collection_name)
+
+    def add(self, key, ttl, revoked_at=None):
+        """
+        记录吊销
+
+        Args:
+            key (str): 令牌键或用户键
+            ttl (float): 保留时间（秒）
+            revoked_at (float): 吊销时间戳（用户键使用，早于该时间签发的令牌失效）
+        """
+        expires_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=ttl)
+        self._collection().update_one(
+            {'_id': key}, {'$set': {'expires_at': expires_at, 'revoked_at': revoked_at}}, upsert=True
+        )
+
+    def lookup(self, keys):
+        """
+        一次查询多个键的吊销记录（TTL索引的清理有延迟，读取时再判断一次）
+
+        Args:
+            keys (list): 令牌键或用户键
+
+        Returns:
+            dict: {键: 吊销时间戳}，没有吊销记录的键不在结果中
+        """
+        cursor = self._collection().find(
+            {'_id': {'$in': keys}, 'expires_at': {'$gt': datetime.datetime.utcnow()}},
+            {'revoked_at': 1}
+        )
+        return {doc['_id']: doc.get('revoked_at') for doc in cursor}
+
+class RedisRevocationStore:
+    """基于Redis的吊销记录存储（到期由Redis自动删除）"""
+
+    def __init__(self, url=None):
+        """
+        初始化吊销记录存储
+
+        Args:
+            url (str): Redis连接字符串，默认使用Config.REDIS_URL
+        """
+        import redis
+        self.client = redis.Redis.from_url(url or Config.REDIS_URL)
+
+    def add(self, key, ttl, revoked_at=None):
+        """记录吊销，保留ttl秒"""
+        self.client.set(f"revoked:{key}", revoked_at if revoked_at is not None else '', ex=max(1, int(ttl)))
+
+    def lookup(self, keys):
+        """一次查询多个键的吊销记录，返回 {键: 吊销时间戳}"""
+        values = self.client.mget([f"revoked:{key}" for key in keys])
+        return {key: float(value) if value else None for key, value in zip(keys, values) if value is not None}
+
+def create_revocation_store():
+    """
+    根据Config创建吊销记录存储（TOKEN_REVOCATION_BACKEND: mongo/redis）
+
+    Returns:
+        吊销记录存储，需实现 add/lookup
+    """
+    if Config.TOKEN_REVOCATION_BACKEND == 'redis':
+        try:
+            return RedisRevocationStore()
+        except Exception as e:
+            logger.warning(f"初始化Redis吊销记录存储失败，使用MongoDB: {e}")
+    return MongoRevocationStore()
+
+class TokenCache:
+    """进程内的已验证令牌缓存（吊销记录保存在共享存储中）"""
+
+    def __init__(self, max_entries=10000, ttl=300, max_token_lifetime=7 * 24 * 3600, revocations=None,
+                 revocation_check_ttl=10, fail_open=False):
+        """
+        初始化令牌缓存
+
+        Args:
+            max_entries (int): 最大缓存条目数
+            ttl (int): 缓存有效期（秒），实际有效期为 min(令牌剩余有效期, ttl)
+            max_token_lifetime (int): 令牌最长有效期（秒），用户吊销记录和没有exp的令牌吊销记录保留这么久
+            revocations: 共享的吊销记录存储，需实现 add/lookup，默认使用MongoDB
+            revocation_check_ttl (float): 确认未吊销的令牌多少秒内不再查询共享存储
+            fail_open (bool): 共享存储不可用且令牌近期未确认过时是否放行。
+                默认拒绝：存储故障期间已登出的令牌不会重新生效，代价是未确认过的令牌暂时无法使用
+        """
+        self.ttl = ttl
+        self.max_token_lifetime = max_token_lifetime
+        self.revocations = revocations if revocations is not None else MongoRevocationStore()
+        self.revocation_check_ttl = revocation_check_ttl
+        self.fail_open = fail_open
+        self._verified = MemoryCache(max_entries)
+        # 本进程已确认吊销的令牌、已知的用户吊销时间，以及近期确认未吊销的令牌
+        self._revoked_tokens = MemoryCache(max_entries)
+        self._revoked_users = MemoryCache(max_entries)
+        self._not_revoked = MemoryCache(max_entries)
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'revoked': 0, 'revocation_lookups': 0, 'revocation_errors': 0}
+
+    @classmethod
+    def from_config(cls):
+        """根据Config创建令牌缓存"""
+        return cls(
+            max_entries=Config.TOKEN_CACHE_MAX_ENTRIES,
+            ttl=Config.TOKEN_CACHE_TTL,
+            revocations=create_revocation_store(),
+            revocation_check_ttl=Config.TOKEN_REVOCATION_CHECK_TTL,
+            fail_open=Config.TOKEN_REVOCATION_FAIL_OPEN
+        )
+
+    @staticmethod
+    def _key(token):
+        """令牌的缓存键（不保存令牌原文）"""
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _user_key(user_id):
+        """用户吊销记录的键"""
+        return f"user:{user_id}"
+
+    @staticmethod
+    def _issued_before(payload, revoked_at):
+        """令牌是否在用户吊销之前签发（没有iat的令牌视为之前签发）"""
+        iat = payload.get('iat') if payload else None
+        return iat is None or iat <= revoked_at
+
+    def get(self, token):
+        """
+        获取已验证令牌的载荷
+
+        Args:
+            token (str): JWT令牌
+
+        Returns:
+            dict: 令牌载荷，未命中返回None
+        """
+        payload = self._verified.get(self._key(token))
+        with self._lock:
+            self.counters['hits' if payload is not None else 'misses'] += 1
+        return payload
+
+    def put(self, token, payload):
+        """
+        缓存验证通过的令牌
+
+        Args:
+            token (str): JWT令牌
+            payload (dict): 令牌载荷
+        """
+        ttl = self.ttl
+        exp = payload.get('exp')
+        if exp is not None:
+            ttl = min(ttl, exp - time.time())
+        if ttl > 0:
+            self._verified.set(self._key(token), payload, ttl)
+
+    def _remaining_lifetime(self, payload):
+        """令牌剩余有效期（秒）"""
+        if payload and payload.get('exp') is not None:
+            return max(1, payload['exp'] - time.time())
+        return self.max_token_lifetime
+
+    def revoke(self, token, payload=None):
+        """
+        吊销单个令牌（例如用户登出），吊销记录保留到令牌过期
+
+        Args:
+            token (str): JWT令牌
+            payload (dict): 令牌载荷，用于确定吊销记录的保留时间
+
+        Raises:
+            Exception: 共享存储写入失败（登出不能在只有本进程生效的情况下报告成功）
+        """
+        key = self._key(token)
+        ttl = self._remaining_lifetime(payload)
+        self._verified.delete(key)
+        self._not_revoked.delete(key)
+        self._revoked_tokens.set(key, True, ttl)
+        self.revocations.add(key, ttl)
+
+    def revoke_user(self, user_id):
+        """
+        吊销用户在此之前签发的全部令牌（例如修改密码、退出全部会话）
+
+        Args:
+            user_id (str): 用户ID
+
+        Returns:
+            float: 吊销时间戳，之后签发的令牌不受影响
+
+        Raises:
+            Exception: 共享存储写入失败
+        """
+        user_key = self._user_key(user_id)
+        revoked_at = time.time()
+        self._revoked_users.set(user_key, revoked_at, self.max_token_lifetime)
+        self.revocations.add(user_key, self.max_token_lifetime, revoked_at)
+        return revoked_at
+
+    def is_revoked(self, token, payload):
+        """
+        检查令牌是否已被吊销（包括缓存命中的令牌）
+
+        先检查本进程的记录；近期确认未吊销的令牌不再查询共享存储，
+        否则一次查询同时检查令牌和所属用户的吊销记录。
+
+        Args:
+            token (str): JWT令牌
+            payload (dict): 令牌载荷
+
+        Returns:
+            bool: 是否已吊销（共享存储不可用时按fail_open决定）
+        """
+        key = self._key(token)
+        user_key = self._user_key(payload.get('user_id'))
+        if self._revoked_tokens.get(key):
+            return True
+        revoked_at = self._revoked_users.get(user_key)
+        if revoked_at is not None and self._issued_before(payload, revoked_at):
+            self._mark_revoked(key, payload)
+            return True
+        if self._not_revoked.get(key):
+            return False
+
+        try:
+            records = self.revocations.lookup([key, user_key])
+            self._count('revocation_lookups')
+        except Exception as e:
+            self._count('revocation_errors')
+            if self.fail_open:
+                logger.warning(f"读取令牌吊销记录失败，放行请求: {e}")
+                return False
+            logger.error(f"读取令牌吊销记录失败，拒绝请求: {e}")
+            return True
+
+        revoked = key in records
+        revoked_at = records.get(user_key)
+        if revoked_at is not None:
+            self._revoked_users.set(user_key, revoked_at, self.max_token_lifetime)
+            revoked = revoked or self._issued_before(payload, revoked_at)
+        if revoked:
+            self._mark_revoked(key, payload)
+        else:
+            self._not_revoked.set(key, True, self.revocation_check_ttl)
+        return revoked
+
+    def _mark_revoked(self, key, payload):
+        """在本进程记录已吊销的令牌"""
+        self._verified.delete(key)
+        self._not_revoked.delete(key)
+        self._revoked_tokens.set(key, True, self._remaining_lifetime(payload))
+        self._count('revoked')
+
+    def _count(self, name):
+        """累加计数器"""
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        """
+        获取缓存命中统计（仅限当前工作进程）
+
+        Returns:
+            dict: 命中、未命中次数、命中率、拒绝的已吊销令牌数，以及查询共享存储的次数和失败次数
+        """
+        with self._lock:
+            counters = dict(self.counters)
+        lookups = counters['hits'] + counters['misses']
+        counters['hit_rate'] = round(counters['hits'] / lookups, 4) if lookups else 0.0
+        counters['size'] = len(self._verified)
+        return counters
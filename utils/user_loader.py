@@ -0,0 +1,70 @@
+"""
+用户文档加载模块
+在单个请求内缓存用户文档，同一请求中每个用户最多读取一次数据库，且只读取需要的字段
+"""
+
+from flask import g, has_app_context
+from bson import ObjectId
+from database import db
+
+def load_user(user_id, fields=None):
+    """
+    加载用户文档
+
+    在请求上下文中，结果按用户ID缓存在flask.g上；已加载的字段不会重复读取，
+    仅在需要新字段时补充读取缺少的部分。不在请求上下文中（例如Celery任务）时直接查询数据库。
+
+    Args:
+        user_id (str): 用户ID
+        fields (list): 需要的顶层字段，None表示全部字段
+
+    Returns:
+        dict: 用户文档，用户不存在返回None
+    """
+    query = {'_id': ObjectId(user_id)}
+    if not has_app_context():
+        return db.find_one('users', query, _projection(fields))
+
+    cache = g.setdefault('_user_cache', {})
+    key = str(user_id)
+    entry = cache.get(key)
+
+    if entry is not None:
+        loaded_fields = entry['fields']
+        if entry['doc'] is None or loaded_fields is None:
+            return entry['doc']
+        if fields is not None and set(fields) <= loaded_fields:
+            return entry['doc']
+
+        # 只补充读取缺少的字段
+        missing = None if fields is None else set(fields) - loaded_fields
+        doc = db.find_one('users', query, _projection(missing))
+        if doc is None:
+            entry['doc'] = None
+        else:
+            entry['doc'].update(doc)
+        entry['fields'] = None if fields is None else loaded_fields | missing
+        return entry['doc']
+
+    doc = db.find_one('users', query, _projection(fields))
+    cache[key] = {
+        'fields': None if fields is None else set(fields),
+        'doc': doc
+    }
+    return doc
+
+def invalidate_user(user_id):
+    """
+    清除当前请求中缓存的用户文档（写入用户文档后调用）
+
+    Args:
+        user_id (str): 用户ID
+    """
+    if has_app_context():
+        g.get('_user_cache', {}).pop(str(user_id), None)
+
+def _projection(fields):
+    """将字段列表转换为MongoDB投影"""
+    if fields is None:
+        return None
+    return {field: 1 for field in fields}
@@ -96,6 +96,60 @@ class Validator:
         
         raise ValidationError(f"{field_name} 必须是布尔值", field_name)
 
+def validate_data(schema, data):
+    """
+    按验证规则验证数据
+    
+    Args:
+        schema (dict): 验证规则字典，格式见validate_request
+        data (dict): 待验证的数据
+        
+    Returns:
+        dict: 验证后的数据
+        
+    Raises:
+        ValidationError: 验证失败
+    """
+    validated_data = {}
+    
+    for field_name, rules in schema.items():
+        value = data.get(field_name)
+        
+        # 检查必需字段
+        if rules.get('required', False):
+            Validator.required(field_name, value)
+        
+        # 如果字段为空且非必需，跳过其他验证
+        if value is None and not rules.get('required', False):
+            validated_data[field_name] = value
+            continue
+        
+        # 根据类型进行验证
+        field_type = rules.get('type', 'string')
+        
+        if field_type == 'string':
+            validated_data[field_name] = Validator.string(
+                field_name, 
+                value, 
+                rules.get('min_length', 0), 
+                rules.get('max_length')
+            )
+        elif field_type == 'email':
+            validated_data[field_name] = Validator.email(field_name, value)
+        elif field_type == 'integer':
+            validated_data[field_name] = Validator.integer(
+                field_name, 
+                value, 
+                rules.get('min_value'), 
+                rules.get('max_value')
+            )
+        elif field_type == 'boolean':
+            validated_data[field_name] = Validator.boolean(field_name, value)
+        else:
+            validated_data[field_name] = value
+    
+    return validated_data
+
 def validate_request(schema):
     """
     装饰器：验证请求参数
@@ -118,47 +172,9 @@ def validate_request(schema):
         def decorated_function(*args, **kwargs):
             data = request.get_json() or request.form.to_dict() or {}
             
-            validated_data = {}
-            
             try:
-                for field_name, rules in schema.items():
-                    value = data.get(field_name)
-                    
-                    # 检查必需字段
-                    if rules.get('required', False):
-                        Validator.required(field_name, value)
-                    
-                    # 如果字段为空且非必需，跳过其他验证
-                    if value is None and not rules.get('required', False):
-                        validated_data[field_name] = value
-                        continue
-                    
-                    # 根据类型进行验证
-                    field_type = rules.get('type', 'string')
-                    
-                    if field_type == 'string':
-                        validated_data[field_name] = Validator.string(
-                            field_name, 
-                            value, 
-                            rules.get('min_length', 0), 
-                            rules.get('max_length')
-                        )
-                    elif field_type == 'email':
-                        validated_data[field_name] = Validator.email(field_name, value)
-                    elif field_type == 'integer':
-                        validated_data[field_name] = Validator.integer(
-                            field_name, 
-                            value, 
-                            rules.get('min_value'), 
-                            rules.get('max_value')
-                        )
-                    elif field_type == 'boolean':
-                        validated_data[field_name] = Validator.boolean(field_name, value)
-                    else:
-                        validated_data[field_name] = value
-                
                 # 将验证后的数据添加到请求上下文
-                request.validated_data = validated_data
+                request.validated_data = validate_data(schema, data)
                 
             except ValidationError as e:
                 logger.warning(f"参数验证失败: {e.message}")